@@ -0,0 +1,140 @@
+"""
+Замер задержек цикла событий бота при N одновременных заполнениях документов
+по всему пути сборки: fill_template (поиск в кэше, заполнение шаблона или
+печать полей на бланке), очередь и сборка xelatex, забор .pdf, очистка
+временных теховских файлов и запись документа в кэш. Сравниваются выполнение
+этапов сборки прямо в цикле событий, как раньше, и в пуле потоков или
+процессов движка сборки. Запускать из корня репозитория:
+
+    python -m benchmarks.event_loop_lag [число заполнений]
+
+Если xelatex не установлен, сборка заменяется заглушкой: она ждёт
+STUB_COMPILE_TIME секунд, как ждал бы процесс xelatex, и кладёт пустой бланк
+туда, где xelatex оставил бы собранный документ.
+"""
+
+import asyncio
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+from tg_bot.global_const import CHAINS_OF_STATES, DIRECTORY_FOR_TEMPLATES
+from tg_bot.handlers.fsm_handlers import document_key, fill_template
+from tg_bot.render import PdfCache, engine, render_engine
+
+# Как часто (в секундах) проверяется задержка цикла событий
+TICK = 0.005
+
+# Число воркеров xelatex движка сборки
+WORKERS = 4
+
+# Время сборки одного документа заглушкой xelatex в секундах
+STUB_COMPILE_TIME = 0.2
+
+# Документ, который заглушка кладёт вместо собранного
+STUB_DOCUMENT = f"{DIRECTORY_FOR_TEMPLATES}diploma_cover.pdf"
+
+
+async def stub_xelatex(*args: str, timeout: float = None) -> int:
+    # Последний аргумент -- теховский файл, документ xelatex кладёт рядом с ним
+    await asyncio.sleep(STUB_COMPILE_TIME)
+    filename = os.path.splitext(args[-1])[0]
+    await asyncio.to_thread(shutil.copyfile, STUB_DOCUMENT, f"{filename}.pdf")
+
+    return 0
+
+
+async def run_inline(function, *args):
+    # Прежнее поведение: этапы сборки, кроме самого xelatex, в цикле событий
+    return function(*args)
+
+
+async def measure_lag(stop: asyncio.Event) -> list[float]:
+    lags = []
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(TICK)
+        lags.append(time.perf_counter() - start - TICK)
+
+    return lags
+
+
+async def fill(user_id: int) -> float:
+    # Документы каталога заполняются по очереди, у каждого пользователя свои
+    # значения полей, поэтому документы не находятся в кэше
+    documents = list(CHAINS_OF_STATES)
+    document_name = documents[user_id % len(documents)]
+    fields = {
+        field: f"Иванов {user_id}" for field in CHAINS_OF_STATES[document_name][:-1]
+    }
+    user_data = dict(fields, document_name=document_name, id=user_id)
+
+    start = time.perf_counter()
+    key = document_key(document_name, fields)
+    job = await fill_template(user_data, document_name, key)
+    await job
+
+    return time.perf_counter() - start
+
+
+async def run(users: range) -> tuple[list[float], list[float]]:
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(measure_lag(stop))
+
+    latencies = await asyncio.gather(*(fill(user_id) for user_id in users))
+
+    stop.set()
+    return await lag_task, latencies
+
+
+async def main(count: int):
+    stubbed = shutil.which("xelatex") is None
+    if stubbed:
+        engine.run_xelatex = stub_xelatex
+        print(f"xelatex не найден, сборка заменена заглушкой на {STUB_COMPILE_TIME} с")
+
+    modes = [("event loop", "thread", True)]
+    modes += [(executor, executor, False) for executor in ("thread", "process")]
+
+    for number, (name, executor, inline) in enumerate(modes):
+        await render_engine.start(
+            workers=WORKERS,
+            queue_size=count,
+            formats=not stubbed,
+            executor=executor,
+        )
+        if inline:
+            render_engine.run_stage = run_inline
+
+        with tempfile.TemporaryDirectory() as directory:
+            # Документы замера не должны попасть в кэш бота
+            render_engine.cache = PdfCache(
+                memory_size=32 * 2**20, disk_size=256 * 2**20, directory=directory
+            )
+
+            # Прогреваем пул, чтобы в замер не попал запуск его процессов, и
+            # сдвигаем id пользователей, чтобы документы разных режимов не
+            # находились в кэше друг друга
+            offset = (number + 1) * 10 * count
+            await run(range(offset, offset + WORKERS))
+            lags, latencies = await run(
+                range(offset + WORKERS, offset + WORKERS + count)
+            )
+
+        print(
+            f"{name:>10}: max lag={max(lags) * 1000:8.1f} ms "
+            f"mean lag={statistics.mean(lags) * 1000:6.2f} ms "
+            f"fill p50={statistics.median(latencies) * 1000:7.1f} ms "
+            f"max={max(latencies) * 1000:7.1f} ms"
+        )
+
+        if inline:
+            del render_engine.run_stage
+        await render_engine.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 50))
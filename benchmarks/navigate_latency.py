@@ -0,0 +1,105 @@
+"""
+Замер задержки обработчика навигации по меню navigate на поддельном боте,
+который не ходит в Telegram. Сравниваются сборка клавиатуры страницы меню
+при каждом нажатии, как раньше, и готовые клавиатуры из кэша. Запускать из
+корня репозитория:
+
+    python -m benchmarks.navigate_latency [число нажатий]
+
+Фото и бланки считаются уже загруженными: их file_id подставляются в буферы
+только в памяти, база загруженных файлов не меняется.
+"""
+
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+from aiogram import types
+
+from tg_bot.global_const import DIRECTORY_FOR_PHOTOS, DIRECTORY_FOR_TEMPLATES
+from tg_bot.global_const import DOCUMENTS_BUFFER, PHOTO_BUFFER
+from tg_bot.global_const import get_catigories, get_documents
+from tg_bot.handlers.menu_handlers import navigate
+from tg_bot.keyboards.inline_menu_keyboard import MenuCallbackData
+from tg_bot.keyboards.inline_menu_keyboard import keyboard_cache, warm_up_keyboards
+
+
+class FakeBot:
+    async def __call__(self, method, request_timeout=None):
+        return True
+
+    async def edit_message_media(self, **kwargs):
+        return None
+
+
+def fill_buffer(buffer, directory: str, extensions: tuple[str, ...]):
+    buffer.entries = {
+        directory + name: (buffer.digest(directory + name), f"file-id-{name}")
+        for name in os.listdir(directory)
+        if name.lower().endswith(extensions)
+    }
+
+
+async def presses() -> list[str]:
+    # Нажатия всех кнопок меню: категории, документы и возвраты назад
+    packed = [MenuCallbackData(level=0, category="0", document_name="0").pack()]
+    for category in await get_catigories():
+        packed.append(
+            MenuCallbackData(level=1, category=category, document_name="0").pack()
+        )
+        for document_name in await get_documents(category):
+            packed.append(
+                MenuCallbackData(
+                    level=2, category=category, document_name=document_name
+                ).pack()
+            )
+
+    return packed
+
+
+async def run(name: str, count: int, cached: bool):
+    bot = FakeBot()
+    user = types.User(id=1, is_bot=False, first_name="Иван")
+    callback = types.CallbackQuery(
+        id="1",
+        from_user=user,
+        chat_instance="1",
+        message=types.Message(
+            message_id=1,
+            date=0,
+            chat=types.Chat(id=1, type="private"),
+            from_user=user,
+        ),
+    ).as_(bot)
+    packed = await presses()
+
+    await warm_up_keyboards()
+    latencies = []
+    for i in range(count):
+        if not cached:
+            keyboard_cache.clear()
+
+        start = time.perf_counter()
+        callback_data = MenuCallbackData.unpack(packed[i % len(packed)])
+        await navigate(callback, callback_data, bot)
+        latencies.append(time.perf_counter() - start)
+
+    latencies.sort()
+    print(
+        f"{name:>8}: p50={statistics.median(latencies) * 1e6:7.1f} us "
+        f"p99={latencies[int(len(latencies) * 0.99)] * 1e6:7.1f} us"
+    )
+
+
+async def main(count: int):
+    fill_buffer(PHOTO_BUFFER, DIRECTORY_FOR_PHOTOS, (".jpg", ".jpeg", ".png"))
+    fill_buffer(DOCUMENTS_BUFFER, DIRECTORY_FOR_TEMPLATES, (".pdf",))
+
+    await run("rebuild", count, cached=False)
+    await run("cached", count, cached=True)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000))
@@ -0,0 +1,65 @@
+"""
+Замер задержки сборки одного документа движком рендеринга с предкомпилированными
+форматами преамбул и без них. Запускать из корня репозитория:
+
+    python -m benchmarks.render_latency [число документов]
+
+Замер требует установленного xelatex (пакет texlive-xetex) и без него
+не запускается: заглушка, как в event_loop_lag, не даст осмысленных цифр.
+"""
+
+import asyncio
+import shutil
+import statistics
+import sys
+import time
+
+from jinja2 import Environment, FileSystemLoader
+
+from tg_bot.global_const import CHAINS_OF_STATES, DIRECTORY_FOR_LATEX_FILES
+from tg_bot.global_const import DIRECTORY_FOR_TEMPLATES
+from tg_bot.render import RenderEngine
+
+
+async def measure(document_name: str, count: int, formats: bool) -> list[float]:
+    environment = Environment(loader=FileSystemLoader(DIRECTORY_FOR_TEMPLATES))
+    template = environment.get_template(f"{document_name}.tex")
+
+    engine = RenderEngine()
+    await engine.start(workers=1, formats=formats)
+
+    # Первая сборка прогревает кэш шрифтов и, если включено, собирает формат
+    user_data = {state: "Иванов" for state in CHAINS_OF_STATES[document_name]}
+    await engine.submit(
+        template.render(user_data=user_data), f"{DIRECTORY_FOR_LATEX_FILES}bench"
+    )
+
+    timings = []
+    for i in range(count):
+        user_data = {state: f"Иванов {i}" for state in CHAINS_OF_STATES[document_name]}
+        start = time.perf_counter()
+        await engine.submit(
+            template.render(user_data=user_data), f"{DIRECTORY_FOR_LATEX_FILES}bench"
+        )
+        timings.append(time.perf_counter() - start)
+
+    await engine.stop()
+    return timings
+
+
+async def main(count: int):
+    for document_name in CHAINS_OF_STATES:
+        for formats in (False, True):
+            timings = await measure(document_name, count, formats)
+            print(
+                f"{document_name:>15} formats={formats!s:<5} "
+                f"mean={statistics.mean(timings) * 1000:8.1f} ms "
+                f"median={statistics.median(timings) * 1000:8.1f} ms"
+            )
+
+
+if __name__ == "__main__":
+    if shutil.which("xelatex") is None:
+        sys.exit("xelatex не найден, установите texlive-xetex для замера")
+
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 10))
@@ -0,0 +1,87 @@
+"""
+Замер памяти, которую занимают данные FSM в хранилище в памяти при 100 000
+одновременных заполнениях документов: прежний словарь user_data против
+компактной сессии FormSession. Как и в боте, названия документа и раздела
+у каждой сессии свои (разобраны из коллбэка кнопки), а цепочка токенов общая.
+Также сравнивается размер сериализованных данных для хранилищ SQLite и Redis.
+Запускать из корня репозитория:
+
+    python -m benchmarks.session_memory [число сессий]
+"""
+
+import json
+import sys
+import tracemalloc
+
+from tg_bot.global_const import CHAINS_OF_STATES
+from tg_bot.misc.session import FormSession, SESSION_KEY, session_dumps
+
+DOCUMENT_NAME = "diploma_cover"
+CATEGORY = "Category 1"
+
+# id пользователей Telegram -- большие числа, у каждой сессии свой объект
+FIRST_USER_ID = 10**9
+
+
+def from_callback(text: str) -> str:
+    # Строка, разобранная из данных коллбэка, -- новый объект, а не литерал
+    return "".join(list(text))
+
+
+def make_dict(user_id: int) -> dict:
+    # Так данные пользователя хранились раньше: цепочка токенов бралась из
+    # каталога и в хранилище в памяти была общей для всех пользователей
+    chain = CHAINS_OF_STATES[DOCUMENT_NAME]
+    user_data = {
+        "chain_of_states": chain,
+        "document_name": from_callback(DOCUMENT_NAME),
+        "category": from_callback(CATEGORY),
+        "id": FIRST_USER_ID + user_id,
+        "iteration": 0,
+    }
+    for field in chain[:2]:
+        user_data[field] = f"Иванов {user_id}"
+        user_data["iteration"] += 1
+
+    return user_data
+
+
+def make_session(user_id: int) -> dict:
+    session = FormSession(
+        from_callback(DOCUMENT_NAME),
+        from_callback(CATEGORY),
+        FIRST_USER_ID + user_id,
+        chain=CHAINS_OF_STATES[DOCUMENT_NAME],
+    )
+    for _ in range(2):
+        session.advance(f"Иванов {user_id}")
+
+    return {SESSION_KEY: session}
+
+
+def measure(make, count: int) -> float:
+    tracemalloc.start()
+    sessions = [make(user_id) for user_id in range(count)]
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    del sessions
+    return current / count
+
+
+def main(count: int):
+    for name, make, dumps in (
+        ("dict", make_dict, json.dumps),
+        ("FormSession", make_session, session_dumps),
+    ):
+        memory = measure(make, count)
+        serialized = len(dumps(make(count)).encode("utf-8"))
+        print(
+            f"{name:>12}: {memory:7.1f} bytes/session in memory, "
+            f"{serialized:4d} bytes/session serialized, "
+            f"{memory * count / 2**20:6.1f} MiB for {count} sessions"
+        )
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
@@ -0,0 +1,156 @@
+"""
+Замер задержек приёма обновлений вебхуком на локальном поддельном сервере
+Telegram. Поддельный сервер отвечает на запросы Bot API бота и запоминает,
+когда пришёл ответ пользователю, а обновления отправляются прямо в приёмник
+вебхуков. Сравниваются стандартный SimpleRequestHandler aiogram, который
+обрабатывает каждое обновление в отдельной задаче, и QueuedRequestHandler,
+который вдобавок соблюдает порядок обновлений каждого пользователя.
+Запускать из корня репозитория:
+
+    python -m benchmarks.webhook_latency [число обновлений]
+
+Обновления приходят равномерно с частотой RATE в секунду от разных
+пользователей, и Telegram держит не больше MAX_CONNECTIONS запросов сразу.
+"""
+
+import asyncio
+import statistics
+import sys
+import time
+
+from aiogram import Bot, Dispatcher, Router, types
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler
+from aiohttp import ClientSession, web
+
+from tg_bot.webhook import QueuedRequestHandler
+
+TOKEN = "42:fake"
+TELEGRAM_PORT = 18081
+WEBHOOK_PORT = 18082
+
+# Сколько (в секундах) обработчик ждёт ввода-вывода, например хранилища
+HANDLER_DELAY = 0.02
+
+# Telegram по умолчанию держит не больше 40 одновременных запросов к вебхуку
+MAX_CONNECTIONS = 40
+
+# Сколько обновлений в секунду приходит от пользователей
+RATE = 400
+
+# Время отправки обновления и время ответа пользователю по id чата
+sent: dict[int, float] = {}
+answered: dict[int, float] = {}
+
+
+async def fake_telegram(request: web.Request) -> web.Response:
+    data = await request.post()
+    chat_id = int(data.get("chat_id", 0))
+    answered[chat_id] = time.perf_counter()
+
+    return web.json_response(
+        {
+            "ok": True,
+            "result": {
+                "message_id": 1,
+                "date": 0,
+                "chat": {"id": chat_id, "type": "private"},
+                "text": data.get("text", ""),
+            },
+        }
+    )
+
+
+def make_dispatcher() -> Dispatcher:
+    router = Router()
+
+    @router.message()
+    async def echo(message: types.Message):
+        await asyncio.sleep(HANDLER_DELAY)
+        await message.answer(message.text)
+
+    dispatcher = Dispatcher()
+    dispatcher.include_router(router)
+    return dispatcher
+
+
+def make_update(update_id: int) -> dict:
+    user = {"id": update_id, "is_bot": False, "first_name": "Иван"}
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": 0,
+            "chat": {"id": update_id, "type": "private"},
+            "from": user,
+            "text": "привет",
+        },
+    }
+
+
+async def run(name: str, make_handler, count: int):
+    sent.clear()
+    answered.clear()
+
+    bot = Bot(
+        token=TOKEN,
+        session=AiohttpSession(
+            api=TelegramAPIServer.from_base(f"http://127.0.0.1:{TELEGRAM_PORT}")
+        ),
+    )
+    handler = make_handler(make_dispatcher(), bot)
+
+    app = web.Application()
+    handler.register(app, path="/webhook")
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", WEBHOOK_PORT).start()
+
+    acks = []
+    connections = asyncio.Semaphore(MAX_CONNECTIONS)
+    async with ClientSession() as client:
+
+        async def post(update_id: int):
+            await asyncio.sleep(update_id / RATE)
+            async with connections:
+                sent[update_id] = time.perf_counter()
+                async with client.post(
+                    f"http://127.0.0.1:{WEBHOOK_PORT}/webhook",
+                    json=make_update(update_id),
+                ) as response:
+                    await response.read()
+                acks.append(time.perf_counter() - sent[update_id])
+
+        await asyncio.gather(*(post(update_id) for update_id in range(1, count + 1)))
+
+        # Ждём, пока все ответы дойдут до поддельного сервера
+        while len(answered) < count:
+            await asyncio.sleep(0.01)
+
+    await runner.cleanup()
+
+    latencies = [answered[update_id] - sent[update_id] for update_id in sent]
+    print(
+        f"{name:>10}: ack p50={statistics.median(acks) * 1000:7.1f} ms "
+        f"max={max(acks) * 1000:7.1f} ms, "
+        f"end-to-end p50={statistics.median(latencies) * 1000:7.1f} ms "
+        f"max={max(latencies) * 1000:7.1f} ms"
+    )
+
+
+async def main(count: int):
+    telegram = web.Application()
+    telegram.router.add_post("/bot{token}/{method}", fake_telegram)
+    runner = web.AppRunner(telegram)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", TELEGRAM_PORT).start()
+
+    await run("simple", SimpleRequestHandler, count)
+    await run("queued", QueuedRequestHandler, count)
+
+    await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 500))
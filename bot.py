@@ -1,25 +1,105 @@
 import asyncio
+import logging
 
 from aiogram import Bot, Dispatcher
-from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 
 from tg_bot.config import load_config
+from tg_bot.global_const import CATALOG, DOCUMENTS_BUFFER, PHOTO_BUFFER
 from tg_bot.handlers import routers_list
+from tg_bot.keyboards.inline_menu_keyboard import warm_up_keyboards
+from tg_bot.misc.media import preload_media
+from tg_bot.misc.photos import optimize_photos
+from tg_bot.misc.previews import build_previews
+from tg_bot.misc.search import get_template_search
+from tg_bot.render import render_engine, template_engine
+from tg_bot.storage import make_storage, make_sweeper
+from tg_bot.webhook import run_webhook
+
+
+async def on_startup(bot: Bot, config):
+    # Читаем id загруженных файлов и считаем хэши файлов до первых обновлений,
+    # чтобы обработчики не делали этого в цикле событий
+    await PHOTO_BUFFER.load()
+    await DOCUMENTS_BUFFER.load()
+
+    # Готовим облегчённые копии фото меню, которые и загружаются в Telegram
+    await asyncio.to_thread(optimize_photos)
+
+    # Готовим превью первых страниц бланков, которые показываются в меню файла
+    await asyncio.to_thread(build_previews)
+
+    # Документы, которые не получится заполнить поверх бланка, собираются
+    # xelatex: сообщаем об этом сразу при запуске, а не при первом заполнении
+    render_engine.overlay.report_fallbacks()
+
+    # Заранее собираем клавиатуры меню и индекс поиска документов, чтобы
+    # нажатия кнопок и инлайн запросы их не собирали
+    await warm_up_keyboards()
+    get_template_search().build()
+
+    # Заранее загружаем в Telegram все фото меню, превью и бланки документов,
+    # чтобы первый пользователь не ждал их загрузки
+    if config.tg_bot.service_chat_id is not None:
+        await preload_media(bot, config.tg_bot.service_chat_id)
 
 
 async def main():
     config = load_config(".env")
-    storage = MemoryStorage()
+    storage = make_storage(config.storage)
+    sweeper = make_sweeper(storage, config.storage)
+
+    session = None
+    if config.tg_bot.api_server is not None:
+        session = AiohttpSession(
+            api=TelegramAPIServer.from_base(config.tg_bot.api_server)
+        )
 
-    bot = Bot(token=config.tg_bot.token, parse_mode="HTML")
+    bot = Bot(token=config.tg_bot.token, parse_mode="HTML", session=session)
     dp = Dispatcher(storage=storage)
 
     dp.include_routers(*routers_list)
-    # await on_startup()
+    await on_startup(bot, config)
+
+    template_engine.warm_up()
+    await render_engine.start(
+        workers=config.render.workers,
+        queue_size=config.render.queue_size,
+        timeout=config.render.timeout,
+        formats=config.render.formats,
+        cache_memory_size=config.render.cache_memory_size,
+        cache_disk_size=config.render.cache_disk_size,
+        mode=config.render.engine,
+        warm_processes=config.render.warm_processes,
+        executor=config.render.executor,
+        executor_workers=config.render.executor_workers,
+    )
+
+    # Новые и изменённые манифесты документов появляются в меню без перезапуска
+    if config.templates.poll_interval > 0:
+        CATALOG.start(config.templates.poll_interval)
+
+    # Удаляем брошенные пользователями сессии заполнения
+    if sweeper is not None:
+        sweeper.start()
 
-    await bot.delete_webhook(drop_pending_updates=True)
-    await dp.start_polling(bot)
+    try:
+        # Обновления, пришедшие, пока бот был выключен, не сбрасываются
+        if config.webhook.mode == "webhook":
+            await run_webhook(bot, dp, config.webhook)
+        else:
+            await bot.delete_webhook(drop_pending_updates=False)
+            await dp.start_polling(bot)
+    finally:
+        await CATALOG.stop()
+        if sweeper is not None:
+            await sweeper.stop()
+        await render_engine.stop()
 
 
 if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s"
+    )
     asyncio.run(main())
@@ -0,0 +1,423 @@
+import asyncio
+import contextlib
+import json
+import logging
+import os
+from collections.abc import Iterator, Mapping
+
+logger = logging.getLogger(__name__)
+
+# Файл с порядком и названиями категорий меню. Остальные .json файлы в
+# директории шаблонов -- описания (манифесты) документов
+CATEGORIES_MANIFEST = "categories.json"
+
+# Число документов на одной странице меню категории по умолчанию
+PAGE_SIZE = 9
+
+# Последний токен цепочки каждого документа -- название итогового файла
+FINAL_STATE = "final_state"
+
+# Файлы, один из которых должен лежать рядом с манифестом документа: шаблон
+# для сборки xelatex или пустой бланк для печати полей поверх него
+TEMPLATE_EXTENSIONS = (".tex", ".pdf")
+
+# Обязательные ключи описания поля бланка в манифесте
+OVERLAY_KEYS = ("field", "x", "y", "width", "size", "font")
+
+
+class Catalog:
+    """
+    Неизменяемый снимок каталога документов: структура меню, цепочки полей,
+    способы заполнения, поля бланков и словарь для русификации. При изменении
+    манифестов собирается новый снимок, а старый не меняется, поэтому
+    обработчик, получивший снимок, видит каталог целиком в одном состоянии.
+    """
+
+    __slots__ = (
+        "version",
+        "categories",
+        "lexicon",
+        "chains",
+        "backends",
+        "overlay_fields",
+        "category_ids",
+        "document_ids",
+        "category_names",
+        "document_names",
+        "pages",
+        "document_pages",
+    )
+
+    def __init__(
+        self,
+        version: int = 0,
+        categories: dict[str, list[str]] | None = None,
+        lexicon: dict[str, str] | None = None,
+        chains: dict[str, list[str]] | None = None,
+        backends: dict[str, str] | None = None,
+        overlay_fields: dict[str, list[dict]] | None = None,
+        ids: dict[str, dict[str, int]] | None = None,
+        page_size: int = PAGE_SIZE,
+    ):
+        self.version = version
+        self.categories = categories or {}
+        self.lexicon = lexicon or {}
+        self.chains = chains or {}
+        self.backends = backends or {}
+        self.overlay_fields = overlay_fields or {}
+
+        # Номера категорий и документов для компактных коллбэков кнопок. По
+        # номеру находится и название удалённых из каталога категорий и
+        # документов, чтобы кнопки в старых сообщениях можно было разобрать
+        ids = ids or {"categories": {}, "documents": {}}
+        self.category_ids = {name: ids["categories"][name] for name in self.categories}
+        self.document_ids = {name: ids["documents"][name] for name in self.chains}
+        self.category_names = {
+            number: name for name, number in ids["categories"].items()
+        }
+        self.document_names = {
+            number: name for name, number in ids["documents"].items()
+        }
+
+        # Документы категорий, заранее разбитые на страницы меню, и номер
+        # страницы категории, на которой находится документ
+        self.pages = {
+            category: [
+                documents[start : start + page_size]
+                for start in range(0, len(documents), page_size)
+            ]
+            for category, documents in self.categories.items()
+        }
+        self.document_pages = {
+            (category, document_name): page
+            for category, pages in self.pages.items()
+            for page, documents in enumerate(pages)
+            for document_name in documents
+        }
+
+
+class CatalogView(Mapping):
+    """
+    Словарь, который всегда читает одно из полей текущего снимка каталога.
+    Позволяет модулям один раз импортировать, например, CHAINS_OF_STATES
+    и видеть в нём изменения каталога без перезапуска бота.
+    """
+
+    def __init__(self, catalog: "TemplateCatalog", index: str):
+        self.catalog = catalog
+        self.index = index
+
+    def _index(self) -> dict:
+        return getattr(self.catalog.snapshot, self.index)
+
+    def __getitem__(self, key):
+        return self._index()[key]
+
+    def __iter__(self) -> Iterator:
+        return iter(self._index())
+
+    def __len__(self) -> int:
+        return len(self._index())
+
+    def __contains__(self, key) -> bool:
+        return key in self._index()
+
+    def __repr__(self) -> str:
+        return f"CatalogView({self.index}={self._index()!r})"
+
+
+class TemplateCatalog:
+    """
+    Каталог документов, описанных манифестами в директории шаблонов. Манифест
+    <документ>.json объявляет название документа, категории меню, в которых он
+    показывается, порядок в них, способ заполнения и поля в порядке заполнения
+    вместе с их названиями в подсказках:
+
+        {
+            "title": "Титульник",
+            "categories": ["Category 1"],
+            "order": 1,
+            "backend": "tex",
+            "fields": [{"name": "name", "label": "имя"}],
+            "overlay": [...]
+        }
+
+    Каталог перечитывает только изменившиеся манифесты (по времени изменения
+    и размеру файла, а также по появлению и удалению шаблона документа) и,
+    если что-то изменилось, целиком подменяет снимок каталога новым. Манифест
+    с ошибкой или без шаблона .tex и бланка .pdf рядом пропускается с
+    предупреждением в лог, а его прежняя версия, если была, остаётся в каталоге.
+    Документ, название, поле или категория которого совпадает с ключом надписи
+    бота или по-другому названа в другом манифесте, в каталог не попадает,
+    и об этом пишется ошибка в лог.
+
+    Каждой категории и каждому документу при первом появлении в каталоге
+    выдаётся постоянный номер. Номера хранятся в файле ids_path, не меняются
+    при перезапуске бота и не выдаются повторно после удаления документа.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        lexicon: dict[str, str],
+        ids_path: str | None = None,
+        page_size: int = PAGE_SIZE,
+    ):
+        self.directory = directory
+        self.lexicon = lexicon
+        self.ids_path = ids_path
+        self.page_size = page_size
+        self.snapshot = Catalog()
+        self.task: asyncio.Task | None = None
+
+        self.files: dict[str, tuple[int, int]] = {}
+        self.manifests: dict[str, dict] = {}
+        self.ids: dict[str, dict[str, int]] | None = None
+
+    def view(self, index: str) -> CatalogView:
+        """
+        Возвращает словарь, читающий поле index текущего снимка каталога.
+
+            Параметры:
+                index (str): поле снимка ("categories", "lexicon", "chains" и т.д.)
+        """
+
+        return CatalogView(self, index)
+
+    def reload(self) -> bool:
+        """
+        Перечитывает изменившиеся манифесты и, если каталог изменился,
+        подменяет его снимок.
+
+            Возвращаемое значение:
+                changed (bool): изменился ли каталог
+        """
+
+        files, names = {}, set()
+        try:
+            with os.scandir(self.directory) as entries:
+                for entry in entries:
+                    if not entry.is_file():
+                        continue
+                    names.add(entry.name)
+                    if entry.name.endswith(".json"):
+                        stat = entry.stat()
+                        files[entry.name] = (stat.st_mtime_ns, stat.st_size)
+        except OSError as error:
+            # Директория могла временно пропасть, например при деплое. Каталог
+            # остаётся прежним до следующей проверки
+            logger.warning("Не удалось прочитать каталог документов: %s", error)
+            return False
+
+        # Манифест документа перечитывается и тогда, когда рядом с ним
+        # появляется или пропадает шаблон документа
+        for name in files:
+            if name != CATEGORIES_MANIFEST:
+                document_name = os.path.splitext(name)[0]
+                files[name] += tuple(
+                    f"{document_name}{extension}" in names
+                    for extension in TEMPLATE_EXTENSIONS
+                )
+
+        changed = any(name not in files for name in self.manifests)
+        manifests = {
+            name: manifest for name, manifest in self.manifests.items() if name in files
+        }
+        for name, signature in files.items():
+            if self.files.get(name) == signature:
+                continue
+
+            try:
+                with open(os.path.join(self.directory, name), encoding="utf-8") as file:
+                    manifest = json.load(file)
+                if name == CATEGORIES_MANIFEST:
+                    _check_categories(manifest)
+                else:
+                    _check_manifest(manifest)
+                    if not any(signature[2:]):
+                        raise ValueError("Рядом с манифестом нет шаблона или бланка")
+            except (OSError, ValueError) as error:
+                # Манифест могли ещё не дописать: перечитаем его при следующем
+                # изменении, а пока оставим прежнюю версию
+                logger.warning("Манифест %s пропущен: %s", name, error)
+                continue
+
+            manifests[name] = manifest
+            changed = True
+
+        self.files = files
+        if not changed:
+            return False
+
+        self.manifests = manifests
+        self.snapshot = self._build(self.snapshot.version + 1)
+        return True
+
+    def start(self, interval: float):
+        """
+        Запускает фоновую задачу, которая раз в interval секунд проверяет,
+        не изменились ли манифесты.
+        """
+
+        self.task = asyncio.create_task(self._run(interval))
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self.task
+            self.task = None
+
+    async def _run(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(self.reload)
+            except Exception:
+                # Ошибка одной проверки не должна останавливать следующие
+                logger.exception("Не удалось перечитать каталог документов")
+
+    def _build(self, version: int) -> Catalog:
+        titles = self.manifests.get(CATEGORIES_MANIFEST, {})
+        templates = {
+            os.path.splitext(name)[0]: manifest
+            for name, manifest in self.manifests.items()
+            if name != CATEGORIES_MANIFEST
+        }
+
+        # Названия документов, полей и категорий лежат в одном словаре
+        # с надписями бота (по ним же ищутся переводы), поэтому документ,
+        # который затёр бы надпись бота или название из другого манифеста,
+        # в каталог не попадает
+        labels: dict[str, str] = {}
+        chains, backends, overlay_fields = {}, {}, {}
+        members: dict[str, list[tuple[int, str]]] = {}
+
+        for document_name, manifest in sorted(templates.items()):
+            entries = {document_name: manifest.get("title", document_name)}
+            for field in manifest["fields"]:
+                entries[field["name"]] = field.get("label", field["name"])
+            for category in manifest.get("categories", []):
+                entries[category] = titles.get(category, category)
+
+            collisions = [
+                key
+                for key, label in entries.items()
+                if key in self.lexicon or labels.get(key, label) != label
+            ]
+            if collisions:
+                logger.error(
+                    "Документ %s пропущен: названия %s уже заняты надписями бота "
+                    "или другими документами",
+                    document_name,
+                    ", ".join(collisions),
+                )
+                continue
+            labels.update(entries)
+
+            chains[document_name] = [field["name"] for field in manifest["fields"]]
+            chains[document_name].append(FINAL_STATE)
+
+            backends[document_name] = manifest.get("backend", "tex")
+            if "overlay" in manifest:
+                overlay_fields[document_name] = manifest["overlay"]
+
+            for category in manifest.get("categories", []):
+                members.setdefault(category, []).append(
+                    (manifest.get("order", 0), document_name)
+                )
+
+        # Сначала категории в порядке файла категорий, затем остальные по алфавиту
+        order = [category for category in titles if category in members]
+        order += sorted(category for category in members if category not in titles)
+
+        categories = {}
+        for category in order:
+            categories[category] = [name for _, name in sorted(members[category])]
+
+        lexicon = dict(self.lexicon)
+        lexicon.update(labels)
+
+        ids = self._assign_ids(categories, chains)
+
+        return Catalog(
+            version,
+            categories,
+            lexicon,
+            chains,
+            backends,
+            overlay_fields,
+            ids,
+            self.page_size,
+        )
+
+    def _assign_ids(self, categories, documents) -> dict[str, dict[str, int]]:
+        # Выдаёт номера новым категориям и документам и сохраняет их в файл
+        if self.ids is None:
+            self.ids = {"categories": {}, "documents": {}}
+            if self.ids_path is not None and os.path.isfile(self.ids_path):
+                try:
+                    with open(self.ids_path, encoding="utf-8") as file:
+                        self.ids.update(json.load(file))
+                except (OSError, ValueError) as error:
+                    # Без файла номеров каталог всё равно должен загрузиться,
+                    # кнопки в старых сообщениях при этом могут не разобраться
+                    logger.error("Не удалось прочитать номера каталога: %s", error)
+
+        ids = {kind: dict(names) for kind, names in self.ids.items()}
+        for kind, names in (("categories", categories), ("documents", documents)):
+            for name in sorted(set(names) - ids[kind].keys()):
+                ids[kind][name] = max(ids[kind].values(), default=0) + 1
+
+        if ids != self.ids and self.ids_path is not None:
+            temporary = f"{self.ids_path}.tmp"
+            try:
+                with open(temporary, "w", encoding="utf-8") as file:
+                    json.dump(ids, file, ensure_ascii=False, indent=4)
+                os.replace(temporary, self.ids_path)
+            except OSError:
+                # Номера остаются в памяти и сохранятся вместе с номерами
+                # следующих новых категорий или документов
+                pass
+
+        self.ids = ids
+        return ids
+
+
+def _check_categories(titles):
+    if not isinstance(titles, dict):
+        raise ValueError("Файл категорий должен быть объектом")
+    for category, title in titles.items():
+        if not isinstance(title, str):
+            raise ValueError(f"Название категории {category} должно быть строкой")
+
+
+def _check_manifest(manifest):
+    if not isinstance(manifest, dict):
+        raise ValueError("Манифест документа должен быть объектом")
+    if not isinstance(manifest.get("fields"), list):
+        raise ValueError("В манифесте документа нет списка полей")
+    for field in manifest["fields"]:
+        if not isinstance(field, dict) or not isinstance(field.get("name"), str):
+            raise ValueError("У поля документа нет имени")
+        if not isinstance(field.get("label", ""), str):
+            raise ValueError(f"Название поля {field['name']} должно быть строкой")
+    categories = manifest.get("categories", [])
+    if not isinstance(categories, list) or not all(
+        isinstance(category, str) for category in categories
+    ):
+        raise ValueError("Категории документа должны быть списком строк")
+    order = manifest.get("order", 0)
+    if not isinstance(order, (int, float)) or isinstance(order, bool):
+        raise ValueError("Порядок документа должен быть числом")
+    if not isinstance(manifest.get("title", ""), str):
+        raise ValueError("Название документа должно быть строкой")
+    if manifest.get("backend", "tex") not in ("tex", "overlay"):
+        raise ValueError("Способ заполнения документа должен быть tex или overlay")
+    if not isinstance(manifest.get("overlay", []), list):
+        raise ValueError("Поля бланка должны быть списком")
+    for field in manifest.get("overlay", []):
+        if not isinstance(field, dict) or not all(key in field for key in OVERLAY_KEYS):
+            raise ValueError(
+                f"У поля бланка должны быть ключи {', '.join(OVERLAY_KEYS)}"
+            )
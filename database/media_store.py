@@ -0,0 +1,171 @@
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+from collections.abc import MutableMapping
+
+
+class MediaStore:
+    """
+    Хранилище file_id загруженных в Telegram файлов в SQLite. Каждый file_id
+    хранится вместе с путём к файлу и хэшем его содержимого, поэтому после
+    перезапуска бота уже загруженные файлы не загружаются заново, а изменённые
+    файлы -- загружаются. Методы хранилища можно вызывать из разных потоков.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.connection: sqlite3.Connection | None = None
+        self.lock = threading.RLock()
+
+    def connect(self) -> sqlite3.Connection:
+        if self.connection is None:
+            self.connection = sqlite3.connect(self.path, check_same_thread=False)
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS media (
+                    kind TEXT NOT NULL,
+                    path TEXT NOT NULL,
+                    hash TEXT NOT NULL,
+                    file_id TEXT NOT NULL,
+                    PRIMARY KEY (kind, path)
+                )
+                """)
+            self.connection.commit()
+
+        return self.connection
+
+    def load(self, kind: str) -> dict[str, tuple[str, str]]:
+        """
+        Возвращает все сохранённые file_id файлов данного вида.
+
+            Параметры:
+                kind (str): вид файлов ("photo" или "document")
+
+            Возвращаемое значение:
+                entries (dict): словарь путь -> (хэш содержимого, file_id)
+        """
+
+        with self.lock:
+            rows = self.connect().execute(
+                "SELECT path, hash, file_id FROM media WHERE kind = ?", (kind,)
+            )
+            return {path: (digest, file_id) for path, digest, file_id in rows}
+
+    def save(self, kind: str, path: str, digest: str, file_id: str):
+        """Сохраняет file_id файла, заменяя file_id прежней версии этого файла"""
+
+        with self.lock:
+            connection = self.connect()
+            connection.execute(
+                "INSERT OR REPLACE INTO media (kind, path, hash, file_id) "
+                "VALUES (?, ?, ?, ?)",
+                (kind, path, digest, file_id),
+            )
+            connection.commit()
+
+    def delete(self, kind: str, path: str):
+        with self.lock:
+            connection = self.connect()
+            connection.execute(
+                "DELETE FROM media WHERE kind = ? AND path = ?", (kind, path)
+            )
+            connection.commit()
+
+
+class MediaBuffer(MutableMapping):
+    """
+    Буфер file_id загруженных файлов с интерфейсом словаря путь -> file_id.
+    Записи держатся в памяти и дублируются в MediaStore. При обращении file_id
+    отдаётся, только если хэш содержимого файла не изменился с момента его
+    загрузки. Хэш пересчитывается, только если изменились время модификации
+    или размер файла.
+
+    В боте записи читаются из базы и хэши файлов считаются в отдельном потоке
+    (load), а новые file_id сохраняются тоже в отдельном потоке (set). Чтение
+    file_id в цикле событий не читает ни базу, ни файлы: файл, изменившийся
+    с момента подсчёта хэша, считается не загруженным, и его новый хэш
+    посчитается при сохранении file_id после повторной загрузки.
+    """
+
+    def __init__(self, store: MediaStore, kind: str):
+        self.store = store
+        self.kind = kind
+        self.entries: dict[str, tuple[str, str]] | None = None
+        self.digests: dict[str, tuple[int, int, str]] = {}
+
+    def _entries(self) -> dict[str, tuple[str, str]]:
+        # Записи из базы загружаются при первом обращении к буферу
+        if self.entries is None:
+            self.entries = self.store.load(self.kind)
+
+        return self.entries
+
+    async def load(self):
+        """Загружает записи из базы и считает хэши их файлов в отдельном потоке"""
+
+        await asyncio.to_thread(self._load)
+
+    def _load(self):
+        entries = self.store.load(self.kind)
+        for path in entries:
+            try:
+                self.digest(path)
+            except OSError:
+                pass
+        self.entries = entries
+
+    async def set(self, path: str, file_id: str):
+        """
+        Запоминает file_id файла, считая хэш файла и сохраняя запись в базу
+        в отдельном потоке.
+
+            Параметры:
+                path (str): путь к файлу
+                file_id (str): id загруженного в Telegram файла
+        """
+
+        digest = await asyncio.to_thread(self.digest, path)
+        self._entries()[path] = (digest, file_id)
+        await asyncio.to_thread(self.store.save, self.kind, path, digest, file_id)
+
+    def digest(self, path: str) -> str:
+        """Возвращает sha256 хэш содержимого файла"""
+
+        stat = os.stat(path)
+        cached = self.digests.get(path)
+        if cached is None or cached[:2] != (stat.st_mtime_ns, stat.st_size):
+            with open(path, "rb") as file:
+                digest = hashlib.sha256(file.read()).hexdigest()
+            cached = (stat.st_mtime_ns, stat.st_size, digest)
+            self.digests[path] = cached
+
+        return cached[2]
+
+    def __getitem__(self, path: str) -> str:
+        digest, file_id = self._entries()[path]
+        try:
+            stat = os.stat(path)
+        except OSError:
+            raise KeyError(path)
+
+        cached = self.digests.get(path)
+        if cached is None or cached != (stat.st_mtime_ns, stat.st_size, digest):
+            raise KeyError(path)
+
+        return file_id
+
+    def __setitem__(self, path: str, file_id: str):
+        digest = self.digest(path)
+        self._entries()[path] = (digest, file_id)
+        self.store.save(self.kind, path, digest, file_id)
+
+    def __delitem__(self, path: str):
+        del self._entries()[path]
+        self.store.delete(self.kind, path)
+
+    def __iter__(self):
+        return iter(self._entries())
+
+    def __len__(self) -> int:
+        return len(self._entries())
@@ -0,0 +1,39 @@
+import json
+import logging
+
+from database.catalog import TemplateCatalog
+from tg_bot.global_const import BASE_LEXICON
+
+
+def write_document(directory, document_name, fields, categories=("Category 1",)):
+    manifest = {
+        "title": document_name.capitalize(),
+        "categories": list(categories),
+        "fields": [{"name": name, "label": label} for name, label in fields],
+    }
+    (directory / f"{document_name}.json").write_text(
+        json.dumps(manifest, ensure_ascii=False), encoding="utf-8"
+    )
+    (directory / f"{document_name}.tex").write_text("", encoding="utf-8")
+
+
+def test_colliding_names_are_rejected(tmp_path, caplog):
+    write_document(tmp_path, "application", [("name", "имя")])
+    # То же поле с другим названием в подсказке
+    write_document(tmp_path, "certificate", [("name", "название")])
+    # Поле и категория, названные как надписи бота
+    write_document(tmp_path, "receipt", [("wait", "ожидание")])
+    write_document(tmp_path, "statement", [("name", "имя")], categories=["prompt"])
+    # То же поле с тем же названием не конфликтует
+    write_document(tmp_path, "transcript", [("name", "имя")])
+
+    catalog = TemplateCatalog(str(tmp_path), BASE_LEXICON)
+    with caplog.at_level(logging.ERROR, logger="database.catalog"):
+        catalog.reload()
+
+    snapshot = catalog.snapshot
+    assert set(snapshot.chains) == {"application", "transcript"}
+    assert snapshot.lexicon["name"] == "имя"
+    assert snapshot.lexicon["wait"] == BASE_LEXICON["wait"]
+    assert snapshot.lexicon["prompt"] == BASE_LEXICON["prompt"]
+    assert len(caplog.records) == 3
@@ -0,0 +1,71 @@
+import asyncio
+import json
+
+from aiogram import types
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.storage.base import StorageKey
+
+from database.catalog import TemplateCatalog
+from tg_bot.global_const import BASE_LEXICON, CATALOG, CHAINS_OF_STATES
+from tg_bot.handlers.fsm_handlers import process_name_sent
+from tg_bot.misc import locales
+from tg_bot.misc.session import SESSION_KEY, FormSession
+from tg_bot.misc.states import FSMFillPersonalData
+from tg_bot.storage import TTLMemoryStorage
+
+
+def write_manifest(directory, fields):
+    manifest = {
+        "title": "Форма",
+        "categories": ["Category 1"],
+        "fields": [{"name": name, "label": label} for name, label in fields],
+    }
+    (directory / "form.json").write_text(json.dumps(manifest), encoding="utf-8")
+
+
+def make_message(text):
+    user = {"id": 5, "is_bot": False, "first_name": "Иван"}
+    return types.Message(
+        message_id=1,
+        date=0,
+        chat=types.Chat(id=5, type="private"),
+        from_user=types.User(**user),
+        text=text,
+    )
+
+
+def test_prompt_for_field_removed_mid_chain(tmp_path, monkeypatch):
+    # Пользователь начал заполнять документ, а поле, которое он должен ввести
+    # следующим, тем временем удалили из манифеста
+    (tmp_path / "form.tex").write_text("", encoding="utf-8")
+    write_manifest(tmp_path, [("name", "имя"), ("patronimic", "отчество")])
+    catalog = TemplateCatalog(str(tmp_path), BASE_LEXICON)
+    catalog.reload()
+    monkeypatch.setattr(CATALOG, "snapshot", catalog.snapshot)
+    monkeypatch.setattr(locales, "localization", locales.Localization())
+
+    session = FormSession("form", "Category 1", 5, chain=CHAINS_OF_STATES["form"])
+    state = FSMContext(TTLMemoryStorage(), StorageKey(bot_id=1, chat_id=5, user_id=5))
+
+    async def fill():
+        await state.set_state(FSMFillPersonalData.middle_state)
+        await state.set_data({SESSION_KEY: session})
+
+        write_manifest(tmp_path, [("name", "имя"), ("surname", "фамилию")])
+        assert catalog.reload()
+        monkeypatch.setattr(CATALOG, "snapshot", catalog.snapshot)
+
+        answers = []
+
+        async def answer(self, text, **kwargs):
+            answers.append(text)
+
+        monkeypatch.setattr(types.Message, "answer", answer)
+        await process_name_sent(make_message("Иван"), state, bot=None)
+        return answers, await state.get_data()
+
+    answers, data = asyncio.run(fill())
+
+    assert "patronimic" not in CHAINS_OF_STATES["form"]
+    assert answers == ["Введите patronimic"]
+    assert data[SESSION_KEY].current_state == "patronimic"
@@ -5,6 +5,71 @@ from environs import Env
 @dataclass
 class TgBot:
     token: str
+    # Служебный чат, в который при запуске загружаются фото и бланки документов
+    service_chat_id: int = None
+    # Адрес Bot API сервера, если это не api.telegram.org (например, локальный)
+    api_server: str = None
+
+
+@dataclass
+class Render:
+    workers: int = 2
+    queue_size: int = 32
+    timeout: float = 60
+    formats: bool = True
+    cache_memory_size: int = 32 * 2**20
+    cache_disk_size: int = 256 * 2**20
+    # Режим движка сборки: "process" или "warm" (заранее запущенные процессы xelatex)
+    engine: str = "process"
+    warm_processes: int = 2
+    # Пул для этапов сборки, нагружающих процессор и диск: "thread" или "process"
+    executor: str = "thread"
+    executor_workers: int = 4
+
+
+@dataclass
+class Storage:
+    # Хранилище состояний FSM: "memory", "sqlite" или "redis"
+    backend: str = "memory"
+    redis_url: str = "redis://localhost:6379/0"
+    sqlite_path: str = "database/fsm.sqlite3"
+    # Число соединений в пуле хранилища
+    pool_size: int = 8
+    # Через сколько секунд простоя сессия заполнения удаляется (0 -- никогда),
+    # как часто проверяются сессии и сколько их удаляется за одну проверку
+    ttl: int = 24 * 3600
+    sweep_interval: float = 60
+    sweep_batch: int = 1000
+
+
+@dataclass
+class Webhook:
+    # Способ получения обновлений: "polling" или "webhook"
+    mode: str = "polling"
+    # Адрес, на который Telegram отправляет обновления
+    url: str = None
+    # Адрес и путь, на которых бот принимает обновления
+    host: str = "0.0.0.0"
+    port: int = 8080
+    path: str = "/webhook"
+    secret: str = None
+    # Сколько обновлений может обрабатываться одновременно
+    max_updates: int = 1000
+
+    def __post_init__(self):
+        # Ошибка в настройках должна остановить бот при запуске, а не после
+        # подготовки фото, превью и движка сборки
+        if self.mode not in ("polling", "webhook"):
+            raise ValueError(f"Неизвестный способ получения обновлений: {self.mode}")
+        if self.mode == "webhook" and not self.url:
+            raise ValueError("Для получения обновлений вебхуком нужен WEBHOOK_URL")
+
+
+@dataclass
+class Templates:
+    # Как часто (в секундах) проверять, не изменились ли манифесты документов
+    # (0 -- не проверять, каталог читается только при запуске)
+    poll_interval: float = 5
 
 
 @dataclass
@@ -15,6 +80,10 @@ class Miscellaneous:
 @dataclass
 class Config:
     tg_bot: TgBot
+    render: Render
+    storage: Storage
+    webhook: Webhook
+    templates: Templates
     misc: Miscellaneous
 
 
@@ -22,4 +91,44 @@ def load_config(path: str):
     env = Env()
     env.read_env(path)
 
-    return Config(tg_bot=TgBot(token=env.str("BOT_TOKEN")), misc=Miscellaneous())
+    return Config(
+        tg_bot=TgBot(
+            token=env.str("BOT_TOKEN"),
+            service_chat_id=env.int("SERVICE_CHAT_ID", None),
+            api_server=env.str("BOT_API_SERVER", None),
+        ),
+        render=Render(
+            workers=env.int("RENDER_WORKERS", 2),
+            queue_size=env.int("RENDER_QUEUE_SIZE", 32),
+            timeout=env.float("RENDER_TIMEOUT", 60),
+            formats=env.bool("RENDER_FORMATS", True),
+            cache_memory_size=env.int("RENDER_CACHE_MEMORY_SIZE", 32 * 2**20),
+            cache_disk_size=env.int("RENDER_CACHE_DISK_SIZE", 256 * 2**20),
+            engine=env.str("RENDER_ENGINE", "process"),
+            warm_processes=env.int("RENDER_WARM_PROCESSES", 2),
+            executor=env.str("RENDER_EXECUTOR", "thread"),
+            executor_workers=env.int("RENDER_EXECUTOR_WORKERS", 4),
+        ),
+        storage=Storage(
+            backend=env.str("STORAGE_BACKEND", "memory"),
+            redis_url=env.str("STORAGE_REDIS_URL", "redis://localhost:6379/0"),
+            sqlite_path=env.str("STORAGE_SQLITE_PATH", "database/fsm.sqlite3"),
+            pool_size=env.int("STORAGE_POOL_SIZE", 8),
+            ttl=env.int("STORAGE_TTL", 24 * 3600),
+            sweep_interval=env.float("STORAGE_SWEEP_INTERVAL", 60),
+            sweep_batch=env.int("STORAGE_SWEEP_BATCH", 1000),
+        ),
+        webhook=Webhook(
+            mode=env.str("UPDATES_MODE", "polling"),
+            url=env.str("WEBHOOK_URL", None),
+            host=env.str("WEBHOOK_HOST", "0.0.0.0"),
+            port=env.int("WEBHOOK_PORT", 8080),
+            path=env.str("WEBHOOK_PATH", "/webhook"),
+            secret=env.str("WEBHOOK_SECRET", None),
+            max_updates=env.int("WEBHOOK_MAX_UPDATES", 1000),
+        ),
+        templates=Templates(
+            poll_interval=env.float("TEMPLATES_POLL_INTERVAL", 5),
+        ),
+        misc=Miscellaneous(),
+    )
@@ -1,53 +1,122 @@
+from collections import OrderedDict
+
+from database.catalog import TemplateCatalog
+from database.media_store import MediaStore, MediaBuffer
+
 DESCRIPTION = """Описание этого бота и его команд"""
 MAIN_MENU_TEXT = """Вот такие группы заявлений у меня есть"""
 FILES_MENU_TEXT = """В данном разделе есть следующие файлы"""
 FILE_PAGE_TEXT = (
     """Вот пустой бланк. Можете заполнить его сами или попросить об этом меня"""
 )
+DOWNLOAD_FILE_MESSAGE = """Вот пустой бланк"""
 WITH_FILL_FILE_MESSAGE = """Вот ваш заполненный файл"""
 
 DIRECTORY_FOR_LATEX_FILES = "database/tmp_latex_files/"
 DIRECTORY_FOR_TEMPLATES = "database/templates/"
+DIRECTORY_FOR_FORMATS = "database/tmp_latex_files/formats/"
+DIRECTORY_FOR_PDF_CACHE = "database/tmp_latex_files/cache/"
+DIRECTORY_FOR_JINJA_CACHE = "database/tmp_latex_files/jinja/"
 DIRECTORY_FOR_PHOTOS = "database/photos/"
+DIRECTORY_FOR_OPTIMIZED_PHOTOS = "database/tmp_photos/"
+DIRECTORY_FOR_PREVIEWS = "database/tmp_previews/"
+DIRECTORY_FOR_FONTS = "database/fonts/"
+DIRECTORY_FOR_LOCALES = "database/locales/"
+MEDIA_DATABASE = "database/media.sqlite3"
+CATALOG_IDS = "database/catalog_ids.json"
 
 MAIN_MENU_PHOTO = "main_menu_photo.png"
 FILES_MENU_PHOTO = "main_menu_photo.jpg"
 DOWNLOAD_PHOTO = "submenu_photo.jpg"
 
+# Число документов на одной странице меню файлов
+FILES_MENU_PAGE_SIZE = 9
+
+# Язык надписей бота по умолчанию. Переводы на другие языки лежат
+# в DIRECTORY_FOR_LOCALES
+DEFAULT_LOCALE = "ru"
+
+# Словарь для русификации надписей бота. Названия категорий, документов и полей
+# документов добавляются в него из манифестов в DIRECTORY_FOR_TEMPLATES
+BASE_LEXICON = {
+    "description": DESCRIPTION,
+    "main menu text": MAIN_MENU_TEXT,
+    "files menu text": FILES_MENU_TEXT,
+    "file page text": FILE_PAGE_TEXT,
+    "download file message": DOWNLOAD_FILE_MESSAGE,
+    "filled file message": WITH_FILL_FILE_MESSAGE,
+    "prompt": "Введите {label}",
+    "Back button": "Назад",
+    "Fill document button": "Заполнить документ",
+    "Download document button": "Скачать бланк",
+    "Previous page button": "« Пред.",
+    "Next page button": "След. »",
+    "Document unavailable": "Этого документа больше нет в боте",
+    "Open in bot button": "Открыть в боте",
+    "wait": "Пожалуйста, подождите немного, документ заполняется",
+    "render error": "Не получилось собрать документ, попробуйте ещё раз позже",
+    "busy": "Сейчас заполняется очень много документов. Пожалуйста, пришлите "
+    "название документа ещё раз чуть позже",
+    "queue position": "Пожалуйста, подождите немного, документ заполняется.\n"
+    "Ваше место в очереди: {position}, примерное время ожидания: {eta} с",
+    "final_state": "название документа",
+}
+
+# Каталог документов, описанных манифестами рядом с их шаблонами. Читается при
+# запуске бота и перечитывается при изменении манифестов
+CATALOG = TemplateCatalog(
+    DIRECTORY_FOR_TEMPLATES, BASE_LEXICON, CATALOG_IDS, page_size=FILES_MENU_PAGE_SIZE
+)
+CATALOG.reload()
+
 # Словарь последовательностей токенов для доступных документов.
 # Распололжение токенов в последовательности совпадает с их порядком заполнения
-CHAINS_OF_STATES = {
-    "diploma_cover": ["name", "surname", "patronimic", "final_state"],
-    "only_text": ["name", "final_state"],
-}
+CHAINS_OF_STATES = CATALOG.view("chains")
+
+# Способ заполнения документов: "tex" -- сборка шаблона xelatex,
+# "overlay" -- печать полей поверх пустого бланка без TeX. Документы,
+# не указанные здесь, собираются xelatex
+TEMPLATE_BACKENDS = CATALOG.view("backends")
+
+# Поля документов, заполняемых поверх бланка. Координаты (x, y) задают начало
+# базовой линии текста в пунктах от левого нижнего угла страницы, width --
+# ширину поля, size -- размер шрифта, font -- файл шрифта в DIRECTORY_FOR_FONTS.
+# Если бланка или шрифта нет, документ собирается xelatex
+OVERLAY_FIELDS = CATALOG.view("overlay_fields")
 
 # Структура меню
-CATEGORIES = {
-    "Category 1": ["diploma_cover"],
-    "Category 2": ["only_text", "diploma_cover"],
-}
+CATEGORIES = CATALOG.view("categories")
 
 # Словарь для русификации
-LEXICON = {
-    "Category 1": "Категория 1",
-    "Category 2": "Категория 2",
-    "Category 3": "Категория 3",
-    "Category 4": "Категория 4",
-    "diploma_cover": "Титульник",
-    "only_text": "Просто текст",
-    "Back button": "Назад",
-    "Fill document button": "Заполнить документ",
-    "wait": "Пожалуйста, подождите немного, документ заполняется",
-    "name": "имя",
-    "surname": "фамилию",
-    "patronimic": "отчество",
-    "birth_date": "дату рождения",
-    "final_state": "название документа",
-}
+LEXICON = CATALOG.view("lexicon")
+
+# Буфферы для id уже загруженных фото и документов. Хранятся в базе и переживают
+# перезапуск бота, а при изменении файла его старый id перестаёт выдаваться
+MEDIA_STORE = MediaStore(MEDIA_DATABASE)
+DOCUMENTS_BUFFER = MediaBuffer(MEDIA_STORE, "document")
+PHOTO_BUFFER = MediaBuffer(MEDIA_STORE, "photo")
+
+# Буффер для id уже отправленных заполненных документов. Ключом служит хэш
+# содержимого документа и имя файла, под которым он был отправлен
+GENERATED_DOCUMENTS_BUFFER = OrderedDict()
+
+# Максимальное число запоминаемых id заполненных документов
+GENERATED_DOCUMENTS_BUFFER_SIZE = 10000
+
+# Как часто (в секундах) обновлять место в очереди в сообщении с просьбой подождать
+QUEUE_POSITION_UPDATE_INTERVAL = 3
 
-# Буфферы для id уже загруженных фото и документов
-DOCUMENTS_BUFFER = {}
-PHOTO_BUFFER = {}
+# Сколько секунд документ пользователя считается собирающимся после последнего
+# продления отметки о сборке в хранилище. Отметку продлевает процесс бота,
+# который собирает документ, поэтому её видят и остальные процессы
+RENDER_LEASE = 30
+
+# Сколько секунд Telegram может отвечать на одинаковые инлайн запросы сам
+INLINE_CACHE_TIME = 300
+
+# Начало параметра ссылки на страницу документа в боте (t.me/<бот>?start=doc<id>),
+# за которым следует постоянный номер документа в каталоге
+DOCUMENT_LINK_PREFIX = "doc"
 
 # Желаемое число кнопок в ряду инлайн клавиатуры меню
 KEYBOARD_WIDTH = 3
@@ -55,12 +124,27 @@ KEYBOARD_WIDTH = 3
 
 # Возвращает список категорий меню
 async def get_catigories() -> list[str]:
-    return CATEGORIES.keys()
+    return CATALOG.snapshot.categories.keys()
 
 
 # Возвращает список документов в данной категории
 async def get_documents(category: str) -> list[str]:
-    return CATEGORIES[category]
+    return CATALOG.snapshot.categories[category]
+
+
+# Возвращает список документов на странице page меню данной категории
+async def get_documents_page(category: str, page: int) -> list[str]:
+    return CATALOG.snapshot.pages[category][page]
+
+
+# Возвращает число страниц меню данной категории
+async def get_pages_count(category: str) -> int:
+    return len(CATALOG.snapshot.pages[category])
+
+
+# Возвращает номер страницы меню категории, на которой находится документ
+async def get_document_page(category: str, document_name: str) -> int:
+    return CATALOG.snapshot.document_pages.get((category, document_name), 0)
 
 
 # Возвращает буффер загруженных фото
@@ -75,11 +159,22 @@ async def get_buffer_of_documents() -> dict:
 
 # Обновляет буффер загруженных фото
 async def update_photo_buffer(key: str, value: str):
-    global PHOTO_BUFFER
-    PHOTO_BUFFER[key] = value
+    await PHOTO_BUFFER.set(key, value)
 
 
 # Обновляет буффер загруженных документов
 async def update_document_buffer(key: str, value: str):
-    global DOCUMENTS_BUFFER
-    DOCUMENTS_BUFFER[key] = value
+    await DOCUMENTS_BUFFER.set(key, value)
+
+
+# Возвращает буффер отправленных заполненных документов
+async def get_buffer_of_generated_documents() -> dict:
+    return GENERATED_DOCUMENTS_BUFFER
+
+
+# Обновляет буффер отправленных заполненных документов, забывая самые старые из них
+async def update_generated_document_buffer(key: str, value: str):
+    global GENERATED_DOCUMENTS_BUFFER
+    GENERATED_DOCUMENTS_BUFFER[key] = value
+    while len(GENERATED_DOCUMENTS_BUFFER) > GENERATED_DOCUMENTS_BUFFER_SIZE:
+        GENERATED_DOCUMENTS_BUFFER.popitem(last=False)
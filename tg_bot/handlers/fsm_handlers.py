@@ -1,70 +1,195 @@
 from ..keyboards.inline_menu_keyboard import FillDocumentCallbackData
 from ..misc.states import FSMFillPersonalData
-from .menu_handlers import file_page_proceccing
+from ..misc.session import FormSession, SESSION_KEY
+from ..storage import StateTransaction, clear_state, transact
+from ..misc.media import send_photo
+from ..misc.locales import Lexicon, get_lexicon
+from .menu_handlers import show_menu
+from .user import start_command
 
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import default_state
-from aiogram.filters import StateFilter
+from aiogram.filters import CommandObject, CommandStart, StateFilter
+from aiogram.exceptions import TelegramBadRequest
 from aiogram import types
 from aiogram import Router
+from aiogram import loggers
 
-from jinja2 import Environment, FileSystemLoader
-import subprocess
-import os
+import asyncio
+import math
+import time
+from typing import Callable
+
+from ..render import render_engine, template_engine, render_template
+from ..render import RenderJob, RenderError
+from ..render import RenderQueueFull, RenderCancelled
+from ..render import PRIORITY_HIGH, PRIORITY_NORMAL
+from ..render import make_cache_key
 
 from ..global_const import (
     CHAINS_OF_STATES,
-    LEXICON,
+    TEMPLATE_BACKENDS,
     DIRECTORY_FOR_PHOTOS,
     DOWNLOAD_PHOTO,
     DIRECTORY_FOR_LATEX_FILES,
-    WITH_FILL_FILE_MESSAGE,
-    DIRECTORY_FOR_TEMPLATES,
+    QUEUE_POSITION_UPDATE_INTERVAL,
+    RENDER_LEASE,
+)
+from ..global_const import (
+    get_buffer_of_generated_documents,
+    update_generated_document_buffer,
 )
-from ..global_const import update_photo_buffer, get_buffer_of_photos
 
 
 fsm_router = Router()
 
+# Ключ данных FSM с отметкой о сборке документа: время (unix), до которого
+# документ пользователя считается собирающимся, см. RENDER_LEASE
+RENDERING_KEY = "rendering"
+
+# Ключ данных FSM, отмечающий, что пользователю уже отказали в сборке документа
+# из-за переполненной очереди
+RETRY_KEY = "retry"
+
+
+def uses_overlay(document_name: str) -> bool:
+    """Проверяет, заполняется ли документ печатью полей поверх пустого бланка"""
+
+    backend = TEMPLATE_BACKENDS.get(document_name, "tex")
+    return backend == "overlay" and render_engine.overlay.available(document_name)
+
+
+def document_key(document_name: str, fields: dict) -> str:
+    """
+    Возвращает ключ собранного документа в кэше. Документ однозначно
+    определяется шаблоном (или пустым бланком) и введёнными полями. Название
+    итогового файла в него не входит, поэтому в ключ не попадает.
+
+        Параметры:
+            document_name (str): название документа
+            fields (dict): значения полей документа
 
-async def fill_template(user_data: dict, document_name: str):
+        Возвращаемое значение:
+            key (str): ключ документа, см. make_cache_key
     """
-    Заполняет теховский шаблон данными пользователя и создаёт соответствующий
-    .pdf документ.
+
+    if uses_overlay(document_name):
+        digest = render_engine.overlay.get_digest(document_name)
+    else:
+        digest = template_engine.get_digest(document_name)
+
+    return make_cache_key(digest, fields)
+
+
+async def fill_template(
+    user_data: dict,
+    document_name: str,
+    key: str = None,
+    priority: int = PRIORITY_NORMAL,
+) -> RenderJob:
+    """
+    Заполняет шаблон данными пользователя и ставит его в очередь на сборку
+    соответствующего .pdf документа (или печатает данные поверх пустого бланка,
+    если документ это поддерживает).
 
         Параметры:
             user_data (): словарь, содержащий необходимые данные пользователя
             document_name (): название файла, шаблон которого необходимо заполнить
+            key (str): ключ документа в кэше, см. document_key
+            priority (int): класс приоритета задания на сборку
 
         Возвращаемое значение:
-            Возвращает корутину
+            job (RenderJob): задание на сборку, при ожидании возвращает байты .pdf файла
     """
 
-    # С помощью jinja загружаем теховский шаблон из файловой системы и
-    # подставляем в нужные места данные пользователя
-    environment = Environment(loader=FileSystemLoader(DIRECTORY_FOR_TEMPLATES))
-    template = environment.get_template(f"{document_name}.tex")
-    filled_file = template.render(user_data=user_data)
+    # Уже собиравшийся документ берём из кэша, не заполняя шаблон
+    job = await render_engine.lookup(key)
+    if job is not None:
+        return job
 
-    # Записываем заполненный шаблон в теховский файл
-    filename = f'{DIRECTORY_FOR_LATEX_FILES}file_for_user{user_data["id"]}'
-    with open(f"{filename}.tex", "w", encoding="utf-8") as file:
-        file.write(filled_file)
+    # Простые документы заполняем без TeX, печатая поля поверх пустого бланка
+    if uses_overlay(document_name):
+        return render_engine.submit_overlay(document_name, user_data, key)
+
+    # С помощью заранее скомпилированного jinja шаблона подставляем
+    # в нужные места экранированные данные пользователя. Это делается
+    # в пуле движка сборки, чтобы не занимать цикл событий
+    filled_file = await render_engine.run_stage(
+        render_template, document_name, user_data
+    )
 
-    # Собираем полученный теховский файл
-    subprocess.call(
-        f"xelatex -output-directory={DIRECTORY_FOR_LATEX_FILES} {filename}.tex"
+    # Отдаём заполненный шаблон движку сборки. Сама сборка и очистка временных
+    # теховских файлов происходят в его воркерах, не блокируя цикл событий
+    filename = f'{DIRECTORY_FOR_LATEX_FILES}file_for_user{user_data["id"]}'
+    return render_engine.submit(
+        filled_file, filename, key, owner=user_data["id"], priority=priority
     )
 
-    # Очищаем директорию ото всех временных теховских файлов
-    if os.path.isfile(f"{filename}.aux"):
-        os.unlink(f"{filename}.aux")
-    if os.path.isfile(f"{filename}.idx"):
-        os.unlink(f"{filename}.idx")
-    if os.path.isfile(f"{filename}.log"):
-        os.unlink(f"{filename}.log")
-    if os.path.isfile(f"{filename}.tex"):
-        os.unlink(f"{filename}.tex")
+
+async def wait_for_document(
+    job: RenderJob, wait_message: types.Message, bot, lexicon: Lexicon
+) -> bytes:
+    """
+    Дожидается сборки документа, периодически обновляя подпись сообщения
+    с просьбой подождать: пока документ стоит в очереди, в ней показываются
+    место в очереди и примерное время ожидания.
+
+        Параметры:
+            job (RenderJob): задание на сборку документа
+            wait_message (types.Message): сообщение с просьбой подождать
+            lexicon (Lexicon): словарь надписей на языке пользователя
+
+        Возвращаемое значение:
+            pdf (bytes): содержимое собранного документа
+    """
+
+    caption = lexicon["wait"]
+    while not job.done():
+        await asyncio.wait({job.future}, timeout=QUEUE_POSITION_UPDATE_INTERVAL)
+        if job.done():
+            break
+
+        position = render_engine.position(job)
+        if position > 0:
+            new_caption = lexicon["queue position"].format(
+                position=position, eta=math.ceil(render_engine.eta(job))
+            )
+        else:
+            new_caption = lexicon["wait"]
+
+        # Редактируем подпись, только если она изменилась, иначе Telegram
+        # вернёт ошибку
+        if new_caption != caption:
+            caption = new_caption
+            try:
+                await bot.edit_message_caption(
+                    chat_id=wait_message.chat.id,
+                    message_id=wait_message.message_id,
+                    caption=caption,
+                )
+            except TelegramBadRequest:
+                pass
+
+    return await job
+
+
+@fsm_router.message(CommandStart(), ~StateFilter(default_state))
+async def cancel_filling(
+    message: types.Message, state: FSMContext, bot, command: CommandObject
+):
+    """
+    Прерывает заполнение документа по команде /start: отменяет сборку документа,
+    если она уже заказана, выходит из FSM и показывает главное меню.
+
+        Параметры:
+            message (types.Message): сообщение с командой /start
+            state (FSMContext): данные FSM
+            command (CommandObject): команда /start с параметром ссылки
+    """
+
+    render_engine.cancel_user_jobs(message.from_user.id)
+    await clear_state(state)
+    await start_command(message, bot, command)
 
 
 @fsm_router.callback_query(
@@ -88,33 +213,56 @@ async def fill_document(
 
     """
 
-    # Инициализируем словарь с даными пользователя, сохраняя туда информацию, которая потебуется
-    # в дальнейшем для возврата в меню и заполнения выбранного зокумента и загружаем его в хранилище
-    user_data = {
-        "chain_of_states": CHAINS_OF_STATES[callback_data.document_name],
-        "document_name": callback_data.document_name,
-        "category": callback_data.category,
-        "id": callback.from_user.id,
-        "iteration": 0,
-    }
-    await state.update_data(user_data)
+    lexicon = get_lexicon(callback.from_user.language_code)
+
+    # Кнопка старого сообщения может вести к удалённому из каталога документу
+    if callback_data.document_name not in CHAINS_OF_STATES:
+        await callback.answer(text=lexicon["Document unavailable"], show_alert=True)
+        return
+
+    # Создаём сессию заполнения, сохраняя туда информацию, которая потебуется
+    # в дальнейшем для возврата в меню и заполнения выбранного зокумента и загружаем её в хранилище
+    session = FormSession(
+        document_name=callback_data.document_name,
+        category=callback_data.category,
+        user_id=callback.from_user.id,
+        chain=CHAINS_OF_STATES[callback_data.document_name],
+    )
+
+    # Сохраняем сессию и переводим машину состояний в промежуточное состояние --
+    # состояние ввода данных -- одной записью в хранилище
+    def start_filling(transaction: StateTransaction) -> bool:
+        # Повторное нажатие кнопки, пока первое обрабатывалось, ничего не делает
+        if transaction.state is not None:
+            transaction.discard()
+            return False
+
+        transaction.data[SESSION_KEY] = session
+        transaction.set_state(FSMFillPersonalData.middle_state)
+        return True
+
+    if not await transact(state, start_filling):
+        await callback.answer()
+        return
 
     # Устанавливаем следующее состояние для FSM -- первое в цепочке токенов
-    next_state = user_data["chain_of_states"][0]
+    next_state = session.current_state
 
     # Удаляем клавиатуру меню и выводим сообщение с приглашением ввести первый токен из цепочки
     await callback.message.delete_reply_markup()
-    await callback.message.answer(text=f"Введите {LEXICON[next_state]}")
-
-    # Переводим машину состояний в промежуточное состояние -- состояние ввода данных
-    await state.set_state(FSMFillPersonalData.middle_state)
+    await callback.message.answer(text=lexicon.prompt(next_state))
 
     # Отвечаем на callback
     await callback.answer()
 
 
 @fsm_router.message(StateFilter(FSMFillPersonalData.middle_state))
-async def process_name_sent(message: types.Message, state: FSMContext):
+async def process_name_sent(
+    message: types.Message,
+    state: FSMContext,
+    bot,
+    release_turn: Callable[[], None] = None,
+):
     """
     Считывает введённые пользователем данные, просит ввести пользователя следующий токен
     и переводит FSN в следующее состояние.
@@ -122,34 +270,53 @@ async def process_name_sent(message: types.Message, state: FSMContext):
         Параметры:
             message (types.Message): сообщение от пользователя, с введённым значением предыдущего токена
             state (FSMContext): данные FSM
+            release_turn (Callable): отпускает очередь обновлений пользователя (см. QueuedRequestHandler)
     """
 
-    # Получаем данные пользователя из хранилища
-    user_data = await state.get_data()
-
-    # Записываем в словарь данных пользователя введённую пользователем информацию о текущем токене
-    current_state = user_data["chain_of_states"][user_data["iteration"]]
-    user_data[current_state] = message.text
-
-    # Достаём из цепочки токенов токен, следующий за текущим
-    user_data["iteration"] += 1
-    next_state = user_data["chain_of_states"][user_data["iteration"]]
-
-    # Обновляем данные в хранилище и выводим сообщение с приглашением ввести следующий токен
-    await state.update_data(user_data)
-    await message.answer(text=f"Введите {LEXICON[next_state]}")
-
-    # Переводим FSM в следующее состояние, конечное (если цепочка закончилась)
-    # или ввода токенов (если она продолжается)
-    await state.set_state(
-        FSMFillPersonalData.final_state
-        if next_state == "final_state"
-        else FSMFillPersonalData.middle_state
-    )
+    # Сессия заполнения читается из хранилища и записывается обратно вместе с новым
+    # состоянием одной транзакцией. Если почти одновременно пришло ещё одно сообщение
+    # и успело изменить сессию, транзакция повторяется на обновлённой сессии
+    def advance(transaction: StateTransaction) -> tuple[str | None, str | None]:
+        # Предыдущее сообщение могло уже закончить ввод полей или заполнение
+        if transaction.state != FSMFillPersonalData.middle_state.state:
+            transaction.discard()
+            return transaction.state, None
+
+        # Записываем в сессию введённую пользователем информацию о текущем токене
+        # и достаём из цепочки токенов токен, следующий за текущим
+        session = transaction.data[SESSION_KEY]
+        session.advance(message.text)
+
+        # Переводим FSM в следующее состояние, конечное (если цепочка закончилась)
+        # или ввода токенов (если она продолжается)
+        transaction.set_state(
+            FSMFillPersonalData.final_state
+            if session.finished
+            else FSMFillPersonalData.middle_state
+        )
+        return transaction.state, session.current_state
+
+    current_state, next_state = await transact(state, advance)
+
+    # Если предыдущее сообщение уже закончило ввод полей, это сообщение -- название
+    # файла. Если заполнение прервано или документ уже собирается, оно игнорируется
+    if next_state is None:
+        if current_state == FSMFillPersonalData.final_state.state:
+            await process_final_state_sent(message, state, bot, release_turn)
+        return
+
+    # Выводим сообщение с приглашением ввести следующий токен на языке пользователя
+    lexicon = get_lexicon(message.from_user.language_code)
+    await message.answer(text=lexicon.prompt(next_state))
 
 
 @fsm_router.message(StateFilter(FSMFillPersonalData.final_state))
-async def process_final_state_sent(message: types.Message, state: FSMContext, bot):
+async def process_final_state_sent(
+    message: types.Message,
+    state: FSMContext,
+    bot,
+    release_turn: Callable[[], None] = None,
+):
     """
     Обрабатывает финальное состояние FSM. Создаёт и отправляет пользователю документ,
     заполненный его данными и возвращает его в меню документов. Выходит из FSM,
@@ -158,53 +325,246 @@ async def process_final_state_sent(message: types.Message, state: FSMContext, bo
         Параметры:
             message (types.Message): сообщение от пользователя, с введённым значением токена -- желаемого имени файла
             state (FSMContext): данные FSM
+            release_turn (Callable): отпускает очередь обновлений пользователя (см. QueuedRequestHandler)
     """
 
-    # Достаём данные пользователя (введённые им ранее) из хранилища и
-    # запоминаем название файла для пользователя
-    user_data = await state.get_data()
+    # Достаём данные пользователя (введённые им ранее) из хранилища и переводим FSM
+    # в состояние сборки одной транзакцией: пока документ собирается, остальные
+    # сообщения пользователя не должны запускать его сборку повторно
+    def start_render(transaction: StateTransaction) -> tuple[FormSession, int] | None:
+        if transaction.state != FSMFillPersonalData.final_state.state:
+            transaction.discard()
+            return None
+
+        # Пользователь, которому уже отказали из-за переполненной очереди,
+        # при повторной попытке собирает документ вне очереди
+        transaction.set_state(FSMFillPersonalData.render_state)
+        transaction.data[RENDERING_KEY] = time.time() + RENDER_LEASE
+        retry = transaction.data.pop(RETRY_KEY, False)
+        priority = PRIORITY_HIGH if retry else PRIORITY_NORMAL
+        return transaction.data[SESSION_KEY], priority
+
+    started = await transact(state, start_render)
+    if started is None:
+        return
+    session, priority = started
+
+    # Состояние сборки уже записано, и следующие обновления пользователя можно
+    # обрабатывать, не дожидаясь сборки: так /start может её отменить
+    if release_turn is not None:
+        release_turn()
+
+    # Запоминаем название файла для пользователя и его язык
     filename = message.text
+    lexicon = get_lexicon(message.from_user.language_code)
+
+    # Что бы ни случилось при сборке, пользователь не должен остаться в состоянии
+    # сборки: в нём бот не отвечает на его сообщения. Пока документ собирается,
+    # отметка о сборке в хранилище продлевается
+    lease = asyncio.create_task(renew_rendering(state))
+    back_to_menu = True
+    try:
+        back_to_menu = await send_filled_document(
+            message, state, bot, session, filename, lexicon, priority
+        )
+    except Exception:
+        loggers.event.exception(
+            "Не удалось заполнить документ %s", session.document_name
+        )
+        await message.answer(text=lexicon["render error"])
+    finally:
+        lease.cancel()
+
+        # Очишаем машину состояний (выходим из неё в состояние по умолчанию),
+        # если пользователь не прервал заполнение и не вернулся к вводу названия
+        await transact(state, finish_render)
+
+    # Возвращаем пользователя на страницу меню файла, который был заполнен. Это
+    # делается вне обработки ошибок сборки: документ к этому моменту уже
+    # отправлен, а документа или категории могло уже не остаться в каталоге
+    if back_to_menu:
+        await show_menu(
+            message,
+            level=2,
+            category=session.category,
+            document_name=session.document_name,
+            bot=bot,
+            locale=lexicon.locale,
+        )
+
+
+async def renew_rendering(state: FSMContext):
+    """
+    Продлевает отметку о сборке документа пользователя, пока её не отменят.
+    По отметке сообщения пользователя, пришедшие во время сборки, в любом
+    процессе бота отличаются от сообщений пользователя, сборка документа
+    которого оборвалась (например, при перезапуске бота).
 
-    #  Просим пользователя подождать и генерируем требуемый pdf документ,
-    # заполненный данными пользователя
-    photo_buffer = await get_buffer_of_photos()
-    photo_name = DIRECTORY_FOR_PHOTOS + DOWNLOAD_PHOTO
-    if photo_name in photo_buffer:
-        photo = photo_buffer[photo_name]
-    else:
-        photo = types.FSInputFile(photo_name, filename=photo_name)
+        Параметры:
+            state (FSMContext): данные FSM
+    """
+
+    def renew(transaction: StateTransaction):
+        if transaction.state != FSMFillPersonalData.render_state.state:
+            transaction.discard()
+            return
+
+        transaction.data[RENDERING_KEY] = time.time() + RENDER_LEASE
+
+    while True:
+        await asyncio.sleep(RENDER_LEASE / 3)
+        try:
+            await transact(state, renew)
+        except Exception:
+            # Не продлённая отметка истечёт не сразу: попробуем в следующий раз
+            loggers.event.exception("Не удалось продлить отметку о сборке документа")
+
+
+def finish_render(transaction: StateTransaction):
+    # Выходит из состояния сборки, если пользователь всё ещё в нём
+    if transaction.state != FSMFillPersonalData.render_state.state:
+        transaction.discard()
+        return
+
+    transaction.clear()
 
-    message = await bot.send_photo(
-        chat_id=message.chat.id, photo=photo, caption=LEXICON["wait"]
-    )
 
-    if photo_name not in photo_buffer:
-        await update_photo_buffer(photo_name, message.photo[-1].file_id)
+def retry_later(transaction: StateTransaction):
+    # Возвращает пользователя к вводу названия файла, запоминая, что ему отказали
+    if transaction.state != FSMFillPersonalData.render_state.state:
+        transaction.discard()
+        return
 
-    await fill_template(user_data=user_data, document_name=user_data["document_name"])
+    transaction.set_state(FSMFillPersonalData.final_state)
+    transaction.data.pop(RENDERING_KEY, None)
+    transaction.data[RETRY_KEY] = True
 
-    # Cобираем полное имя pdf файла, сгенерированного функцией fill_template
-    document_name = f'{DIRECTORY_FOR_LATEX_FILES}file_for_user{user_data["id"]}.pdf'
+
+async def send_filled_document(
+    message: types.Message,
+    state: FSMContext,
+    bot,
+    session: FormSession,
+    filename: str,
+    lexicon: Lexicon,
+    priority: int = PRIORITY_NORMAL,
+) -> bool:
+    """
+    Собирает документ, заполненный данными пользователя, и отправляет его
+    пользователю.
+
+        Параметры:
+            message (types.Message): сообщение пользователя с названием файла
+            state (FSMContext): данные FSM
+            session (FormSession): сессия заполнения документа
+            filename (str): название файла для пользователя
+            lexicon (Lexicon): словарь надписей на языке пользователя
+            priority (int): класс приоритета задания на сборку
+
+        Возвращаемое значение:
+            back_to_menu (bool): нужно ли вернуть пользователя в меню (нет, если
+                он прервал заполнение или должен прислать название ещё раз)
+    """
+
+    user_data = session.to_user_data()
+    document_name = session.document_name
+
+    # Telegram хранит файл вместе с именем, под которым он был загружен, поэтому
+    # повторно отправить по id можно только документ с тем же содержимым и именем.
+    # Если такой документ уже отправлялся, ни собирать его, ни просить
+    # пользователя подождать не нужно
+    key = document_key(document_name, dict(zip(session.fields, session.values)))
+    buffer_key = f"{key}/{filename}.pdf"
+    documents_buffer = await get_buffer_of_generated_documents()
+    document = documents_buffer.get(buffer_key)
+
+    if document is None:
+        # Ставим документ в очередь на сборку. Если очередь переполнена, вежливо
+        # просим пользователя прислать название файла ещё раз чуть позже
+        try:
+            job = await fill_template(user_data, document_name, key, priority)
+        except RenderQueueFull:
+            await transact(state, retry_later)
+            await message.answer(text=lexicon["busy"])
+            return False
+        except RenderError:
+            job = None
+
+        #  Просим пользователя подождать, пока генерируется требуемый pdf документ,
+        # заполненный данными пользователя
+        chat_id = message.chat.id
+        message = await send_photo(
+            DIRECTORY_FOR_PHOTOS + DOWNLOAD_PHOTO,
+            lambda photo: bot.send_photo(
+                chat_id=chat_id, photo=photo, caption=lexicon["wait"]
+            ),
+        )
+
+        # Ждём готовности документа. Пока документ собирается, бот продолжает
+        # обрабатывать запросы других пользователей
+        if job is not None:
+            try:
+                pdf = await wait_for_document(job, message, bot, lexicon)
+                document = types.BufferedInputFile(pdf, filename=f"{filename}.pdf")
+            except RenderCancelled:
+                # Пользователь прервал заполнение командой /start, меню ему уже показано
+                return False
+            except RenderError:
+                pass
 
     # Отправляем пользователю сообщение с прикреплённым к нему заполненным файлом
     # При этом меняем его название на то, которое было введено пользователем
-    await bot.send_document(
-        chat_id=message.chat.id,
-        document=types.FSInputFile(document_name, filename=f"{filename}.pdf"),
-        caption=WITH_FILL_FILE_MESSAGE,
-    )
+    if document is not None:
+        sent_message = await bot.send_document(
+            chat_id=message.chat.id,
+            document=document,
+            caption=lexicon["filled file message"],
+        )
+
+        if buffer_key not in documents_buffer:
+            await update_generated_document_buffer(
+                buffer_key, sent_message.document.file_id
+            )
+    else:
+        await message.answer(text=lexicon["render error"])
 
-    # Удаляем отправленный файл с компьютера, чтобы не засорять директорию
-    if os.path.isfile(document_name):
-        os.unlink(document_name)
+    return True
 
-    # Возвращаем пользователя на страницу меню файла, который был заполнен
-    await file_page_proceccing(
-        message,
-        category=user_data["category"],
-        document_name=user_data["document_name"],
-        bot=bot,
-    )
 
-    # Очишаем машину состояний (выходим из неё в состояние по умолчанию)
-    await state.clear()
+@fsm_router.message(StateFilter(FSMFillPersonalData.render_state))
+async def process_render_state(
+    message: types.Message,
+    state: FSMContext,
+    bot,
+    release_turn: Callable[[], None] = None,
+):
+    """
+    Обрабатывает сообщения, пришедшие, пока документ пользователя собирается:
+    такие сообщения удаляются. Если же отметку о сборке никакой процесс бота
+    больше не продлевает (например, бот перезапустили посреди сборки),
+    сообщение считается названием файла и документ собирается заново.
+
+        Параметры:
+            message (types.Message): сообщение от пользователя
+            state (FSMContext): данные FSM
+            release_turn (Callable): отпускает очередь обновлений пользователя (см. QueuedRequestHandler)
+    """
+
+    def resume_render(transaction: StateTransaction) -> bool | None:
+        # None -- сборка уже закончилась, False -- документ ещё собирается
+        if transaction.state != FSMFillPersonalData.render_state.state:
+            transaction.discard()
+            return None
+        if transaction.data.get(RENDERING_KEY, 0) > time.time():
+            transaction.discard()
+            return False
+
+        transaction.set_state(FSMFillPersonalData.final_state)
+        transaction.data.pop(RENDERING_KEY, None)
+        return True
+
+    resumed = await transact(state, resume_render)
+    if resumed:
+        await process_final_state_sent(message, state, bot, release_turn)
+    elif resumed is False:
+        await message.delete()
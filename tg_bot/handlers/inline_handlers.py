@@ -0,0 +1,80 @@
+from aiogram import types
+from aiogram import Router
+from aiogram.utils.deep_linking import create_start_link
+
+from ..misc.locales import get_lexicon
+from ..misc.search import get_template_search
+
+from ..global_const import (
+    CATALOG,
+    DIRECTORY_FOR_TEMPLATES,
+    DOCUMENT_LINK_PREFIX,
+    INLINE_CACHE_TIME,
+)
+from ..global_const import get_buffer_of_documents
+
+inline_router = Router()
+
+
+@inline_router.inline_query()
+async def search_documents(inline_query: types.InlineQuery, bot):
+    """
+    Ищет документы по названию в инлайн режиме (@бот дипл...) и предлагает
+    отправить пустой бланк найденного документа прямо в чат. Названия ищутся
+    и показываются на языке пользователя. Бланки отправляются по file_id из
+    буфера загруженных документов (см. preload_media). Вместо документа, бланк
+    которого ещё не загружен, в чат отправляется его название с кнопкой,
+    открывающей страницу документа в боте. Инлайн режим должен быть включён
+    у бота в @BotFather.
+
+        Параметры:
+            inline_query (InlineQuery): входящий инлайн запрос
+    """
+
+    snapshot = CATALOG.snapshot
+    lexicon = get_lexicon(inline_query.from_user.language_code)
+    template_search = get_template_search(lexicon.locale)
+    documents_buffer = await get_buffer_of_documents()
+
+    results = []
+    for document_name in template_search.search(inline_query.query):
+        path = f"{DIRECTORY_FOR_TEMPLATES}{document_name}.pdf"
+        document_id = snapshot.document_ids[document_name]
+        categories = ", ".join(
+            lexicon[category]
+            for category, documents in snapshot.categories.items()
+            if document_name in documents
+        )
+
+        if path in documents_buffer:
+            results.append(
+                types.InlineQueryResultCachedDocument(
+                    id=str(document_id),
+                    title=lexicon[document_name],
+                    document_file_id=documents_buffer[path],
+                    description=categories,
+                )
+            )
+            continue
+
+        # Ссылка ведёт на страницу документа в боте, см. start_command
+        link = await create_start_link(bot, f"{DOCUMENT_LINK_PREFIX}{document_id}")
+        button = types.InlineKeyboardButton(
+            text=lexicon["Open in bot button"], url=link
+        )
+        results.append(
+            types.InlineQueryResultArticle(
+                id=str(document_id),
+                title=lexicon[document_name],
+                description=categories,
+                input_message_content=types.InputTextMessageContent(
+                    message_text=lexicon[document_name]
+                ),
+                reply_markup=types.InlineKeyboardMarkup(inline_keyboard=[[button]]),
+            )
+        )
+
+    # Telegram может отвечать на повторные запросы сам, не обращаясь к боту.
+    # Результаты зависят от языка пользователя, поэтому кэшируются для каждого
+    # пользователя отдельно
+    await inline_query.answer(results, cache_time=INLINE_CACHE_TIME, is_personal=True)
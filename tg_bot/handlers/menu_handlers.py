@@ -3,30 +3,30 @@ from tg_bot.keyboards.inline_menu_keyboard import (
     make_files_menu_keyboard,
     make_file_page_keyboard,
     MenuCallbackData,
+    DownloadDocumentCallbackData,
 )
 from aiogram import types
 from aiogram import Router
 
+from ..misc.media import send_photo, send_document
+from ..misc.previews import preview_photo
+from ..misc.locales import get_lexicon
+
 from ..global_const import (
     DIRECTORY_FOR_PHOTOS,
     MAIN_MENU_PHOTO,
-    MAIN_MENU_TEXT,
     FILES_MENU_PHOTO,
-    FILES_MENU_TEXT,
     DIRECTORY_FOR_TEMPLATES,
-    FILE_PAGE_TEXT,
-)
-from ..global_const import (
-    get_buffer_of_photos,
-    update_photo_buffer,
-    get_buffer_of_documents,
-    update_document_buffer,
+    CATEGORIES,
+    CHAINS_OF_STATES,
 )
 
 menu_router = Router()
 
 
-async def main_menu_proceccing(callback: types.CallbackQuery, bot, **kwargs):
+async def main_menu_proceccing(
+    callback: types.CallbackQuery, bot, locale: str = None, **kwargs
+):
     """
     Отрисовывает главное меню, изменяя текст и клавиатуру сообщения,
     от которого пришёл callback запрос (или того, что подано на вход функции),
@@ -34,136 +34,245 @@ async def main_menu_proceccing(callback: types.CallbackQuery, bot, **kwargs):
 
         Параметры:
             callback (CallbackQuery или Message): входящий callback запрос, ведущий в главное меню
+            locale (str): язык надписей (по умолчанию -- язык пользователя)
     """
 
-    # Создаём клавиатуру главного меню
-    markup = await make_main_menu_keyboard()
+    # Создаём клавиатуру главного меню на языке пользователя
+    lexicon = get_lexicon(locale or callback.from_user.language_code)
+    markup = await make_main_menu_keyboard(locale=lexicon.locale)
+    caption = lexicon["main menu text"]
 
-    # Загружаем буфер подгруженных фотографий и собираем полное имя фото,
-    # которое будет отображаться в главном меню
-    photo_buffer = await get_buffer_of_photos()
+    # Собираем полное имя фото, которое будет отображаться в главном меню
     photo_name = DIRECTORY_FOR_PHOTOS + MAIN_MENU_PHOTO
 
-    # FIX ME: сделать автоматическую подгрузку фото перед началом работы бота в буфер
-    # и убрать проверку на наличие фото в нём
-
     # Проверяем какой тип данных пришёл на вход (callback или message)
     # и изменяем у соответствующего сообщения текст, фото и клавиатуру на требуемые
-    if photo_name in photo_buffer:
-        photo = photo_buffer[photo_name]
-    else:
-        photo = types.FSInputFile(photo_name, filename=photo_name)
-
-    if isinstance(callback, types.CallbackQuery):
-        message = await bot.edit_message_media(
-            chat_id=callback.message.chat.id,
-            message_id=callback.message.message_id,
-            media=types.InputMediaPhoto(media=photo, caption=MAIN_MENU_TEXT),
-            reply_markup=markup,
-        )
-    else:
-        message = await bot.send_photo(
+    async def send(photo):
+        if isinstance(callback, types.CallbackQuery):
+            return await bot.edit_message_media(
+                chat_id=callback.message.chat.id,
+                message_id=callback.message.message_id,
+                media=types.InputMediaPhoto(media=photo, caption=caption),
+                reply_markup=markup,
+            )
+
+        return await bot.send_photo(
             chat_id=callback.chat.id,
             photo=photo,
-            caption=MAIN_MENU_TEXT,
+            caption=caption,
             reply_markup=markup,
         )
 
-    if photo_name not in photo_buffer:
-        await update_photo_buffer(photo_name, message.photo[-1].file_id)
+    # Фото загружаются в буфер при запуске бота (см. preload_media). Если его
+    # там нет, фото загрузится один раз, даже при одновременных запросах
+    await send_photo(photo_name, send)
 
 
 async def files_menu_proceccing(
-    callback: types.CallbackQuery, category: str, bot, **kwargs
+    callback: types.CallbackQuery,
+    category: str,
+    bot,
+    page: int = 0,
+    locale: str = None,
+    **kwargs,
 ):
     """
     Отрисовывает меню файлов выбранной категории, изменяя текст и клавиатуру сообщения,
-    от которого пришёл callback запрос, на те, что должны отражаться в меню файлов.
+    от которого пришёл callback запрос (или отправляя новое в ответ на сообщение),
+    на те, что должны отражаться в меню файлов.
 
         Параметры:
-            callback (CallbackQuery): входящий callback запрос, ведущий в главное меню
+            callback (CallbackQuery или Message): входящий callback запрос, ведущий в главное меню
             category (str): выбранный подраздел меню
+            page (int): номер страницы подраздела
+            locale (str): язык надписей (по умолчанию -- язык пользователя)
     """
 
-    # Создаём клавиатуру требуемой страницы меню файлов
-    markup = await make_files_menu_keyboard(category)
+    # Создаём клавиатуру требуемой страницы меню файлов на языке пользователя
+    lexicon = get_lexicon(locale or callback.from_user.language_code)
+    markup = await make_files_menu_keyboard(category, page, locale=lexicon.locale)
+    caption = lexicon["files menu text"]
 
-    # Загружаем буфер подгруженных фотографий и собираем полное имя фото, которое будет отображаться на
-    # требуемой странице меню файлов
-    photo_buffer = await get_buffer_of_photos()
+    # Собираем полное имя фото, которое будет отображаться на требуемой странице меню файлов
     photo_name = DIRECTORY_FOR_PHOTOS + FILES_MENU_PHOTO
 
-    # FIX ME: сделать автоматическую подгрузку фото перед началом работы бота в буфер
-    # и убрать проверку на наличие фото в нём
-
     # Изменяем у сообщения, от которого поступил callback запрос, текст, фото и клавиатуру на требуемые
-    if photo_name in photo_buffer:
-        photo = photo_buffer[photo_name]
-    else:
-        photo = types.FSInputFile(photo_name, filename=photo_name)
-
-    message = await bot.edit_message_media(
-        chat_id=callback.message.chat.id,
-        message_id=callback.message.message_id,
-        media=types.InputMediaPhoto(media=photo, caption=FILES_MENU_TEXT),
-        reply_markup=markup,
-    )
+    async def send(photo):
+        if isinstance(callback, types.CallbackQuery):
+            return await bot.edit_message_media(
+                chat_id=callback.message.chat.id,
+                message_id=callback.message.message_id,
+                media=types.InputMediaPhoto(media=photo, caption=caption),
+                reply_markup=markup,
+            )
+
+        return await bot.send_photo(
+            chat_id=callback.chat.id,
+            photo=photo,
+            caption=caption,
+            reply_markup=markup,
+        )
 
-    if photo_name not in photo_buffer:
-        await update_photo_buffer(photo_name, message.photo[-1].file_id)
+    await send_photo(photo_name, send)
 
 
 async def file_page_proceccing(
-    callback: types.CallbackQuery, category: str, document_name: str, bot, **kwargs
+    callback: types.CallbackQuery,
+    category: str,
+    document_name: str,
+    bot,
+    locale: str = None,
+    **kwargs,
 ):
     """
-    Отрисовывает меню конкретного файла, добавляя клавиатуру с надписями 'Назад' и 'Заполнить',
-    соответствующий текст и прикрепляя пустой шаблон выбранного файла к сообщению.
+    Отрисовывает меню конкретного файла, добавляя клавиатуру с надписями 'Заполнить',
+    'Скачать бланк' и 'Назад', соответствующий текст и прикрепляя к сообщению превью
+    первой страницы пустого шаблона выбранного файла (или сам шаблон, если превью нет).
 
         Параметры:
             callback (CallbackQuery или Message): входящий callback запрос, ведущий в главное меню
             category (str): выбранный подраздел меню
             document_name (str): название выбранного файла
+            locale (str): язык надписей (по умолчанию -- язык пользователя)
 
     """
 
-    # Создаём клавиатуру под выбранным файлом
+    # Создаём клавиатуру под выбранным файлом на языке пользователя
+    lexicon = get_lexicon(locale or callback.from_user.language_code)
     markup = await make_file_page_keyboard(
-        category=category, document_name=document_name
+        category=category, document_name=document_name, locale=lexicon.locale
     )
+    caption = lexicon["file page text"]
 
-    # Загружаем буфер подгруженных документов и собираем полное имя файла,
-    # который будет прикреплен к сообщению
-    documents_buffer = await get_buffer_of_documents()
+    # Собираем полное имя файла, превью которого будет прикреплено к сообщению
     document_name = f"{DIRECTORY_FOR_TEMPLATES}{document_name}.pdf"
 
-    # FIX ME: сделать автоматическую подгрузку файлов перед началом работы бота в буфер
-    # и убрать проверку на наличие файла в нём
+    # Показываем лёгкое превью первой страницы, а сам бланк отправляем по кнопке
+    # 'Скачать бланк' (см. download_document)
+    preview = preview_photo(document_name)
+    if preview is not None:
+
+        async def send_preview(photo):
+            if isinstance(callback, types.CallbackQuery):
+                return await bot.edit_message_media(
+                    chat_id=callback.message.chat.id,
+                    message_id=callback.message.message_id,
+                    media=types.InputMediaPhoto(media=photo, caption=caption),
+                    reply_markup=markup,
+                )
+
+            return await bot.send_photo(
+                chat_id=callback.chat.id,
+                photo=photo,
+                caption=caption,
+                reply_markup=markup,
+            )
+
+        await send_photo(preview, send_preview)
+        return
 
     # Изменяем у сообщения, от которого поступил callback запрос, текст и клавиатуру на требуемые
     # и прикрепляем нужный файл вместо фотографии
-    if document_name in documents_buffer:
-        document = documents_buffer[document_name]
-    else:
-        document = types.FSInputFile(document_name, filename=document_name)
-
-    if isinstance(callback, types.CallbackQuery):
-        message = await bot.edit_message_media(
-            chat_id=callback.message.chat.id,
-            message_id=callback.message.message_id,
-            media=types.InputMediaDocument(media=document, caption=FILE_PAGE_TEXT),
-            reply_markup=markup,
-        )
-    else:
-        message = await bot.send_document(
+    async def send(document):
+        if isinstance(callback, types.CallbackQuery):
+            return await bot.edit_message_media(
+                chat_id=callback.message.chat.id,
+                message_id=callback.message.message_id,
+                media=types.InputMediaDocument(media=document, caption=caption),
+                reply_markup=markup,
+            )
+
+        return await bot.send_document(
             chat_id=callback.chat.id,
             document=document,
-            caption=FILE_PAGE_TEXT,
+            caption=caption,
             reply_markup=markup,
         )
 
-    if document_name not in documents_buffer:
-        await update_document_buffer(document_name, message.document.file_id)
+    # Бланки загружаются в буфер при запуске бота (см. preload_media). Если
+    # бланка там нет, он загрузится один раз, даже при одновременных запросах
+    await send_document(document_name, send)
+
+
+# Функции-обработчики страниц меню по уровню вложенности
+MENU_LEVELS = {
+    0: main_menu_proceccing,
+    1: files_menu_proceccing,
+    2: file_page_proceccing,
+}
+
+
+async def show_menu(
+    callback: types.CallbackQuery,
+    level: int,
+    category: str,
+    document_name: str,
+    bot,
+    page: int = 0,
+    locale: str = None,
+):
+    """
+    Отрисовывает раздел меню заданного уровня вложенности. Раздела уже может
+    не быть в каталоге (кнопка старого сообщения или документ, удалённый,
+    пока его заполняли), тогда показывается ближайший существующий раздел.
+
+        Параметры:
+            callback (CallbackQuery или Message): входящий callback запрос или сообщение
+            level (int): уровень вложенности: 0 -- главное меню, 1 -- меню
+                файлов категории, 2 -- страница файла
+            category (str): выбранный подраздел меню
+            document_name (str): название выбранного файла
+            page (int): номер страницы подраздела
+            locale (str): язык надписей (по умолчанию -- язык пользователя)
+    """
+
+    if level >= 1 and category not in CATEGORIES:
+        level = 0
+    elif level == 2 and document_name not in CATEGORIES[category]:
+        level = 1
+
+    await MENU_LEVELS[level](
+        callback,
+        category=category,
+        document_name=document_name,
+        page=page,
+        bot=bot,
+        locale=locale,
+    )
+
+
+@menu_router.callback_query(DownloadDocumentCallbackData.filter())
+async def download_document(
+    callback: types.CallbackQuery, callback_data: DownloadDocumentCallbackData, bot
+):
+    """
+    Отправляет пользователю пустой бланк выбранного документа отдельным сообщением
+
+        Параметры:
+            callback (CallbackQuery): принятый callback запрос, отправленный кнопкой 'Скачать бланк'
+            callback_data (DownloadDocumentCallbackData): данные, переданные с callback запросом
+    """
+
+    lexicon = get_lexicon(callback.from_user.language_code)
+
+    # Кнопка старого сообщения может вести к удалённому из каталога документу
+    if callback_data.document_name not in CHAINS_OF_STATES:
+        await callback.answer(text=lexicon["Document unavailable"], show_alert=True)
+        return
+
+    document_name = f"{DIRECTORY_FOR_TEMPLATES}{callback_data.document_name}.pdf"
+
+    await send_document(
+        document_name,
+        lambda document: bot.send_document(
+            chat_id=callback.message.chat.id,
+            document=document,
+            caption=lexicon["download file message"],
+        ),
+    )
+
+    # Отвечаем на callback запрос
+    await callback.answer()
 
 
 @menu_router.callback_query(MenuCallbackData.filter())
@@ -178,23 +287,14 @@ async def navigate(callback: types.CallbackQuery, callback_data: MenuCallbackDat
 
     """
 
-    # Создаём словарь соответствий уровня вложенности меню и функций-обработчиков страниц меню
-    levels = {
-        0: main_menu_proceccing,
-        1: files_menu_proceccing,
-        2: file_page_proceccing,
-    }
-
-    # Выбираем нужную функцию обработчий по значению уровня вложенности. Уровень
-    # получаем из соответствующего поля callback_data
-    current_level_function = levels[callback_data.level]
-
-    # Вызываем выбранную функцию-обработчик, передавая в неё соответствующие данные о разделе меню,
-    # выбранном документе и уровне вложенности, которые хранятся в пришедшей callback_data
-    await current_level_function(
+    # Показываем раздел меню, уровень вложенности, категория, документ и страница
+    # которого хранятся в пришедшей callback_data
+    await show_menu(
         callback,
+        level=callback_data.level,
         category=callback_data.category,
         document_name=callback_data.document_name,
+        page=callback_data.page,
         bot=bot,
     )
 
@@ -1,21 +1,36 @@
-from .menu_handlers import main_menu_proceccing
+from .menu_handlers import main_menu_proceccing, file_page_proceccing
 
-from aiogram.filters import CommandStart
+from aiogram.filters import CommandObject, CommandStart
 from aiogram.fsm.state import default_state
 from aiogram.filters import StateFilter
 from aiogram.types import Message
 from aiogram import Router
 
-from ..global_const import DESCRIPTION
+from ..global_const import CATALOG, DOCUMENT_LINK_PREFIX
+from ..misc.locales import get_lexicon
 
 user_router = Router()
 
 
 # Обработчик команды /start
 @user_router.message(CommandStart(), StateFilter(default_state))
-async def start_command(messege: Message, bot):
+async def start_command(messege: Message, bot, command: CommandObject = None):
+    # По ссылке из инлайн режима (/start doc<id>) сразу открываем страницу документа
+    args = command.args if command else None
+    if args and args.startswith(DOCUMENT_LINK_PREFIX):
+        snapshot = CATALOG.snapshot
+        number = args[len(DOCUMENT_LINK_PREFIX) :]
+        document_name = (
+            snapshot.document_names.get(int(number)) if number.isdigit() else None
+        )
+        for category, documents in snapshot.categories.items():
+            if document_name in documents:
+                await file_page_proceccing(messege, category, document_name, bot)
+                return
+
     # Отправляем краткое описание бота и загружаем главное меню в ответ на сообщение /start
-    await messege.answer(text=DESCRIPTION)
+    lexicon = get_lexicon(messege.from_user.language_code)
+    await messege.answer(text=lexicon["description"])
     await main_menu_proceccing(messege, bot)
 
 
@@ -0,0 +1,147 @@
+from aiogram.filters import Filter
+from aiogram.types import CallbackQuery
+
+from ..global_const import CATALOG
+
+# Разделитель полей в упакованных данных кнопки
+SEPARATOR = ":"
+
+# Виды полей: целое число, категория и документ каталога. Категории
+# и документы упаковываются их постоянными номерами из каталога
+INTEGER = "integer"
+CATEGORY = "category"
+DOCUMENT = "document"
+
+# Значение пустого поля категории или документа
+EMPTY = "0"
+
+
+class CompactCallbackData:
+    """
+    Данные кнопки инлайн клавиатуры, упакованные в короткую строку вида
+    "m:2:1:3": префикс и поля через двоеточие, причём вместо названий категорий
+    и документов записываются их номера из каталога. Такая строка укладывается
+    в ограничение Telegram в 64 байта при любых названиях и разбирается без
+    pydantic. Номера не меняются при изменении каталога, поэтому кнопки старых
+    сообщений разбираются и после его перезагрузки. Также разбираются кнопки
+    прежнего формата aiogram с названиями вместо номеров (legacy_prefix).
+
+    Наследники задают prefix, legacy_prefix и fields -- кортеж полей
+    (название, вид, значение по умолчанию) в порядке упаковки. Новые поля
+    добавляются в конец, чтобы кнопки старых сообщений разбирались.
+    """
+
+    __slots__ = ()
+
+    prefix: str
+    legacy_prefix: str
+    fields: tuple[tuple[str, str, object], ...]
+
+    def __init__(self, **values):
+        for name, _, default in self.fields:
+            setattr(self, name, values.get(name, default))
+
+    def pack(self) -> str:
+        """Упаковывает данные кнопки в строку callback_data"""
+
+        snapshot = CATALOG.snapshot
+        parts = [self.prefix]
+        for name, kind, _ in self.fields:
+            value = getattr(self, name)
+            if kind == INTEGER:
+                parts.append(str(value))
+            elif value == EMPTY:
+                parts.append(EMPTY)
+            elif kind == CATEGORY:
+                parts.append(str(snapshot.category_ids[value]))
+            else:
+                parts.append(str(snapshot.document_ids[value]))
+
+        return SEPARATOR.join(parts)
+
+    @classmethod
+    def unpack(cls, value: str) -> "CompactCallbackData":
+        """
+        Разбирает строку callback_data, упакованную pack (или прежним форматом).
+
+            Параметры:
+                value (str): строка callback_data
+
+            Возвращаемое значение:
+                callback_data (CompactCallbackData): данные кнопки
+
+            Исключения:
+                ValueError: строка не является данными кнопки этого вида
+        """
+
+        parts = value.split(SEPARATOR)
+        if parts[0] == cls.legacy_prefix:
+            # В прежнем формате могло не быть полей, добавленных в конец позже
+            parts += [str(default) for _, _, default in cls.fields[len(parts) - 1 :]]
+        if len(parts) != len(cls.fields) + 1:
+            raise ValueError(f"Неверное число полей в {value!r}")
+
+        if parts[0] == cls.prefix:
+            snapshot = CATALOG.snapshot
+            names = {
+                CATEGORY: snapshot.category_names,
+                DOCUMENT: snapshot.document_names,
+            }
+        elif parts[0] == cls.legacy_prefix:
+            names = None
+        else:
+            raise ValueError(f"Неверный префикс в {value!r}")
+
+        values = {}
+        for (name, kind, _), part in zip(cls.fields, parts[1:]):
+            if kind == INTEGER:
+                values[name] = int(part)
+            elif names is None or part == EMPTY:
+                values[name] = part
+            else:
+                try:
+                    values[name] = names[kind][int(part)]
+                except KeyError:
+                    raise ValueError(f"Неизвестный номер в {value!r}") from None
+
+        return cls(**values)
+
+    @classmethod
+    def filter(cls) -> "CompactCallbackDataFilter":
+        """Фильтр callback запросов с данными кнопок этого вида"""
+
+        return CompactCallbackDataFilter(cls)
+
+    def __eq__(self, other) -> bool:
+        return type(self) is type(other) and all(
+            getattr(self, name) == getattr(other, name) for name, _, _ in self.fields
+        )
+
+    def __repr__(self) -> str:
+        values = ", ".join(
+            f"{name}={getattr(self, name)!r}" for name, _, _ in self.fields
+        )
+        return f"{type(self).__name__}({values})"
+
+
+class CompactCallbackDataFilter(Filter):
+    """
+    Пропускает callback запросы с данными кнопок заданного вида и передаёт
+    обработчику разобранные данные в аргументе callback_data.
+    """
+
+    def __init__(self, callback_data: type[CompactCallbackData]):
+        self.callback_data = callback_data
+        self.prefixes = (
+            callback_data.prefix + SEPARATOR,
+            callback_data.legacy_prefix + SEPARATOR,
+        )
+
+    async def __call__(self, query: CallbackQuery) -> bool | dict:
+        if not query.data or not query.data.startswith(self.prefixes):
+            return False
+
+        try:
+            return {"callback_data": self.callback_data.unpack(query.data)}
+        except ValueError:
+            return False
@@ -1,57 +1,198 @@
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
-from aiogram.filters.callback_data import CallbackData
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
-from ..global_const import KEYBOARD_WIDTH, LEXICON
-from ..global_const import get_catigories, get_documents
+from ..global_const import CATALOG, DEFAULT_LOCALE, KEYBOARD_WIDTH
+from ..global_const import get_catigories, get_documents, get_documents_page
+from ..global_const import get_pages_count, get_document_page
+from ..misc.locales import get_lexicon
+from .callback_codec import CompactCallbackData, CATEGORY, DOCUMENT, EMPTY, INTEGER
 
 
-class MenuCallbackData(CallbackData, prefix="menu"):
+class MenuCallbackData(CompactCallbackData):
     """
-    Фабрика коллбэков для навигации по меню. Содержит в себе следущую информацию
+    Данные кнопок навигации по меню. Содержит в себе следущую информацию
 
     level: уровень вложенности меню
     category: текущая категория
-    document_id: название текущего документа
+    document_name: название текущего документа
+    page: номер страницы меню категории
     """
 
-    level: int
-    category: str
-    document_name: str
+    __slots__ = ("level", "category", "document_name", "page")
+
+    prefix = "m"
+    legacy_prefix = "menu"
+    fields = (
+        ("level", INTEGER, 0),
+        ("category", CATEGORY, EMPTY),
+        ("document_name", DOCUMENT, EMPTY),
+        ("page", INTEGER, 0),
+    )
 
 
-class FillDocumentCallbackData(CallbackData, prefix="fill"):
+class FillDocumentCallbackData(CompactCallbackData):
     """
-    Фабрика коллбэков для заполнения документа. Содержит в себе следущую информацию
+    Данные кнопки заполнения документа. Содержит в себе следущую информацию
 
     category: текущая категория
-    document_id: текущий документ
+    document_name: текущий документ
+    """
+
+    __slots__ = ("category", "document_name")
+
+    prefix = "f"
+    legacy_prefix = "fill"
+    fields = (
+        ("category", CATEGORY, EMPTY),
+        ("document_name", DOCUMENT, EMPTY),
+    )
+
+
+class DownloadDocumentCallbackData(CompactCallbackData):
+    """
+    Данные кнопки отправки пустого бланка документа. Содержит в себе следущую информацию
+
+    document_name: текущий документ
     """
 
-    category: str
-    document_name: str
+    __slots__ = ("document_name",)
+
+    prefix = "d"
+    legacy_prefix = "download"
+    fields = (("document_name", DOCUMENT, EMPTY),)
+
+
+class KeyboardCache:
+    """
+    Кэш готовых инлайн клавиатур меню по ключу (язык, уровень, категория,
+    документ, страница). Клавиатуры на языке собираются при первом обращении,
+    поэтому в кэше есть только языки, которыми пользуются.
+    Меню меняется только вместе с каталогом документов, поэтому клавиатура
+    собирается один раз, а при изменении каталога кэш целиком сбрасывается.
+    """
+
+    def __init__(self):
+        self.keyboards: dict[tuple[str, int, str, str, int], InlineKeyboardMarkup] = {}
+        self.version: int | None = None
+
+        self.stats = {"hits": 0, "misses": 0}
+
+    async def get(
+        self, key: tuple[str, int, str, str, int], build
+    ) -> InlineKeyboardMarkup:
+        """
+        Возвращает клавиатуру из кэша, а если её там нет -- собирает и запоминает.
+
+            Параметры:
+                key (tuple): язык, уровень вложенности, категория, документ и страница
+                build: функция без аргументов, возвращающая корутину сборки клавиатуры
+
+            Возвращаемое значение:
+                markup (InlineKeyboardMarkup): инлайн клавиатура
+        """
+
+        if self.version != CATALOG.snapshot.version:
+            self.clear()
+            self.version = CATALOG.snapshot.version
+
+        markup = self.keyboards.get(key)
+        if markup is None:
+            self.stats["misses"] += 1
+            markup = self.keyboards[key] = await build()
+        else:
+            self.stats["hits"] += 1
+
+        return markup
+
+    def clear(self):
+        self.keyboards = {}
+
+
+keyboard_cache = KeyboardCache()
 
 
 # Собирает CallbsckData с нужной информацией
 async def make_callback_data(
-    level: int, category: str = "0", document_name: str = "0"
+    level: int, category: str = "0", document_name: str = "0", page: int = 0
 ) -> MenuCallbackData:
-    return MenuCallbackData(level=level, category=category, document_name=document_name)
+    return MenuCallbackData(
+        level=level, category=category, document_name=document_name, page=page
+    )
+
+
+async def make_main_menu_keyboard(
+    locale: str = DEFAULT_LOCALE, **kwargs
+) -> InlineKeyboardMarkup:
+    """
+    Возвращает инлайн клавиатуру главного меню (см. _build_main_menu_keyboard)
+    """
+
+    return await keyboard_cache.get(
+        (locale, 0, "0", "0", 0), lambda: _build_main_menu_keyboard(locale)
+    )
+
+
+async def make_files_menu_keyboard(
+    category: str, page: int = 0, locale: str = DEFAULT_LOCALE, **kwargs
+) -> InlineKeyboardMarkup:
+    """
+    Возвращает инлайн клавиатуру страницы page меню файлов
+    (см. _build_files_menu_keyboard)
+    """
+
+    # Страницы могло стать меньше, пока сообщение с кнопкой ждало нажатия
+    page = min(max(page, 0), await get_pages_count(category) - 1)
 
+    return await keyboard_cache.get(
+        (locale, 1, category, "0", page),
+        lambda: _build_files_menu_keyboard(category, page, locale),
+    )
 
-async def make_main_menu_keyboard(**kwargs) -> InlineKeyboardMarkup:
+
+async def make_file_page_keyboard(
+    category: str, document_name: str, locale: str = DEFAULT_LOCALE, **kwargs
+) -> InlineKeyboardMarkup:
+    """
+    Возвращает инлайн клавиатуру на странице конкретного файла
+    (см. _build_file_page_keyboard)
+    """
+
+    return await keyboard_cache.get(
+        (locale, 2, category, document_name, 0),
+        lambda: _build_file_page_keyboard(category, document_name, locale),
+    )
+
+
+async def warm_up_keyboards():
+    """
+    Заранее собирает клавиатуры всех страниц меню текущего каталога на языке
+    по умолчанию
+    """
+
+    await make_main_menu_keyboard()
+    for category in await get_catigories():
+        for page in range(await get_pages_count(category)):
+            await make_files_menu_keyboard(category, page)
+        for document_name in await get_documents(category):
+            await make_file_page_keyboard(category, document_name)
+
+
+async def _build_main_menu_keyboard(
+    locale: str = DEFAULT_LOCALE, **kwargs
+) -> InlineKeyboardMarkup:
     """
     Генерирует инлайн клавиатуру главного меню
 
         Параметры:
-            Нет
+            locale (str): язык надписей
 
         Возвращаемое значение:
             keyboardb_builder.as_markup() (InlineKeyboardMarkup): инлайн клавиатура главного меню
     """
 
-    # Задаём текущий уровень вложенности
+    # Задаём текущий уровень вложенности и словарь надписей
     CURRENT_LEVEL = 0
+    lexicon = get_lexicon(locale)
 
     # Получаем набор категорий, которые необходимо отразить в меню
     categories = await get_catigories()
@@ -62,7 +203,7 @@ async def make_main_menu_keyboard(**kwargs) -> InlineKeyboardMarkup:
 
     # Для каждой категории создаём кнопку и добавляем её в массив кнопок buttons
     for category in categories:
-        text = LEXICON[category]
+        text = lexicon[category]
         callback_data = await make_callback_data(
             level=CURRENT_LEVEL + 1, category=category
         )
@@ -77,22 +218,30 @@ async def make_main_menu_keyboard(**kwargs) -> InlineKeyboardMarkup:
     return keyboardb_builder.as_markup()
 
 
-async def make_files_menu_keyboard(category: str, **kwargs) -> InlineKeyboardMarkup:
+async def _build_files_menu_keyboard(
+    category: str, page: int = 0, locale: str = DEFAULT_LOCALE, **kwargs
+) -> InlineKeyboardMarkup:
     """
-    Генерирует инлайн клавиатуру меню файлов
+    Генерирует инлайн клавиатуру страницы меню файлов. Документы категории
+    заранее разбиты каталогом на страницы, поэтому сборка клавиатуры зависит
+    только от размера страницы, а не от числа документов в категории.
 
         Параметры:
             category (str): имя текущего подраздела с файлами
+            page (int): номер страницы подраздела
+            locale (str): язык надписей
 
         Возвращаемое значение:
             keyboardb_builder.as_markup() (InlineKeyboardMarkup): инлайн клавиатура меню файлов
     """
 
-    # Задаём текущий уровень вложенности
+    # Задаём текущий уровень вложенности и словарь надписей
     CURRENT_LEVEL = 1
+    lexicon = get_lexicon(locale)
 
-    # Получаем набор документов, которые необходимо отразить в меню
-    documents = await get_documents(category)
+    # Получаем набор документов, которые необходимо отразить на странице меню
+    documents = await get_documents_page(category, page)
+    pages_count = await get_pages_count(category)
 
     # Создаём билдер будущей клавиатуры и лист кнопок в ней
     keyboardb_builder = InlineKeyboardBuilder()
@@ -100,7 +249,7 @@ async def make_files_menu_keyboard(category: str, **kwargs) -> InlineKeyboardMar
 
     # Для каждой категории создаём кнопку и добавляем её в массив кнопок buttons
     for document in documents:
-        text = LEXICON[document]
+        text = lexicon[document]
         callback_data = await make_callback_data(
             level=CURRENT_LEVEL + 1, category=category, document_name=document
         )
@@ -109,19 +258,42 @@ async def make_files_menu_keyboard(category: str, **kwargs) -> InlineKeyboardMar
             InlineKeyboardButton(text=text, callback_data=callback_data.pack())
         )
 
-    # Создаём кнопку 'Назад' для возврата в главное меню и добавляем её в массив buttons
-    text = "Назад"
-    callback_data = await make_callback_data(level=CURRENT_LEVEL - 1)
-    buttons.append(InlineKeyboardButton(text=text, callback_data=callback_data.pack()))
-
-    # Собираем клавиатуру требуемой ширины и возвращаем её
+    # Собираем клавиатуру требуемой ширины
     keyboardb_builder.row(*buttons, width=KEYBOARD_WIDTH)
 
+    # Создаём кнопки перехода на предыдущую и следующую страницы, если они есть
+    page_buttons: list[InlineKeyboardButton] = []
+    if page > 0:
+        text = lexicon["Previous page button"]
+        callback_data = await make_callback_data(
+            level=CURRENT_LEVEL, category=category, page=page - 1
+        )
+        page_buttons.append(
+            InlineKeyboardButton(text=text, callback_data=callback_data.pack())
+        )
+    if page < pages_count - 1:
+        text = lexicon["Next page button"]
+        callback_data = await make_callback_data(
+            level=CURRENT_LEVEL, category=category, page=page + 1
+        )
+        page_buttons.append(
+            InlineKeyboardButton(text=text, callback_data=callback_data.pack())
+        )
+    if page_buttons:
+        keyboardb_builder.row(*page_buttons)
+
+    # Создаём кнопку 'Назад' для возврата в главное меню
+    text = lexicon["Back button"]
+    callback_data = await make_callback_data(level=CURRENT_LEVEL - 1)
+    keyboardb_builder.row(
+        InlineKeyboardButton(text=text, callback_data=callback_data.pack())
+    )
+
     return keyboardb_builder.as_markup()
 
 
-async def make_file_page_keyboard(
-    category: str, document_name: str, **kwargs
+async def _build_file_page_keyboard(
+    category: str, document_name: str, locale: str = DEFAULT_LOCALE, **kwargs
 ) -> InlineKeyboardMarkup:
     """
     Генерирует инлайн клавиатуру на странице конкретного файла
@@ -129,30 +301,43 @@ async def make_file_page_keyboard(
         Параметры:
             category (str): имя текущего подраздела с файлами
             document_name (str): название текущего файла
+            locale (str): язык надписей
 
         Возвращаемое значение:
             keyboardb_builder.as_markup() (InlineKeyboardMarkup): инлайн клавиатура меню файлов
     """
 
-    # Задаём текущий уровень вложенности
+    # Задаём текущий уровень вложенности и словарь надписей
     CURRENT_LEVEL = 2
+    lexicon = get_lexicon(locale)
 
     # Создаём билдер будущей клавиатуры
     keyboardb_builder = InlineKeyboardBuilder()
 
     # Создаём кнопку 'Заполнить документ' для возврата в главное меню и добавляем её в массив buttons
-    text = "Заполнить документ"
+    text = lexicon["Fill document button"]
     callback_data = FillDocumentCallbackData(
         category=category, document_name=document_name
     )
     fill_button = InlineKeyboardButton(text=text, callback_data=callback_data.pack())
 
-    # Создаём кнопку 'Назад' для возврата в главное меню и добавляем её в массив buttons
-    text = "Назад"
-    callback_data = await make_callback_data(level=CURRENT_LEVEL - 1, category=category)
+    # Создаём кнопку 'Скачать бланк' для отправки пустого бланка целиком
+    text = lexicon["Download document button"]
+    callback_data = DownloadDocumentCallbackData(document_name=document_name)
+    download_button = InlineKeyboardButton(
+        text=text, callback_data=callback_data.pack()
+    )
+
+    # Создаём кнопку 'Назад' для возврата на страницу меню файлов с этим документом
+    text = lexicon["Back button"]
+    callback_data = await make_callback_data(
+        level=CURRENT_LEVEL - 1,
+        category=category,
+        page=await get_document_page(category, document_name),
+    )
     back_button = InlineKeyboardButton(text=text, callback_data=callback_data.pack())
 
     # Собираем клавиатуру требуемой ширины и возвращаем её
-    keyboardb_builder.row(fill_button, back_button, width=1)
+    keyboardb_builder.row(fill_button, download_button, back_button, width=1)
 
     return keyboardb_builder.as_markup()
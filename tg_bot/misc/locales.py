@@ -0,0 +1,125 @@
+import json
+import os
+from collections.abc import Iterator, Mapping
+
+from ..global_const import CATALOG, DEFAULT_LOCALE, DIRECTORY_FOR_LOCALES
+
+
+class Lexicon(Mapping):
+    """
+    Словарь надписей бота на одном языке: русский словарь каталога, поверх
+    которого наложены переводы из файла языка. Надписи, которых нет в файле
+    языка, остаются русскими. Приглашения ввести поля документов
+    форматируются при первом обращении и запоминаются в prompts.
+    """
+
+    __slots__ = ("locale", "version", "strings", "prompts")
+
+    def __init__(self, locale: str, version: int, strings: dict[str, str]):
+        self.locale = locale
+        self.version = version
+        self.strings = strings
+        self.prompts: dict[str, str] = {}
+
+    def __getitem__(self, key: str) -> str:
+        return self.strings[key]
+
+    def __iter__(self) -> Iterator:
+        return iter(self.strings)
+
+    def __len__(self) -> int:
+        return len(self.strings)
+
+    def prompt(self, field: str) -> str:
+        """
+        Возвращает приглашение ввести поле документа. Сессия заполнения хранит
+        цепочку полей, взятую при начале заполнения, поэтому поля уже может не
+        быть в каталоге: тогда в приглашении показывается его имя.
+
+            Параметры:
+                field (str): имя поля
+
+            Возвращаемое значение:
+                prompt (str): приглашение ввести поле
+        """
+
+        prompt = self.prompts.get(field)
+        if prompt is None:
+            label = self.strings.get(field, field)
+            prompt = self.prompts[field] = self.strings["prompt"].format(label=label)
+
+        return prompt
+
+
+class Localization:
+    """
+    Словари надписей бота на языках пользователей. Файл языка
+    (<directory>/<язык>.json) читается и собирается в словарь при первом
+    пользователе с этим языком, поэтому в памяти держатся только словари
+    языков, которыми действительно пользуются. При изменении каталога
+    документов словарь языка пересобирается при следующем обращении к нему.
+    """
+
+    def __init__(self, directory: str = DIRECTORY_FOR_LOCALES):
+        self.directory = directory
+        self.translations: dict[str, dict[str, str]] = {}
+        self.lexicons: dict[str, Lexicon] = {}
+        self.locales: dict[str | None, str] = {}
+
+    def resolve(self, language_code: str | None) -> str:
+        """
+        Возвращает язык бота для кода языка пользователя из Telegram
+        ("en-US" -> "en"). Если перевода на этот язык нет, возвращает язык
+        по умолчанию.
+        """
+
+        locale = self.locales.get(language_code)
+        if locale is None:
+            locale = (language_code or DEFAULT_LOCALE).split("-")[0].lower()
+            path = os.path.join(self.directory, f"{locale}.json")
+            if locale != DEFAULT_LOCALE and not os.path.isfile(path):
+                locale = DEFAULT_LOCALE
+            self.locales[language_code] = locale
+
+        return locale
+
+    def get(self, language_code: str | None) -> Lexicon:
+        """
+        Возвращает словарь надписей на языке пользователя.
+
+            Параметры:
+                language_code (str): код языка пользователя из Telegram или язык бота
+
+            Возвращаемое значение:
+                lexicon (Lexicon): словарь надписей
+        """
+
+        locale = self.resolve(language_code)
+        snapshot = CATALOG.snapshot
+        lexicon = self.lexicons.get(locale)
+        if lexicon is None or lexicon.version != snapshot.version:
+            strings = dict(snapshot.lexicon)
+            strings.update(self._translation(locale))
+            lexicon = self.lexicons[locale] = Lexicon(locale, snapshot.version, strings)
+
+        return lexicon
+
+    def _translation(self, locale: str) -> dict[str, str]:
+        if locale not in self.translations:
+            path = os.path.join(self.directory, f"{locale}.json")
+            translation = {}
+            if locale != DEFAULT_LOCALE:
+                with open(path, encoding="utf-8") as file:
+                    translation = json.load(file)
+            self.translations[locale] = translation
+
+        return self.translations[locale]
+
+
+localization = Localization()
+
+
+def get_lexicon(language_code: str | None = None) -> Lexicon:
+    """Возвращает словарь надписей на языке пользователя (см. Localization.get)"""
+
+    return localization.get(language_code)
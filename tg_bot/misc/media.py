@@ -0,0 +1,199 @@
+import asyncio
+import os
+
+from aiogram import Bot, types
+
+from ..global_const import DIRECTORY_FOR_PHOTOS, DIRECTORY_FOR_TEMPLATES
+from ..global_const import get_buffer_of_photos, get_buffer_of_documents
+from ..global_const import update_photo_buffer, update_document_buffer
+from .photos import optimized_photo
+from .previews import PREVIEWS
+
+# Сколько файлов одновременно загружается в Telegram при запуске бота
+PRELOAD_CONCURRENCY = 4
+
+PHOTO_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+
+class SingleFlight:
+    """
+    Не даёт одновременно выполнять одну и ту же загрузку несколько раз: пока
+    загрузка файла идёт, остальные желающие загрузить тот же файл ждут её
+    результат. Если загрузка не удалась, ошибку получают все ожидающие.
+    """
+
+    def __init__(self):
+        self.flights: dict[str, asyncio.Future] = {}
+
+    async def do(self, key: str, function):
+        """
+        Выполняет загрузку или дожидается результата уже идущей загрузки.
+
+            Параметры:
+                key (str): ключ загружаемого файла (путь к нему)
+                function: функция без аргументов, возвращающая корутину загрузки
+
+            Возвращаемое значение:
+                result: результат загрузки (file_id)
+        """
+
+        if key in self.flights:
+            # shield: отмена одного ожидающего не должна отменять загрузку
+            return await asyncio.shield(self.flights[key])
+
+        future = asyncio.get_running_loop().create_future()
+        # Ошибка считается полученной, даже если ожидающих не было
+        future.add_done_callback(
+            lambda future: future.cancelled() or future.exception()
+        )
+        self.flights[key] = future
+        try:
+            result = await function()
+        except BaseException as error:
+            if isinstance(error, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(error)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self.flights[key]
+
+
+# Идущие загрузки фото и документов
+PHOTO_UPLOADS = SingleFlight()
+DOCUMENT_UPLOADS = SingleFlight()
+
+
+async def send_photo(photo_name: str, send) -> types.Message:
+    """
+    Отправляет фото по file_id из буфера, а если его там нет -- загружает фото
+    и запоминает file_id. Одновременные запросы одного и того же фото не
+    загружают его повторно, а дожидаются file_id первой загрузки.
+
+        Параметры:
+            photo_name (str): путь к фото
+            send: функция, отправляющая сообщение с переданным фото
+                (file_id или FSInputFile) и возвращающая его
+
+        Возвращаемое значение:
+            message (Message): отправленное сообщение
+    """
+
+    photo_buffer = await get_buffer_of_photos()
+    if photo_name in photo_buffer:
+        return await send(photo_buffer[photo_name])
+
+    message = None
+
+    async def upload() -> str:
+        nonlocal message
+        message = await send(
+            types.FSInputFile(optimized_photo(photo_name), filename=photo_name)
+        )
+        await update_photo_buffer(photo_name, message.photo[-1].file_id)
+        return message.photo[-1].file_id
+
+    file_id = await PHOTO_UPLOADS.do(photo_name, upload)
+
+    # Фото загрузил другой запрос, отправляем его по полученному file_id
+    if message is None:
+        message = await send(file_id)
+
+    return message
+
+
+async def send_document(document_name: str, send) -> types.Message:
+    """
+    Отправляет документ по file_id из буфера, а если его там нет -- загружает
+    документ и запоминает file_id, см. send_photo.
+
+        Параметры:
+            document_name (str): путь к документу
+            send: функция, отправляющая сообщение с переданным документом
+                (file_id или FSInputFile) и возвращающая его
+
+        Возвращаемое значение:
+            message (Message): отправленное сообщение
+    """
+
+    documents_buffer = await get_buffer_of_documents()
+    if document_name in documents_buffer:
+        return await send(documents_buffer[document_name])
+
+    message = None
+
+    async def upload() -> str:
+        nonlocal message
+        message = await send(types.FSInputFile(document_name, filename=document_name))
+        await update_document_buffer(document_name, message.document.file_id)
+        return message.document.file_id
+
+    file_id = await DOCUMENT_UPLOADS.do(document_name, upload)
+
+    if message is None:
+        message = await send(file_id)
+
+    return message
+
+
+async def preload_media(bot: Bot, chat_id: int):
+    """
+    Загружает в служебный чат все фото меню, превью и пустые бланки документов и
+    запоминает их file_id в буферах, чтобы обработчики меню отправляли их по id
+    с первого же запроса.
+
+        Параметры:
+            bot (Bot): бот
+            chat_id (int): id служебного чата, в который загружаются файлы
+    """
+
+    semaphore = asyncio.Semaphore(PRELOAD_CONCURRENCY)
+    photo_buffer = await get_buffer_of_photos()
+    documents_buffer = await get_buffer_of_documents()
+
+    # Файлы, file_id которых уже есть в буферах, повторно не загружаются
+    photos = [
+        DIRECTORY_FOR_PHOTOS + name
+        for name in sorted(os.listdir(DIRECTORY_FOR_PHOTOS))
+        if name.lower().endswith(PHOTO_EXTENSIONS)
+        and DIRECTORY_FOR_PHOTOS + name not in photo_buffer
+    ]
+    photos += [preview for preview in PREVIEWS.values() if preview not in photo_buffer]
+    documents = [
+        DIRECTORY_FOR_TEMPLATES + name
+        for name in sorted(os.listdir(DIRECTORY_FOR_TEMPLATES))
+        if name.endswith(".pdf")
+        and DIRECTORY_FOR_TEMPLATES + name not in documents_buffer
+    ]
+
+    # Файл, который не удалось загрузить, будет загружен при первом запросе
+    await asyncio.gather(
+        *(_upload_photo(bot, chat_id, photo, semaphore) for photo in photos),
+        *(_upload_document(bot, chat_id, doc, semaphore) for doc in documents),
+        return_exceptions=True,
+    )
+
+
+async def _upload_photo(bot: Bot, chat_id: int, photo_name: str, semaphore):
+    async with semaphore:
+        message = await send_photo(
+            photo_name,
+            lambda photo: bot.send_photo(
+                chat_id=chat_id, photo=photo, disable_notification=True
+            ),
+        )
+        await message.delete()
+
+
+async def _upload_document(bot: Bot, chat_id: int, document_name: str, semaphore):
+    async with semaphore:
+        message = await send_document(
+            document_name,
+            lambda document: bot.send_document(
+                chat_id=chat_id, document=document, disable_notification=True
+            ),
+        )
+        await message.delete()
@@ -0,0 +1,130 @@
+import hashlib
+import os
+
+from PIL import Image, UnidentifiedImageError
+
+from ..global_const import DIRECTORY_FOR_PHOTOS, DIRECTORY_FOR_OPTIMIZED_PHOTOS
+
+# Telegram уменьшает фото до 1280 пикселей по большей стороне, поэтому
+# загружать фото большего размера бессмысленно
+MAX_PHOTO_SIDE = 1280
+
+# Желаемый максимальный размер оптимизированного фото в байтах и качество JPEG,
+# с которых начинается и до которых снижается подбор
+PHOTO_BYTE_BUDGET = 200 * 1024
+JPEG_QUALITIES = (85, 80, 75, 70, 65, 60, 55, 50)
+
+PHOTO_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+# Соответствие исходных фото их оптимизированным копиям
+OPTIMIZED_PHOTOS: dict[str, str] = {}
+
+
+def optimized_photo(photo_name: str) -> str:
+    """
+    Возвращает путь к оптимизированной копии фото, если она есть, иначе путь
+    к исходному фото.
+
+        Параметры:
+            photo_name (str): путь к исходному фото
+    """
+
+    return OPTIMIZED_PHOTOS.get(photo_name, photo_name)
+
+
+def optimize_photos(
+    directory: str = DIRECTORY_FOR_PHOTOS,
+    output_directory: str = DIRECTORY_FOR_OPTIMIZED_PHOTOS,
+):
+    """
+    Готовит для всех фото из директории копии, оптимальные для загрузки
+    в Telegram: не больше MAX_PHOTO_SIDE по большей стороне, прогрессивный JPEG,
+    по возможности не больше PHOTO_BYTE_BUDGET байт. Копии кэшируются по хэшу
+    исходного фото и пересобираются только при его изменении. Если копия
+    получилась не меньше исходного фото или фото не удалось прочитать,
+    используется исходное фото.
+
+        Параметры:
+            directory (str): директория с исходными фото
+            output_directory (str): директория для оптимизированных копий
+    """
+
+    os.makedirs(output_directory, exist_ok=True)
+
+    derivatives = set()
+    for name in sorted(os.listdir(directory)):
+        if not name.lower().endswith(PHOTO_EXTENSIONS):
+            continue
+
+        photo_name = directory + name
+        try:
+            with open(photo_name, "rb") as file:
+                digest = hashlib.sha256(file.read()).hexdigest()[:16]
+
+            derivative = os.path.join(
+                output_directory, f"{os.path.splitext(name)[0]}-{digest}.jpg"
+            )
+            if not os.path.isfile(derivative):
+                _build_derivative(photo_name, derivative)
+        except (OSError, UnidentifiedImageError, Image.DecompressionBombError):
+            # Повреждённое или слишком большое фото отправляется как есть
+            OPTIMIZED_PHOTOS.pop(photo_name, None)
+            continue
+        derivatives.add(os.path.basename(derivative))
+
+        if os.path.getsize(derivative) < os.path.getsize(photo_name):
+            OPTIMIZED_PHOTOS[photo_name] = derivative
+        else:
+            OPTIMIZED_PHOTOS.pop(photo_name, None)
+
+    # Удаляем копии фото, которые были изменены или удалены
+    for name in os.listdir(output_directory):
+        if name not in derivatives:
+            os.unlink(os.path.join(output_directory, name))
+
+
+def save_optimized(image: Image.Image, path: str):
+    """
+    Сохраняет изображение в виде, оптимальном для загрузки в Telegram:
+    не больше MAX_PHOTO_SIDE по большей стороне, прогрессивный JPEG,
+    по возможности не больше PHOTO_BYTE_BUDGET байт.
+
+        Параметры:
+            image (Image): изображение
+            path (str): путь, по которому сохраняется изображение
+    """
+
+    image.thumbnail((MAX_PHOTO_SIDE, MAX_PHOTO_SIDE))
+
+    # JPEG не поддерживает прозрачность, поэтому кладём фото на белый фон
+    if image.mode in ("RGBA", "LA", "P"):
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel("A"))
+        image = background
+    elif image.mode != "RGB":
+        image = image.convert("RGB")
+
+    # Снижаем качество, пока фото не уложится в желаемый размер
+    for quality in JPEG_QUALITIES:
+        image.save(
+            path,
+            "JPEG",
+            quality=quality,
+            optimize=True,
+            progressive=True,
+        )
+        if os.path.getsize(path) <= PHOTO_BYTE_BUDGET:
+            break
+
+
+def _build_derivative(photo_name: str, derivative: str):
+    # Копия появляется под своим именем, только если она сохранилась целиком
+    temporary = f"{derivative}.tmp"
+    try:
+        with Image.open(photo_name) as image:
+            save_optimized(image, temporary)
+        os.replace(temporary, derivative)
+    finally:
+        if os.path.isfile(temporary):
+            os.unlink(temporary)
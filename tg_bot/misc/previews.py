@@ -0,0 +1,141 @@
+import asyncio
+import hashlib
+import logging
+import os
+
+import pymupdf
+from PIL import Image
+
+from ..global_const import CATALOG, DIRECTORY_FOR_TEMPLATES, DIRECTORY_FOR_PREVIEWS
+from .photos import save_optimized
+
+logger = logging.getLogger(__name__)
+
+# Разрешение, с которым растеризуется первая страница бланка. Для листа A4
+# это чуть больше 1280 пикселей по высоте, до которых Telegram уменьшает фото
+PREVIEW_DPI = 120
+
+# Соответствие пустых бланков документов их превью
+PREVIEWS: dict[str, str] = {}
+
+# Время изменения (в наносекундах) и размер бланков, по которым собраны превью
+BLANK_SIGNATURES: dict[str, tuple[int, int]] = {}
+
+# Версия каталога документов, для которой собраны превью, и фоновая задача,
+# пересобирающая превью после изменения каталога или бланков
+previews_version: int | None = None
+rebuild_task: asyncio.Task | None = None
+
+
+def preview_photo(document_name: str) -> str | None:
+    """
+    Возвращает путь к превью пустого бланка документа или None, если превью нет.
+    Если с момента сборки превью каталог документов или сам бланк изменился,
+    запускает их пересборку в фоне. Пока она идёт, для прежних бланков отдаются
+    прежние превью, а для изменённого бланка превью нет.
+
+        Параметры:
+            document_name (str): путь к пустому бланку документа
+    """
+
+    global rebuild_task
+    if previews_version is None:
+        return PREVIEWS.get(document_name)
+
+    try:
+        stat = os.stat(document_name)
+        changed = BLANK_SIGNATURES.get(document_name) != (
+            stat.st_mtime_ns,
+            stat.st_size,
+        )
+    except OSError:
+        changed = document_name in BLANK_SIGNATURES
+
+    outdated = changed or previews_version != CATALOG.snapshot.version
+    if outdated and (rebuild_task is None or rebuild_task.done()):
+        rebuild_task = asyncio.get_running_loop().create_task(_rebuild_previews())
+
+    return None if changed else PREVIEWS.get(document_name)
+
+
+def build_previews(
+    directory: str = DIRECTORY_FOR_TEMPLATES,
+    output_directory: str = DIRECTORY_FOR_PREVIEWS,
+):
+    """
+    Растеризует первую страницу каждого пустого бланка из директории в сжатое
+    изображение, которое показывается на странице документа вместо самого
+    бланка. Превью кэшируются по хэшу бланка и пересобираются только при его
+    изменении. Если бланк не удалось растеризовать, на странице документа
+    показывается сам бланк. Функция читает и растеризует файлы, поэтому
+    вызывается в отдельном потоке.
+
+        Параметры:
+            directory (str): директория с пустыми бланками
+            output_directory (str): директория для превью
+    """
+
+    global previews_version
+    version = CATALOG.snapshot.version
+    os.makedirs(output_directory, exist_ok=True)
+
+    previews = set()
+    blanks = set()
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith(".pdf"):
+            continue
+
+        document_name = directory + name
+        blanks.add(document_name)
+        try:
+            # Время изменения запоминается до чтения бланка: если бланк изменят
+            # во время сборки превью, оно пересоберётся ещё раз
+            stat = os.stat(document_name)
+            BLANK_SIGNATURES[document_name] = (stat.st_mtime_ns, stat.st_size)
+            with open(document_name, "rb") as file:
+                digest = hashlib.sha256(file.read()).hexdigest()[:16]
+
+            preview = os.path.join(
+                output_directory, f"{os.path.splitext(name)[0]}-{digest}.jpg"
+            )
+            if not os.path.isfile(preview):
+                _build_preview(document_name, preview)
+        except Exception:
+            PREVIEWS.pop(document_name, None)
+            continue
+        previews.add(os.path.basename(preview))
+        PREVIEWS[document_name] = preview
+
+    # Забываем превью удалённых бланков и удаляем превью бланков, которые были
+    # изменены или удалены
+    for document_name in set(PREVIEWS) - blanks:
+        del PREVIEWS[document_name]
+    for document_name in set(BLANK_SIGNATURES) - blanks:
+        del BLANK_SIGNATURES[document_name]
+    for name in os.listdir(output_directory):
+        if name not in previews:
+            os.unlink(os.path.join(output_directory, name))
+
+    previews_version = version
+
+
+async def _rebuild_previews():
+    try:
+        await asyncio.to_thread(build_previews)
+    except Exception:
+        logger.exception("Не удалось пересобрать превью бланков")
+
+
+def _build_preview(document_name: str, preview: str):
+    with pymupdf.open(document_name) as document:
+        pixmap = document[0].get_pixmap(dpi=PREVIEW_DPI, alpha=False)
+
+    # Превью появляется под своим именем, только если оно сохранилось целиком
+    image = Image.frombytes("RGB", (pixmap.width, pixmap.height), pixmap.samples)
+    temporary = f"{preview}.tmp"
+    try:
+        save_optimized(image, temporary)
+        os.replace(temporary, preview)
+    finally:
+        if os.path.isfile(temporary):
+            os.unlink(temporary)
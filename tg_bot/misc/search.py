@@ -0,0 +1,160 @@
+from collections import OrderedDict
+
+from ..global_const import CATALOG, DEFAULT_LOCALE
+from .locales import get_lexicon
+
+# Сколько документов возвращает поиск (Telegram показывает не больше 50)
+SEARCH_RESULTS_LIMIT = 50
+
+# Сколько последних запросов и их результатов запоминается
+SEARCH_CACHE_SIZE = 1024
+
+# Минимальная доля триграмм слова запроса, которые должны найтись в названии
+# документа, чтобы он считался найденным по этому слову
+TRIGRAM_THRESHOLD = 0.4
+
+# Вес совпадения начала слова в названии документа и в названии категории
+TITLE_WEIGHT = 3
+CATEGORY_WEIGHT = 1
+
+
+def normalize(text: str) -> str:
+    """Приводит текст к виду, в котором он индексируется и ищется"""
+
+    return " ".join(text.lower().replace("ё", "е").split())
+
+
+def trigrams(word: str) -> set[str]:
+    """Возвращает триграммы слова, дополненного пробелами по краям"""
+
+    word = f" {word} "
+    return {word[i : i + 3] for i in range(len(word) - 2)}
+
+
+class TemplateSearch:
+    """
+    Поиск документов каталога по названиям документов и их категорий на одном
+    языке. Индекс строится по текущему снимку каталога и перестраивается, когда
+    каталог меняется. Индекс начал слов находит документы по первым буквам
+    любого слова названия ("тит" -> "Титульник"), а индекс триграмм --
+    по части слова и с опечатками. Документы упорядочиваются по сумме весов
+    совпадений, а результаты последних запросов запоминаются.
+    """
+
+    def __init__(
+        self, locale: str = DEFAULT_LOCALE, cache_size: int = SEARCH_CACHE_SIZE
+    ):
+        self.locale = locale
+        self.cache_size = cache_size
+        self.version: int | None = None
+
+        self.order: dict[str, int] = {}
+        self.prefixes: dict[str, dict[str, int]] = {}
+        self.trigrams: dict[str, set[str]] = {}
+        self.cache: OrderedDict[str, list[str]] = OrderedDict()
+
+        self.stats = {"queries": 0, "hits": 0}
+
+    def build(self):
+        """Строит индекс по текущему снимку каталога"""
+
+        snapshot = CATALOG.snapshot
+        lexicon = get_lexicon(self.locale)
+        self.order = {}
+        self.prefixes = {}
+        self.trigrams = {}
+        self.cache = OrderedDict()
+
+        # Документы упорядочены, как в меню: по категориям
+        for category, documents in snapshot.categories.items():
+            for document_name in documents:
+                if document_name not in self.order:
+                    self.order[document_name] = len(self.order)
+                    self._index(document_name, lexicon[document_name], TITLE_WEIGHT)
+                self._index(document_name, lexicon[category], CATEGORY_WEIGHT)
+
+        self.version = snapshot.version
+
+    def _index(self, document_name: str, text: str, weight: int):
+        for word in normalize(text).split():
+            for end in range(1, len(word) + 1):
+                matches = self.prefixes.setdefault(word[:end], {})
+                matches[document_name] = max(matches.get(document_name, 0), weight)
+
+            for trigram in trigrams(word):
+                self.trigrams.setdefault(trigram, set()).add(document_name)
+
+    def search(self, query: str) -> list[str]:
+        """
+        Ищет документы по запросу.
+
+            Параметры:
+                query (str): текст запроса
+
+            Возвращаемое значение:
+                documents (list): названия найденных документов, сначала лучшие
+        """
+
+        if self.version != CATALOG.snapshot.version:
+            self.build()
+
+        self.stats["queries"] += 1
+        query = normalize(query)
+        if query in self.cache:
+            self.stats["hits"] += 1
+            self.cache.move_to_end(query)
+            return self.cache[query]
+
+        if not query:
+            documents = list(self.order)[:SEARCH_RESULTS_LIMIT]
+        else:
+            documents = self._rank(query)
+
+        self.cache[query] = documents
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+        return documents
+
+    def _rank(self, query: str) -> list[str]:
+        scores: dict[str, float] = {}
+        for i, word in enumerate(query.split()):
+            matched = dict(self.prefixes.get(word, {}))
+
+            # Часть слова или слово с опечаткой ищем по общим триграммам
+            word_trigrams = trigrams(word)
+            common: dict[str, int] = {}
+            for trigram in word_trigrams:
+                for document_name in self.trigrams.get(trigram, ()):
+                    common[document_name] = common.get(document_name, 0) + 1
+            for document_name, count in common.items():
+                similarity = count / len(word_trigrams)
+                if similarity >= TRIGRAM_THRESHOLD or document_name in matched:
+                    matched[document_name] = matched.get(document_name, 0) + similarity
+
+            # Документ должен подходить под каждое слово запроса
+            if i == 0:
+                scores = matched
+            else:
+                scores = {
+                    document_name: score + matched[document_name]
+                    for document_name, score in scores.items()
+                    if document_name in matched
+                }
+
+        ranked = sorted(scores, key=lambda name: (-scores[name], self.order[name]))
+        return ranked[:SEARCH_RESULTS_LIMIT]
+
+
+# Индексы поиска по языкам. Индекс языка строится при первом запросе на нём
+TEMPLATE_SEARCHES: dict[str, TemplateSearch] = {}
+
+
+def get_template_search(locale: str = DEFAULT_LOCALE) -> TemplateSearch:
+    """Возвращает поиск документов по их названиям на данном языке"""
+
+    search = TEMPLATE_SEARCHES.get(locale)
+    if search is None:
+        search = TEMPLATE_SEARCHES[locale] = TemplateSearch(locale)
+
+    return search
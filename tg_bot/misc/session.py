@@ -0,0 +1,148 @@
+import json
+import sys
+
+from ..global_const import CHAINS_OF_STATES
+
+# Ключ, под которым сессия заполнения лежит в данных FSM
+SESSION_KEY = "form"
+
+# Метка сессии заполнения в сериализованных данных FSM
+SESSION_TAG = "__form__"
+
+# Цепочки полей сессий. Одинаковые цепочки всех сессий (в том числе
+# прочитанных из хранилища) ссылаются на один кортеж из этого словаря
+CHAINS: dict[tuple[str, ...], tuple[str, ...]] = {}
+
+
+class FormSession:
+    """
+    Компактная запись о заполнении документа пользователем: документ, раздел
+    меню, из которого он выбран, id пользователя, кортеж уже введённых
+    значений полей (номер текущего шага -- его длина) и цепочка полей
+    документа. Названия документа и раздела, пришедшие в коллбэке кнопки,
+    интернируются, так что все сессии документа хранят одни и те же строки.
+    Цепочка берётся из
+    каталога в начале заполнения, поэтому изменение манифеста документа во
+    время заполнения не сбивает уже начатую сессию. Сессии, сохранённые без
+    цепочки, берут её из каталога по названию документа.
+    """
+
+    __slots__ = ("document_name", "category", "user_id", "values", "chain")
+
+    def __init__(
+        self,
+        document_name: str,
+        category: str,
+        user_id: int,
+        step: int = 0,
+        values: list | None = None,
+        chain: list[str] | None = None,
+    ):
+        self.document_name = sys.intern(document_name)
+        self.category = sys.intern(category)
+        self.user_id = user_id
+
+        chain = tuple(chain if chain is not None else CHAINS_OF_STATES[document_name])
+        self.chain = CHAINS.setdefault(chain, chain)
+        self.values = tuple(values[:step]) if values else ()
+
+    @property
+    def step(self) -> int:
+        """Номер текущего шага -- число уже введённых полей"""
+
+        return len(self.values)
+
+    @property
+    def fields(self) -> tuple[str, ...]:
+        """Поля документа в порядке заполнения (без названия файла)"""
+
+        return self.chain[:-1]
+
+    @property
+    def current_state(self) -> str:
+        """Токен, который пользователь вводит на текущем шаге"""
+
+        return self.chain[self.step]
+
+    @property
+    def finished(self) -> bool:
+        """Все поля введены, осталось ввести название файла"""
+
+        return self.step >= len(self.fields)
+
+    def advance(self, value: str):
+        """
+        Запоминает значение текущего поля и переходит к следующему.
+
+            Параметры:
+                value (str): введённое пользователем значение
+        """
+
+        self.values += (value,)
+
+    def to_user_data(self) -> dict:
+        """
+        Возвращает данные пользователя в виде словаря, который принимают
+        функции заполнения документа.
+        """
+
+        user_data = dict(zip(self.fields, self.values))
+        user_data.update(
+            document_name=self.document_name,
+            category=self.category,
+            id=self.user_id,
+            iteration=self.step,
+        )
+
+        return user_data
+
+    def pack(self) -> list:
+        """Упаковывает сессию в список для сериализации"""
+
+        return [
+            self.document_name,
+            self.category,
+            self.user_id,
+            self.step,
+            list(self.values),
+            self.chain,
+        ]
+
+    @classmethod
+    def unpack(cls, packed: list) -> "FormSession":
+        """
+        Восстанавливает сессию из списка, полученного FormSession.pack. Списки
+        без цепочки полей (сохранённые до её появления в сессии) тоже
+        принимаются.
+        """
+
+        return cls(*packed)
+
+
+def session_dumps(data: dict) -> str:
+    """
+    Сериализует данные FSM в JSON, упаковывая сессии заполнения в списки.
+    Используется хранилищами состояний вместо json.dumps.
+    """
+
+    return json.dumps(data, default=_encode, ensure_ascii=False, separators=(",", ":"))
+
+
+def session_loads(text: str) -> dict:
+    """Восстанавливает данные FSM, сериализованные session_dumps"""
+
+    return json.loads(text, object_hook=_decode)
+
+
+def _encode(value):
+    if isinstance(value, FormSession):
+        return {SESSION_TAG: value.pack()}
+
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _decode(value: dict):
+    if len(value) == 1 and SESSION_TAG in value:
+        return FormSession.unpack(value[SESSION_TAG])
+
+    return value
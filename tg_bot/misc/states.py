@@ -7,7 +7,9 @@ class FSMFillPersonalData(StatesGroup):
 
     middle_state: состояние ввода персональных данных
     final_state: состояние выхода из машины состояний
+    render_state: состояние ожидания сборки документа
     """
 
     middle_state = State()
     final_state = State()
+    render_state = State()
@@ -0,0 +1,25 @@
+from .cache import PdfCache, make_cache_key
+from .engine import RenderEngine, RenderJob
+from .engine import PRIORITY_HIGH, PRIORITY_NORMAL
+from .exceptions import RenderError, RenderQueueFull, RenderTimeout, RenderCancelled
+from .templates import TemplateEngine, template_engine, render_template
+
+# Общий для всего бота движок сборки документов, запускается в bot.py
+render_engine = RenderEngine()
+
+__all__ = [
+    "render_engine",
+    "template_engine",
+    "RenderEngine",
+    "TemplateEngine",
+    "render_template",
+    "RenderJob",
+    "PdfCache",
+    "make_cache_key",
+    "RenderError",
+    "RenderQueueFull",
+    "RenderTimeout",
+    "RenderCancelled",
+    "PRIORITY_HIGH",
+    "PRIORITY_NORMAL",
+]
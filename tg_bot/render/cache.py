@@ -0,0 +1,200 @@
+import asyncio
+import hashlib
+import json
+import os
+from collections import OrderedDict
+
+from ..global_const import DIRECTORY_FOR_PDF_CACHE
+
+
+def make_cache_key(template_digest: str, fields: dict) -> str:
+    """
+    Собирает ключ кэша собранных документов из хэша исходника шаблона и значений
+    полей, которые в него подставляются.
+
+        Параметры:
+            template_digest (str): хэш исходного текста шаблона
+            fields (dict): значения полей документа
+
+        Возвращаемое значение:
+            key (str): sha256 хэш шаблона и полей
+    """
+
+    digest = hashlib.sha256(template_digest.encode("utf-8"))
+    digest.update(
+        json.dumps(fields, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    )
+
+    return digest.hexdigest()
+
+
+class PdfCache:
+    """
+    Двухуровневый LRU кэш собранных .pdf документов. Первый уровень хранит байты
+    документов в памяти, второй -- файлы в директории на диске. Каждый уровень
+    ограничен суммарным размером, при превышении вытесняются давно не
+    использованные документы. Индексы уровней меняются только в цикле событий,
+    а чтение, запись и удаление файлов выполняются в потоках, чтобы не
+    блокировать цикл событий.
+    """
+
+    def __init__(
+        self,
+        memory_size: int,
+        disk_size: int,
+        directory: str = DIRECTORY_FOR_PDF_CACHE,
+    ):
+        self.memory_size = memory_size
+        self.disk_size = disk_size
+        self.directory = directory
+
+        self.memory: OrderedDict[str, bytes] = OrderedDict()
+        self.memory_used = 0
+        self.disk: OrderedDict[str, int] = OrderedDict()
+        self.disk_used = 0
+        self.writing: set[str] = set()
+
+        self.stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "memory_evictions": 0,
+            "disk_evictions": 0,
+        }
+
+        # Восстанавливаем индекс дискового уровня, оставшийся с прошлого запуска,
+        # от давно использованных документов к недавно использованным
+        os.makedirs(self.directory, exist_ok=True)
+        entries = [entry for entry in os.scandir(self.directory) if entry.is_file()]
+        for entry in sorted(entries, key=lambda entry: entry.stat().st_mtime):
+            key, extension = os.path.splitext(entry.name)
+            if extension == ".pdf":
+                self.disk[key] = entry.stat().st_size
+                self.disk_used += self.disk[key]
+        _remove_files(self._evict_disk())
+
+    def get_memory(self, key: str) -> bytes | None:
+        """
+        Возвращает байты документа по ключу, если документ есть в памяти, иначе
+        None. Диск не проверяется, поэтому метод можно вызывать синхронно.
+
+            Параметры:
+                key (str): ключ документа, см. make_cache_key
+        """
+
+        if key not in self.memory:
+            return None
+
+        self.memory.move_to_end(key)
+        self.stats["memory_hits"] += 1
+        return self.memory[key]
+
+    async def get(self, key: str) -> bytes | None:
+        """
+        Возвращает байты документа по ключу или None, если документа нет в кэше.
+
+            Параметры:
+                key (str): ключ документа, см. make_cache_key
+        """
+
+        pdf = self.get_memory(key)
+        if pdf is not None:
+            return pdf
+
+        if key in self.disk:
+            try:
+                pdf = await asyncio.to_thread(_read_file, self._path(key))
+            except OSError:
+                # Файл могли вытеснить, пока он читался
+                if key in self.disk:
+                    self.disk_used -= self.disk.pop(key)
+            else:
+                if key in self.disk:
+                    self.disk.move_to_end(key)
+                self.stats["disk_hits"] += 1
+                self._put_memory(key, pdf)
+                return pdf
+
+        self.stats["misses"] += 1
+        return None
+
+    async def put(self, key: str, pdf: bytes):
+        """
+        Сохраняет документ в оба уровня кэша. Если записать документ на диск
+        не удалось, он остаётся только в памяти.
+
+            Параметры:
+                key (str): ключ документа, см. make_cache_key
+                pdf (bytes): содержимое собранного документа
+        """
+
+        self._put_memory(key, pdf)
+
+        if key in self.disk or key in self.writing or len(pdf) > self.disk_size:
+            return
+
+        self.writing.add(key)
+        try:
+            await asyncio.to_thread(_write_file, self._path(key), pdf)
+        except OSError:
+            return
+        finally:
+            self.writing.discard(key)
+
+        self.disk[key] = len(pdf)
+        self.disk_used += len(pdf)
+        evicted = self._evict_disk()
+        if evicted:
+            await asyncio.to_thread(_remove_files, evicted)
+
+    def _put_memory(self, key: str, pdf: bytes):
+        if key in self.memory or len(pdf) > self.memory_size:
+            return
+
+        self.memory[key] = pdf
+        self.memory_used += len(pdf)
+
+        while self.memory_used > self.memory_size:
+            _, evicted = self.memory.popitem(last=False)
+            self.memory_used -= len(evicted)
+            self.stats["memory_evictions"] += 1
+
+    def _evict_disk(self) -> list[str]:
+        # Убирает из индекса дискового уровня давно не использованные документы
+        # и возвращает пути к их файлам, которые нужно удалить
+        evicted = []
+        while self.disk_used > self.disk_size:
+            key, size = self.disk.popitem(last=False)
+            self.disk_used -= size
+            self.stats["disk_evictions"] += 1
+            evicted.append(self._path(key))
+
+        return evicted
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.pdf")
+
+
+def _read_file(path: str) -> bytes:
+    # Читает документ и отмечает его как недавно использованный, чтобы после
+    # перезапуска бота индекс диска восстановился в том же порядке
+    with open(path, "rb") as file:
+        pdf = file.read()
+    os.utime(path)
+
+    return pdf
+
+
+def _write_file(path: str, pdf: bytes):
+    # Документ появляется под своим именем только целиком, поэтому другой
+    # процесс бота не прочитает недописанный файл
+    temporary = f"{path}.tmp"
+    with open(temporary, "wb") as file:
+        file.write(pdf)
+    os.replace(temporary, path)
+
+
+def _remove_files(paths: list[str]):
+    for path in paths:
+        if os.path.isfile(path):
+            os.unlink(path)
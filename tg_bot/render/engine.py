@@ -0,0 +1,462 @@
+import asyncio
+import functools
+import itertools
+import math
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+
+from ..global_const import DIRECTORY_FOR_LATEX_FILES
+from .exceptions import RenderError, RenderQueueFull, RenderCancelled
+from .cache import PdfCache
+from .formats import FormatCache, split_preamble
+from .overlay import overlay_renderer, render_overlay
+from .tex import run_xelatex, write_source, collect_output, clean_latex_files
+from .warm import WarmPool
+
+# Классы приоритетов заданий: чем меньше число, тем раньше собирается документ.
+# Задания высокого приоритета -- повторные попытки пользователей, которым уже
+# отказали из-за переполненной очереди, -- принимаются и в заполненную очередь
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+
+# Начальная оценка времени сборки одного документа в секундах, пока не собрано
+# ни одного документа, и вес нового замера в скользящем среднем
+DEFAULT_COMPILE_TIME = 5.0
+COMPILE_TIME_SMOOTHING = 0.2
+
+
+class RenderJob:
+    """
+    Задание на сборку одного документа. Объект можно ожидать (await), результатом
+    будут байты собранного .pdf файла.
+
+    source: заполненный теховский файл
+    filename: путь к файлу без расширения, по которому будет собран документ
+    key: ключ документа в кэше собранных документов
+    owner: id пользователя, заказавшего документ
+    priority: класс приоритета задания (PRIORITY_HIGH или PRIORITY_NORMAL)
+    """
+
+    def __init__(
+        self,
+        source: str,
+        filename: str,
+        key: str = None,
+        owner: int = None,
+        priority: int = PRIORITY_NORMAL,
+    ):
+        self.source = source
+        self.filename = filename
+        self.key = key
+        self.owner = owner
+        self.priority = priority
+        self.future = asyncio.get_running_loop().create_future()
+
+    def __await__(self):
+        return self.future.__await__()
+
+    def done(self) -> bool:
+        return self.future.done()
+
+    def cancel(self):
+        """Отменяет задание. Ещё не начатая сборка не будет запущена"""
+
+        self.future.cancel()
+
+
+class RenderEngine:
+    """
+    Движок сборки теховских документов. Держит ограниченную очередь заданий и
+    несколько воркеров, каждый из которых запускает xelatex асинхронно, не
+    блокируя цикл событий бота. Размер очереди считается по ожидающим, ещё не
+    отменённым заданиям, а отмена собирающегося задания останавливает его
+    процесс xelatex.
+    """
+
+    def __init__(self):
+        self.workers = 0
+        self.timeout = None
+        self.queue_size = 0
+        self.queue: asyncio.PriorityQueue | None = None
+        self.waiting: dict[RenderJob, tuple[int, int]] = {}
+        self.running: dict[RenderJob, asyncio.Task] = {}
+        self.counter = itertools.count()
+        self.compile_time = DEFAULT_COMPILE_TIME
+        self.tasks: list[asyncio.Task] = []
+        self.formats: FormatCache | None = None
+        self.cache: PdfCache | None = None
+        self.warm: WarmPool | None = None
+        self.overlay = overlay_renderer
+        self.executor: Executor | None = None
+        self.overlay_tasks: set[asyncio.Task] = set()
+
+    async def start(
+        self,
+        workers: int = 2,
+        queue_size: int = 32,
+        timeout: float = 60,
+        formats: bool = True,
+        cache_memory_size: int = 32 * 2**20,
+        cache_disk_size: int = 256 * 2**20,
+        mode: str = "process",
+        warm_processes: int = 2,
+        executor: str = "thread",
+        executor_workers: int = 4,
+    ):
+        """
+        Запускает воркеры движка.
+
+            Параметры:
+                workers (int): число одновременно работающих компиляций
+                queue_size (int): максимальное число заданий в очереди
+                timeout (float): максимальное время сборки одного документа в секундах
+                formats (bool): использовать ли предкомпилированные форматы преамбул
+                cache_memory_size (int): размер кэша документов в памяти в байтах
+                cache_disk_size (int): размер кэша документов на диске в байтах
+                mode (str): "process" -- запускать xelatex на каждый документ,
+                    "warm" -- держать заранее запущенные процессы xelatex
+                warm_processes (int): число заранее запущенных процессов на формат
+                executor (str): пул для этапов сборки, нагружающих процессор и диск:
+                    "thread" -- пул потоков, "process" -- пул процессов
+                executor_workers (int): размер пула этапов сборки
+        """
+
+        os.makedirs(DIRECTORY_FOR_LATEX_FILES, exist_ok=True)
+
+        self.workers = workers
+        self.timeout = timeout
+        self.queue_size = queue_size
+        self.queue = asyncio.PriorityQueue()
+        self.cache = PdfCache(memory_size=cache_memory_size, disk_size=cache_disk_size)
+        self.tasks = [asyncio.create_task(self._worker()) for _ in range(workers)]
+
+        if executor == "thread":
+            self.executor = ThreadPoolExecutor(executor_workers)
+        elif executor == "process":
+            self.executor = ProcessPoolExecutor(executor_workers)
+        else:
+            raise ValueError(f"Неизвестный пул этапов сборки: {executor}")
+
+        if mode == "warm":
+            self.warm = WarmPool(warm_processes, DIRECTORY_FOR_LATEX_FILES)
+            self.warm.start()
+        elif mode != "process":
+            raise ValueError(f"Неизвестный режим движка сборки: {mode}")
+
+        # Форматы для всех шаблонов собираем в фоне, чтобы не задерживать запуск
+        # бота. Если документ попросят раньше, он дождётся сборки своего формата
+        if formats:
+            self.formats = FormatCache()
+            self.tasks.append(
+                asyncio.create_task(self.formats.warm_up(timeout=self.timeout))
+            )
+
+    async def stop(self):
+        """Останавливает воркеры и отменяет все ожидающие задания"""
+
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+        if self.warm is not None:
+            await self.warm.stop()
+            self.warm = None
+
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+        while self.queue is not None and not self.queue.empty():
+            _, _, job = self.queue.get_nowait()
+            job.future.cancel()
+        self.waiting = {}
+
+    async def run_stage(self, function, *args):
+        """
+        Выполняет этап сборки (заполнение шаблона, работу с файлами, обработку
+        .pdf) в пуле движка, чтобы не нагружать цикл событий бота. Для пула
+        процессов функция и её аргументы должны сериализоваться pickle.
+
+            Параметры:
+                function (Callable): функция этапа
+                args: аргументы функции
+
+            Возвращаемое значение:
+                результат функции
+        """
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.executor, functools.partial(function, *args)
+        )
+
+    def submit(
+        self,
+        source: str,
+        filename: str,
+        key: str = None,
+        owner: int = None,
+        priority: int = PRIORITY_NORMAL,
+    ) -> RenderJob:
+        """
+        Ставит заполненный шаблон в очередь на сборку. Если документ с таким
+        ключом лежит в памяти кэша, возвращает готовое задание, не запуская
+        xelatex (документы на диске кэша находит lookup).
+        Если очередь заполнена, выбрасывает RenderQueueFull (кроме заданий
+        с приоритетом PRIORITY_HIGH).
+
+            Параметры:
+                source (str): заполненный теховский файл
+                filename (str): путь к файлу без расширения
+                key (str): ключ документа в кэше, см. make_cache_key
+                owner (int): id пользователя, заказавшего документ
+                priority (int): класс приоритета задания
+
+            Возвращаемое значение:
+                job (RenderJob): задание, которое можно ожидать
+        """
+
+        if self.queue is None:
+            raise RenderError("Движок сборки документов не запущен")
+
+        job = RenderJob(source, filename, key, owner, priority)
+        if self._from_cache(job):
+            return job
+
+        # Отменённые задания остаются в очереди, пока до них не дойдёт воркер,
+        # но места в ней не занимают: размер очереди -- число ожидающих заданий
+        if priority != PRIORITY_HIGH and len(self.waiting) >= self.queue_size:
+            raise RenderQueueFull("Очередь на сборку документов переполнена")
+
+        # Внутри одного класса приоритета задания собираются в порядке поступления
+        order = (priority, next(self.counter))
+        self.queue.put_nowait((*order, job))
+        self.waiting[job] = order
+        job.future.add_done_callback(lambda _: self.waiting.pop(job, None))
+
+        return job
+
+    def position(self, job: RenderJob) -> int:
+        """
+        Возвращает место задания в очереди (начиная с 1) или 0, если задание
+        уже собирается или завершено.
+
+            Параметры:
+                job (RenderJob): задание на сборку
+        """
+
+        if job not in self.waiting:
+            return 0
+
+        order = self.waiting[job]
+        ahead = sum(1 for other_order in self.waiting.values() if other_order < order)
+
+        return ahead + 1
+
+    def eta(self, job: RenderJob) -> float:
+        """
+        Оценивает, через сколько секунд будет готово задание, исходя из
+        среднего времени сборки одного документа.
+
+            Параметры:
+                job (RenderJob): задание на сборку
+        """
+
+        if job.done():
+            return 0.0
+
+        rounds = math.ceil(self.position(job) / self.workers) + 1
+        return rounds * self.compile_time
+
+    def cancel_user_jobs(self, owner: int):
+        """
+        Отменяет все незавершённые задания пользователя. Ожидающие их получат
+        RenderCancelled, ещё не начатая сборка не будет запущена, а уже идущая
+        будет прервана.
+
+            Параметры:
+                owner (int): id пользователя
+        """
+
+        for job in [*self.waiting, *self.running]:
+            if job.owner == owner and not job.done():
+                job.future.set_exception(RenderCancelled("Сборка отменена"))
+
+    def submit_overlay(
+        self, document_name: str, user_data: dict, key: str = None
+    ) -> RenderJob:
+        """
+        Заполняет документ без TeX, печатая данные пользователя поверх пустого
+        бланка. Такие задания не ждут в очереди xelatex.
+
+            Параметры:
+                document_name (str): название документа
+                user_data (dict): словарь с данными пользователя
+                key (str): ключ документа в кэше, см. make_cache_key
+
+            Возвращаемое значение:
+                job (RenderJob): задание, которое можно ожидать
+        """
+
+        job = RenderJob(None, None, key)
+        if self._from_cache(job):
+            return job
+
+        # Поля и хэш бланка берутся из каталога здесь: процессы пула этапов
+        # сборки не видят изменений каталога
+        fields, digest = self.overlay.declaration(document_name)
+        task = asyncio.create_task(
+            self._overlay(job, document_name, user_data, fields, digest)
+        )
+        self.overlay_tasks.add(task)
+        task.add_done_callback(self.overlay_tasks.discard)
+
+        return job
+
+    async def lookup(self, key: str) -> RenderJob | None:
+        """
+        Ищет собранный документ в кэше, читая его с диска в отдельном потоке.
+        Стоит вызывать до заполнения шаблона: найденный документ не нужно ни
+        заполнять, ни собирать.
+
+            Параметры:
+                key (str): ключ документа в кэше, см. make_cache_key
+
+            Возвращаемое значение:
+                job (RenderJob): завершённое задание или None, если документа нет
+        """
+
+        if key is None or self.cache is None:
+            return None
+
+        pdf = await self.cache.get(key)
+        if pdf is None:
+            return None
+
+        job = RenderJob(None, None, key)
+        job.future.set_result(pdf)
+        return job
+
+    def _from_cache(self, job: RenderJob) -> bool:
+        # Если документ с таким ключом только что собирался и ещё лежит в
+        # памяти, сразу завершаем задание. Диск проверяет lookup
+        if job.key is None or self.cache is None:
+            return False
+
+        pdf = self.cache.get_memory(job.key)
+        if pdf is None:
+            return False
+
+        job.future.set_result(pdf)
+        return True
+
+    async def _overlay(
+        self,
+        job: RenderJob,
+        document_name: str,
+        user_data: dict,
+        fields: list[dict],
+        digest: str,
+    ):
+        try:
+            pdf = await self.run_stage(
+                render_overlay, document_name, user_data, fields, digest
+            )
+        except Exception as error:
+            if not job.done():
+                job.future.set_exception(RenderError(str(error)))
+            return
+
+        if not job.done():
+            job.future.set_result(pdf)
+        if job.key is not None and self.cache is not None:
+            await self.cache.put(job.key, pdf)
+
+    async def _worker(self):
+        while True:
+            _, _, job = await self.queue.get()
+            self.waiting.pop(job, None)
+            try:
+                if not job.done():
+                    await self._run(job)
+            finally:
+                self.queue.task_done()
+
+    async def _run(self, job: RenderJob):
+        # Документ собирается в отдельной задаче: если задание отменят во время
+        # сборки, задача будет отменена вместе с процессом xelatex, а воркер
+        # перейдёт к следующему заданию
+        start = time.perf_counter()
+        task = asyncio.create_task(self._compile(job))
+        job.future.add_done_callback(lambda _: task.cancel())
+        self.running[job] = task
+        try:
+            await asyncio.wait({task})
+        except asyncio.CancelledError:
+            # Останавливается сам воркер
+            task.cancel()
+            await asyncio.wait({task})
+            if not job.done():
+                job.future.cancel()
+            raise
+        finally:
+            self.running.pop(job, None)
+
+        if job.done():
+            return
+        if task.exception() is not None:
+            job.future.set_exception(task.exception())
+            return
+
+        self.compile_time += COMPILE_TIME_SMOOTHING * (
+            time.perf_counter() - start - self.compile_time
+        )
+        job.future.set_result(task.result())
+
+        # Документ сохраняется в кэш, когда пользователь его уже получил
+        if job.key is not None:
+            await self.cache.put(job.key, task.result())
+
+    async def _compile(self, job: RenderJob) -> bytes:
+        # Если для преамбулы шаблона есть предкомпилированный формат,
+        # собираем только тело документа поверх него
+        fmt = None
+        source = job.source
+        if self.formats is not None:
+            preamble, body = split_preamble(job.source)
+            if preamble is not None:
+                fmt = await self.formats.get_format(preamble, self.timeout)
+                if fmt is not None:
+                    source = body
+
+        # Записываем заполненный шаблон в теховский файл
+        await self.run_stage(write_source, job.filename, source)
+
+        # Собираем полученный теховский файл либо в заранее запущенном процессе,
+        # либо в новом. Заранее запущенный процесс сохраняет документ под своим именем
+        try:
+            if self.warm is not None:
+                process = await self.warm.acquire(fmt)
+                output = process.filename
+                returncode = await process.run(f"{job.filename}.tex", self.timeout)
+            else:
+                output = job.filename
+                returncode = await run_xelatex(
+                    *([f"-fmt={fmt}"] if fmt is not None else []),
+                    f"-output-directory={os.path.dirname(job.filename) or '.'}",
+                    f"{job.filename}.tex",
+                    timeout=self.timeout,
+                )
+        except BaseException:
+            clean_latex_files(job.filename)
+            raise
+
+        # Забираем собранный документ в память, удаляем его с диска и очищаем
+        # директорию ото всех временных теховских файлов
+        pdf = await self.run_stage(collect_output, output, job.filename)
+        if returncode != 0 or pdf is None:
+            raise RenderError(f"xelatex завершился с кодом {returncode}")
+
+        return pdf
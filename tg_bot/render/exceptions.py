@@ -0,0 +1,14 @@
+class RenderError(Exception):
+    """Ошибка сборки документа"""
+
+
+class RenderQueueFull(RenderError):
+    """Очередь на сборку документов переполнена"""
+
+
+class RenderTimeout(RenderError):
+    """Сборка документа не уложилась в отведённое время"""
+
+
+class RenderCancelled(RenderError):
+    """Сборка документа отменена пользователем"""
@@ -0,0 +1,125 @@
+import asyncio
+import hashlib
+import os
+
+from ..global_const import DIRECTORY_FOR_FORMATS, DIRECTORY_FOR_TEMPLATES
+from .exceptions import RenderTimeout
+from .tex import run_xelatex, clean_latex_files
+
+# Метка в шаблоне, отделяющая сохраняемую в формат часть преамбулы. В обычной
+# сборке \csname ...\endcsname без определения раскрывается в \relax, поэтому
+# шаблон с меткой собирается и без формата
+END_OF_DUMP = r"\csname endofdump\endcsname"
+
+
+def split_preamble(source: str) -> tuple[str | None, str]:
+    """
+    Разделяет шаблон на часть преамбулы, которую можно сохранить в формат,
+    и оставшуюся часть документа. Если в шаблоне нет метки END_OF_DUMP,
+    сохраняемая часть равна None, а документ возвращается целиком.
+
+        Параметры:
+            source (str): текст теховского шаблона
+
+        Возвращаемое значение:
+            (preamble, body) (tuple): сохраняемая преамбула и тело документа
+    """
+
+    position = source.find(END_OF_DUMP)
+    if position == -1:
+        return None, source
+
+    return source[:position], source[position:]
+
+
+class FormatCache:
+    """
+    Кэш предкомпилированных форматов xelatex. В формат сохраняется загрузка
+    класса документа и всех пакетов из преамбулы шаблона, так что при сборке
+    документа xelatex обрабатывает только его тело. Имя формата
+    содержит хэш преамбулы, поэтому при её изменении формат пересобирается сам.
+    """
+
+    def __init__(self, directory: str = DIRECTORY_FOR_FORMATS):
+        self.directory = directory
+        self.formats: dict[str, str | None] = {}
+        self.locks: dict[str, asyncio.Lock] = {}
+
+    async def get_format(self, preamble: str, timeout: float = None) -> str | None:
+        """
+        Возвращает путь к формату (без расширения .fmt) для данной преамбулы,
+        собирая его при первом обращении. Если формат собрать не удалось,
+        возвращает None, и документ собирается обычным образом.
+
+            Параметры:
+                preamble (str): сохраняемая в формат часть преамбулы
+                timeout (float): максимальное время сборки формата в секундах
+        """
+
+        digest = hashlib.sha256(preamble.encode("utf-8")).hexdigest()[:16]
+        if digest in self.formats:
+            return self.formats[digest]
+
+        # Одновременные запросы с одной преамбулой ждут одной сборки формата
+        lock = self.locks.setdefault(digest, asyncio.Lock())
+        async with lock:
+            if digest not in self.formats:
+                self.formats[digest] = await self._build(digest, preamble, timeout)
+
+        return self.formats[digest]
+
+    async def warm_up(
+        self, directory: str = DIRECTORY_FOR_TEMPLATES, timeout: float = None
+    ):
+        """
+        Заранее собирает форматы для всех шаблонов из директории.
+
+            Параметры:
+                directory (str): директория с теховскими шаблонами
+                timeout (float): максимальное время сборки одного формата в секундах
+        """
+
+        preambles = []
+        for name in sorted(os.listdir(directory)):
+            if not name.endswith(".tex"):
+                continue
+            with open(os.path.join(directory, name), encoding="utf-8") as file:
+                preamble, _ = split_preamble(file.read())
+            if preamble is not None:
+                preambles.append(preamble)
+
+        await asyncio.gather(
+            *(self.get_format(preamble, timeout) for preamble in preambles),
+            return_exceptions=True,
+        )
+
+    async def _build(self, digest: str, preamble: str, timeout: float) -> str | None:
+        os.makedirs(self.directory, exist_ok=True)
+
+        name = os.path.join(self.directory, f"preamble-{digest}")
+        if os.path.isfile(f"{name}.fmt"):
+            return name
+
+        # Поверх стандартного формата xelatex выполняем сохраняемую часть
+        # преамбулы и сбрасываем получившееся состояние TeX в новый формат
+        with open(f"{name}.tex", "w", encoding="utf-8") as file:
+            file.write(preamble + "\n\\dump\n")
+
+        try:
+            returncode = await run_xelatex(
+                "-ini",
+                f"-jobname=preamble-{digest}",
+                f"-output-directory={self.directory}",
+                "&xelatex",
+                f"{name}.tex",
+                timeout=timeout,
+            )
+        except RenderTimeout:
+            return None
+        finally:
+            clean_latex_files(name)
+
+        if returncode != 0 or not os.path.isfile(f"{name}.fmt"):
+            return None
+
+        return name
@@ -0,0 +1,245 @@
+import hashlib
+import io
+import json
+import logging
+import os
+
+from pypdf import PdfReader, PdfWriter
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+
+from ..global_const import DIRECTORY_FOR_FONTS, DIRECTORY_FOR_TEMPLATES
+from ..global_const import OVERLAY_FIELDS, TEMPLATE_BACKENDS
+from .exceptions import RenderError
+
+logger = logging.getLogger(__name__)
+
+# Минимальный размер шрифта, до которого уменьшается не влезающий в поле текст
+MIN_FONT_SIZE = 6
+
+
+class OverlayRenderer:
+    """
+    Заполняет документы без TeX: поверх готового пустого бланка шаблона
+    (database/templates/<документ>.pdf) в объявленных в OVERLAY_FIELDS
+    координатах закрашивается место под поле и печатается введённый текст.
+    Шрифты встраиваются в документ, поэтому кириллица отображается корректно.
+
+    Заполнение может выполняться в процессе пула, где каталог документов
+    не перечитывается, поэтому поля бланка и хэш бланка берутся из каталога
+    в процессе бота (см. declaration) и передаются в render.
+    """
+
+    def __init__(
+        self,
+        directory: str = DIRECTORY_FOR_TEMPLATES,
+        fonts_directory: str = DIRECTORY_FOR_FONTS,
+    ):
+        self.directory = directory
+        self.fonts_directory = fonts_directory
+        self.fonts: set[str] = set()
+        self.blanks: dict[str, tuple[float, bytes, str]] = {}
+
+    def available(self, document_name: str) -> bool:
+        """
+        Проверяет, можно ли заполнить документ без TeX: для него объявлены поля,
+        есть пустой бланк и все нужные шрифты.
+
+            Параметры:
+                document_name (str): название документа
+        """
+
+        if document_name not in OVERLAY_FIELDS:
+            return False
+
+        return not self.missing_files(document_name)
+
+    def missing_files(self, document_name: str) -> list[str]:
+        """
+        Возвращает пути к пустому бланку и шрифтам документа, которых нет на диске.
+
+            Параметры:
+                document_name (str): название документа
+        """
+
+        paths = [os.path.join(self.directory, f"{document_name}.pdf")]
+        paths += [
+            os.path.join(self.fonts_directory, field["font"])
+            for field in OVERLAY_FIELDS.get(document_name, [])
+        ]
+
+        return [path for path in dict.fromkeys(paths) if not os.path.isfile(path)]
+
+    def report_fallbacks(self):
+        """
+        Предупреждает в логе о документах, которые объявлены заполняемыми без
+        TeX, но из-за отсутствующих полей бланка, самого бланка или шрифтов
+        будут собираться xelatex.
+        """
+
+        for document_name, backend in TEMPLATE_BACKENDS.items():
+            if backend != "overlay":
+                continue
+
+            if document_name not in OVERLAY_FIELDS:
+                missing = "описание полей бланка в манифесте"
+            else:
+                missing = ", ".join(self.missing_files(document_name))
+            if missing:
+                logger.warning(
+                    "Документ %s будет собираться xelatex, не хватает: %s",
+                    document_name,
+                    missing,
+                )
+
+    def declaration(self, document_name: str) -> tuple[list[dict], str]:
+        """
+        Возвращает поля бланка документа из текущего каталога и хэш пустого
+        бланка, по которым документ заполняется и ищется в кэше.
+
+            Параметры:
+                document_name (str): название документа
+
+            Возвращаемое значение:
+                fields (list): поля бланка
+                digest (str): sha256 хэш пустого бланка
+        """
+
+        _, digest = self._load_blank(document_name)
+        return OVERLAY_FIELDS[document_name], digest
+
+    def get_digest(self, document_name: str) -> str:
+        """
+        Возвращает хэш пустого бланка документа вместе с объявлением его полей.
+
+            Параметры:
+                document_name (str): название документа
+        """
+
+        fields, digest = self.declaration(document_name)
+        declaration = json.dumps(fields, sort_keys=True)
+
+        return hashlib.sha256(f"{digest}{declaration}".encode("utf-8")).hexdigest()
+
+    def render(
+        self, document_name: str, user_data: dict, fields: list[dict], digest: str
+    ) -> bytes:
+        """
+        Печатает данные пользователя на пустом бланке документа. Если бланк на
+        диске уже не тот, по которому документ ищется в кэше, выбрасывает
+        RenderError, чтобы в кэш не попал документ на другом бланке.
+
+            Параметры:
+                document_name (str): название документа
+                user_data (dict): словарь с данными пользователя
+                fields (list): поля бланка, см. declaration
+                digest (str): хэш пустого бланка, см. declaration
+
+            Возвращаемое значение:
+                pdf (bytes): содержимое заполненного документа
+        """
+
+        blank, blank_digest = self._load_blank(document_name)
+        if blank_digest != digest:
+            raise RenderError(f"Бланк документа {document_name} изменился")
+        reader = PdfReader(io.BytesIO(blank))
+
+        # Для каждой страницы бланка, на которой есть поля, рисуем отдельный
+        # слой с текстом полей и накладываем его на страницу
+        fields_by_page: dict[int, list[dict]] = {}
+        for field in fields:
+            fields_by_page.setdefault(field.get("page", 0), []).append(field)
+
+        writer = PdfWriter()
+        for number, page in enumerate(reader.pages):
+            if number in fields_by_page:
+                page.merge_page(
+                    self._draw_layer(page, fields_by_page[number], user_data)
+                )
+            writer.add_page(page)
+
+        output = io.BytesIO()
+        writer.write(output)
+
+        return output.getvalue()
+
+    def _draw_layer(self, page, fields: list[dict], user_data: dict):
+        width, height = float(page.mediabox.width), float(page.mediabox.height)
+
+        layer = io.BytesIO()
+        pdf = canvas.Canvas(layer, pagesize=(width, height))
+
+        for field in fields:
+            font = self._register_font(field["font"])
+            text = str(user_data.get(field["field"], ""))
+
+            # Подбираем размер шрифта так, чтобы текст влез в ширину поля
+            size = field["size"]
+            text_width = pdfmetrics.stringWidth(text, font, size)
+            if text_width > field["width"]:
+                size = max(MIN_FONT_SIZE, size * field["width"] / text_width)
+
+            # Закрашиваем место под поле, чтобы скрыть текст-заглушку бланка
+            pdf.setFillColorRGB(1, 1, 1)
+            pdf.rect(
+                field["x"],
+                field["y"] - 0.3 * field["size"],
+                field["width"],
+                1.2 * field["size"],
+                stroke=0,
+                fill=1,
+            )
+
+            pdf.setFillColorRGB(0, 0, 0)
+            pdf.setFont(font, size)
+            if field.get("align") == "center":
+                pdf.drawCentredString(field["x"] + field["width"] / 2, field["y"], text)
+            else:
+                pdf.drawString(field["x"], field["y"], text)
+
+        pdf.save()
+
+        return PdfReader(layer).pages[0]
+
+    def _register_font(self, font_file: str) -> str:
+        name = os.path.splitext(font_file)[0]
+        if name not in self.fonts:
+            path = os.path.join(self.fonts_directory, font_file)
+            try:
+                pdfmetrics.registerFont(TTFont(name, path))
+            except Exception as error:
+                raise RenderError(f"Не удалось загрузить шрифт {path}: {error}")
+            self.fonts.add(name)
+
+        return name
+
+    def _load_blank(self, document_name: str) -> tuple[bytes, str]:
+        # Бланк перечитывается с диска, только если изменилось время его модификации
+        path = os.path.join(self.directory, f"{document_name}.pdf")
+        mtime = os.path.getmtime(path)
+
+        if document_name not in self.blanks or self.blanks[document_name][0] != mtime:
+            with open(path, "rb") as file:
+                blank = file.read()
+            self.blanks[document_name] = (
+                mtime,
+                blank,
+                hashlib.sha256(blank).hexdigest(),
+            )
+
+        _, blank, digest = self.blanks[document_name]
+        return blank, digest
+
+
+# Общий для всего бота (и для каждого процесса пула, в котором выполняются
+# этапы сборки) заполнитель бланков
+overlay_renderer = OverlayRenderer()
+
+
+def render_overlay(
+    document_name: str, user_data: dict, fields: list[dict], digest: str
+) -> bytes:
+    """Печатает данные пользователя на пустом бланке, см. OverlayRenderer.render"""
+
+    return overlay_renderer.render(document_name, user_data, fields, digest)
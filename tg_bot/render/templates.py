@@ -0,0 +1,135 @@
+import hashlib
+import logging
+import os
+import time
+
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+
+from ..global_const import DIRECTORY_FOR_JINJA_CACHE, DIRECTORY_FOR_TEMPLATES
+
+logger = logging.getLogger(__name__)
+
+# Замены специальных символов TeX во введённых пользователем данных
+LATEX_ESCAPES = str.maketrans(
+    {
+        "\\": r"\textbackslash{}",
+        "{": r"\{",
+        "}": r"\}",
+        "$": r"\$",
+        "&": r"\&",
+        "#": r"\#",
+        "%": r"\%",
+        "_": r"\_",
+        "^": r"\textasciicircum{}",
+        "~": r"\textasciitilde{}",
+    }
+)
+
+
+def escape_latex(text: str) -> str:
+    """Экранирует специальные символы TeX в строке"""
+
+    return text.translate(LATEX_ESCAPES)
+
+
+class TemplateEngine:
+    """
+    Единое на весь бот jinja окружение для теховских шаблонов. Скомпилированные
+    шаблоны хранятся в памяти, а их байткод -- на диске, поэтому после перезапуска
+    бота шаблоны не компилируются заново. Шаблон перечитывается с диска, только
+    если изменилось время его модификации.
+    """
+
+    def __init__(
+        self,
+        directory: str = DIRECTORY_FOR_TEMPLATES,
+        bytecode_directory: str = DIRECTORY_FOR_JINJA_CACHE,
+    ):
+        os.makedirs(bytecode_directory, exist_ok=True)
+
+        self.directory = directory
+        self.environment = Environment(
+            loader=FileSystemLoader(directory),
+            bytecode_cache=FileSystemBytecodeCache(bytecode_directory),
+            auto_reload=True,
+            cache_size=-1,
+        )
+        self.digests: dict[str, tuple[float, str]] = {}
+
+    def warm_up(self):
+        """Заранее компилирует все теховские шаблоны из директории шаблонов"""
+
+        for name in self.environment.list_templates(extensions=["tex"]):
+            self.environment.get_template(name)
+            self.get_digest(os.path.splitext(name)[0])
+
+    def render(self, document_name: str, user_data: dict) -> str:
+        """
+        Заполняет шаблон документа данными пользователя.
+
+            Параметры:
+                document_name (str): название документа
+                user_data (dict): словарь с данными пользователя
+
+            Возвращаемое значение:
+                filled_file (str): заполненный теховский файл
+        """
+
+        start = time.perf_counter()
+
+        template = self.environment.get_template(f"{document_name}.tex")
+        filled_file = template.render(user_data=user_data)
+
+        logger.debug(
+            "Шаблон %s заполнен за %.2f мс",
+            document_name,
+            (time.perf_counter() - start) * 1000,
+        )
+
+        return filled_file
+
+    def get_digest(self, document_name: str) -> str:
+        """
+        Возвращает sha256 хэш исходника шаблона документа. Хэш пересчитывается,
+        только если изменилось время модификации файла шаблона.
+
+            Параметры:
+                document_name (str): название документа
+        """
+
+        path = os.path.join(self.directory, f"{document_name}.tex")
+        mtime = os.path.getmtime(path)
+
+        if document_name not in self.digests or self.digests[document_name][0] != mtime:
+            with open(path, "rb") as file:
+                digest = hashlib.sha256(file.read()).hexdigest()
+            self.digests[document_name] = (mtime, digest)
+
+        return self.digests[document_name][1]
+
+
+# Общее для всего бота (и для каждого процесса пула, в котором выполняются
+# этапы сборки) jinja окружение теховских шаблонов
+template_engine = TemplateEngine()
+
+
+def render_template(document_name: str, user_data: dict) -> str:
+    """
+    Экранирует введённые пользователем строки и заполняет ими шаблон документа.
+    Функция выполняется в пуле этапов сборки, в том числе в пуле процессов,
+    поэтому время заполнения не копится в общем счётчике, а пишется в лог.
+
+        Параметры:
+            document_name (str): название документа
+            user_data (dict): словарь с данными пользователя
+
+        Возвращаемое значение:
+            filled_file (str): заполненный теховский файл
+    """
+
+    escaped = {
+        field: escape_latex(value) if isinstance(value, str) else value
+        for field, value in user_data.items()
+    }
+
+    return template_engine.render(document_name, escaped)
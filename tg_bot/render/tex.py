@@ -0,0 +1,78 @@
+import asyncio
+import os
+
+from .exceptions import RenderTimeout
+
+# Расширения временных файлов, которые оставляет после себя xelatex
+LATEX_TMP_EXTENSIONS = ("aux", "idx", "log", "out", "tex")
+
+
+async def run_xelatex(*args: str, timeout: float = None) -> int:
+    """
+    Асинхронно запускает xelatex с переданными аргументами, не дожидаясь
+    пользовательского ввода при ошибках и не блокируя цикл событий.
+
+        Параметры:
+            args (str): аргументы командной строки xelatex
+            timeout (float): максимальное время работы процесса в секундах
+
+        Возвращаемое значение:
+            returncode (int): код завершения xelatex
+    """
+
+    process = await asyncio.create_subprocess_exec(
+        "xelatex",
+        "-interaction=batchmode",
+        "-halt-on-error",
+        *args,
+        stdin=asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.DEVNULL,
+        stderr=asyncio.subprocess.DEVNULL,
+    )
+    try:
+        return await asyncio.wait_for(process.wait(), timeout=timeout)
+    except asyncio.TimeoutError:
+        raise RenderTimeout(f"xelatex не уложился в {timeout} с")
+    finally:
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+
+
+def clean_latex_files(filename: str):
+    """Очищает директорию ото всех временных теховских файлов"""
+
+    for extension in LATEX_TMP_EXTENSIONS:
+        if os.path.isfile(f"{filename}.{extension}"):
+            os.unlink(f"{filename}.{extension}")
+
+
+def write_source(filename: str, source: str):
+    """Записывает заполненный шаблон в теховский файл filename.tex"""
+
+    with open(f"{filename}.tex", "w", encoding="utf-8") as file:
+        file.write(source)
+
+
+def collect_output(output: str, filename: str) -> bytes | None:
+    """
+    Забирает собранный документ output.pdf в память, удаляет его с диска и
+    очищает временные теховские файлы сборки filename.
+
+        Параметры:
+            output (str): путь к собранному документу без расширения
+            filename (str): путь к теховскому файлу документа без расширения
+
+        Возвращаемое значение:
+            pdf (bytes): содержимое документа или None, если документ не собрался
+    """
+
+    clean_latex_files(filename)
+    if not os.path.isfile(f"{output}.pdf"):
+        return None
+
+    with open(f"{output}.pdf", "rb") as file:
+        pdf = file.read()
+    os.unlink(f"{output}.pdf")
+
+    return pdf
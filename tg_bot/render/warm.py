@@ -0,0 +1,167 @@
+import asyncio
+import os
+import uuid
+
+from .exceptions import RenderError, RenderTimeout
+from .tex import clean_latex_files
+
+# Как часто (в секундах) пул проверяет, что его процессы живы
+HEALTH_CHECK_INTERVAL = 30
+
+
+class WarmProcess:
+    """
+    Заранее запущенный процесс xelatex. Процесс стартует, загружает формат и
+    ждёт на стандартном вводе первую строку, в которой ему передаётся файл
+    документа. Таким образом запуск процесса и загрузка формата происходят до
+    того, как документ понадобится пользователю.
+
+    fmt: путь к формату, с которым запущен процесс (None -- стандартный формат)
+    jobname: имя, под которым процесс сохранит собранный документ
+    """
+
+    def __init__(self, fmt: str | None, directory: str):
+        self.fmt = fmt
+        self.directory = directory
+        self.jobname = f"warm-{uuid.uuid4().hex}"
+        self.process: asyncio.subprocess.Process | None = None
+
+    @property
+    def filename(self) -> str:
+        return os.path.join(self.directory, self.jobname)
+
+    async def spawn(self):
+        args = [f"-fmt={self.fmt}"] if self.fmt is not None else []
+        self.process = await asyncio.create_subprocess_exec(
+            "xelatex",
+            "-halt-on-error",
+            *args,
+            f"-jobname={self.jobname}",
+            f"-output-directory={self.directory}",
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.DEVNULL,
+        )
+
+    def alive(self) -> bool:
+        return self.process is not None and self.process.returncode is None
+
+    async def run(self, tex_file: str, timeout: float = None) -> int:
+        """
+        Собирает документ в уже запущенном процессе.
+
+            Параметры:
+                tex_file (str): путь к теховскому файлу документа
+                timeout (float): максимальное время сборки в секундах
+
+            Возвращаемое значение:
+                returncode (int): код завершения xelatex
+        """
+
+        # Переводим TeX в пакетный режим, чтобы при ошибке он не ждал ввода,
+        # и подключаем файл документа
+        try:
+            self.process.stdin.write(f"\\batchmode\\input{{{tex_file}}}\n".encode())
+            await self.process.stdin.drain()
+            self.process.stdin.close()
+            return await asyncio.wait_for(self.process.wait(), timeout=timeout)
+        except (BrokenPipeError, ConnectionResetError):
+            raise RenderError("Процесс xelatex завершился до начала сборки")
+        except asyncio.TimeoutError:
+            raise RenderTimeout(f"xelatex не уложился в {timeout} с")
+        finally:
+            await self.kill()
+
+    async def kill(self):
+        if self.alive():
+            self.process.kill()
+            await self.process.wait()
+        clean_latex_files(self.filename)
+
+
+class WarmPool:
+    """
+    Пул заранее запущенных процессов xelatex, отдельный для каждого формата.
+    Каждый процесс собирает ровно один документ, после чего в фоне на его место
+    запускается новый. Упавшие процессы пул периодически заменяет.
+    """
+
+    def __init__(self, size: int, directory: str):
+        self.size = size
+        self.directory = directory
+        self.standby: dict[str | None, list[WarmProcess]] = {}
+        self.pending: dict[str | None, int] = {}
+        self.tasks: set[asyncio.Task] = set()
+        self.health_task: asyncio.Task | None = None
+
+    def start(self):
+        self.health_task = asyncio.create_task(self._health_check())
+
+    async def stop(self):
+        tasks = list(self.tasks)
+        if self.health_task is not None:
+            tasks.append(self.health_task)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        for processes in self.standby.values():
+            for process in processes:
+                await process.kill()
+        self.standby = {}
+
+    async def acquire(self, fmt: str | None) -> WarmProcess:
+        """
+        Возвращает готовый к работе процесс для данного формата. Если готовых
+        процессов нет, запускает новый.
+
+            Параметры:
+                fmt (str): путь к формату (None -- стандартный формат)
+        """
+
+        processes = self.standby.setdefault(fmt, [])
+        self.pending.setdefault(fmt, 0)
+
+        process = None
+        while processes and process is None:
+            candidate = processes.pop(0)
+            if candidate.alive():
+                process = candidate
+            else:
+                await candidate.kill()
+
+        self._refill(fmt)
+
+        if process is None:
+            process = WarmProcess(fmt, self.directory)
+            await process.spawn()
+
+        return process
+
+    def _refill(self, fmt: str | None):
+        # Учитываем процессы, которые уже запускаются, чтобы при наплыве
+        # заданий не запустить лишних
+        missing = self.size - len(self.standby[fmt]) - self.pending[fmt]
+        for _ in range(missing):
+            self.pending[fmt] += 1
+            task = asyncio.create_task(self._spawn_standby(fmt))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+    async def _spawn_standby(self, fmt: str | None):
+        process = WarmProcess(fmt, self.directory)
+        try:
+            await process.spawn()
+            self.standby[fmt].append(process)
+        finally:
+            self.pending[fmt] -= 1
+
+    async def _health_check(self):
+        while True:
+            await asyncio.sleep(HEALTH_CHECK_INTERVAL)
+            for fmt, processes in list(self.standby.items()):
+                dead = [process for process in processes if not process.alive()]
+                for process in dead:
+                    processes.remove(process)
+                    await process.kill()
+                self._refill(fmt)
@@ -0,0 +1,80 @@
+from aiogram.fsm.storage.base import BaseStorage
+
+from ..config import Storage
+from ..misc.session import session_dumps, session_loads
+from .memory import TTLMemoryStorage
+from .sqlite import SQLiteStorage
+from .sweeper import SessionSweeper
+from .transaction import StateTransaction, StateConflict, clear_state, transact
+
+
+def make_storage(config: Storage) -> BaseStorage:
+    """
+    Создаёт хранилище состояний FSM, выбранное в конфигурации. Хранилища,
+    сериализующие данные, упаковывают сессии заполнения (FormSession) компактно.
+
+        Параметры:
+            config (Storage): настройки хранилища
+
+        Возвращаемое значение:
+            storage (BaseStorage): хранилище состояний
+    """
+
+    if config.backend == "memory":
+        return TTLMemoryStorage()
+    if config.backend == "sqlite":
+        return SQLiteStorage(
+            config.sqlite_path,
+            pool_size=config.pool_size,
+            json_loads=session_loads,
+            json_dumps=session_dumps,
+        )
+    if config.backend == "redis":
+        # Пакет redis нужен, только если выбрано это хранилище
+        from .redis import PipelinedRedisStorage
+
+        return PipelinedRedisStorage.from_url(
+            config.redis_url,
+            pool_size=config.pool_size,
+            # Простаивающие сессии Redis удаляет сам по истечении их TTL
+            state_ttl=config.ttl or None,
+            data_ttl=config.ttl or None,
+            json_loads=session_loads,
+            json_dumps=session_dumps,
+        )
+
+    raise ValueError(f"Неизвестное хранилище состояний: {config.backend}")
+
+
+def make_sweeper(storage: BaseStorage, config: Storage) -> SessionSweeper | None:
+    """
+    Создаёт фоновую очистку простаивающих сессий для хранилища, если она
+    включена и хранилище не удаляет такие сессии само.
+
+        Параметры:
+            storage (BaseStorage): хранилище состояний
+            config (Storage): настройки хранилища
+    """
+
+    if not config.ttl or not hasattr(storage, "evict_idle"):
+        return None
+
+    return SessionSweeper(
+        storage,
+        ttl=config.ttl,
+        interval=config.sweep_interval,
+        batch=config.sweep_batch,
+    )
+
+
+__all__ = [
+    "make_storage",
+    "make_sweeper",
+    "TTLMemoryStorage",
+    "SQLiteStorage",
+    "SessionSweeper",
+    "StateTransaction",
+    "StateConflict",
+    "clear_state",
+    "transact",
+]
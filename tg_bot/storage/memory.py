@@ -0,0 +1,162 @@
+import itertools
+import time
+from collections import OrderedDict
+from collections.abc import Mapping
+from copy import copy, deepcopy
+from typing import Any
+
+from aiogram.exceptions import DataNotDictLikeError
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import StateType, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+
+class TTLMemoryStorage(MemoryStorage):
+    """
+    Хранилище состояний в памяти процесса, которое помнит, когда каждая сессия
+    менялась последний раз, и умеет вытеснять давно не менявшиеся сессии
+    (см. evict_idle). Отметка о последнем изменении переставляется в конец
+    упорядоченного словаря за O(1), поэтому самые давние сессии всегда в его
+    начале. Пустые записи (без состояния и данных) не хранятся вовсе.
+
+    Каждое изменение записи даёт ей новую версию, по которой get_record
+    и set_record реализуют оптимистичную блокировку.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.touched: OrderedDict[StorageKey, float] = OrderedDict()
+        self.versions: dict[StorageKey, int] = {}
+        # Версии не повторяются, поэтому удалённая и заново созданная запись
+        # не совпадёт по версии с прежней
+        self.counter = itertools.count(1)
+
+    async def set_state(self, key: StorageKey, state: StateType = None):
+        await super().set_state(key, state)
+        self.touch(key)
+
+    async def get_state(self, key: StorageKey) -> str | None:
+        # Чтение не должно создавать пустую запись, как в MemoryStorage
+        record = self.storage.get(key)
+        return record.state if record is not None else None
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]):
+        await super().set_data(key, data)
+        self.touch(key)
+
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        record = self.storage.get(key)
+        return record.data.copy() if record is not None else {}
+
+    async def get_value(
+        self, storage_key: StorageKey, dict_key: str, default: Any | None = None
+    ) -> Any | None:
+        record = self.storage.get(storage_key)
+        if record is None:
+            return default
+
+        return copy(record.data.get(dict_key, default))
+
+    async def get_record(self, key: StorageKey) -> tuple[str | None, dict, int]:
+        """
+        Возвращает состояние, данные и версию записи пользователя. Данные
+        копируются целиком, чтобы их изменение не попало в хранилище до записи.
+
+            Параметры:
+                key (StorageKey): ключ пользователя
+
+            Возвращаемое значение:
+                record (tuple): состояние, данные и версия записи (0 -- записи нет)
+        """
+
+        record = self.storage.get(key)
+        if record is None:
+            return None, {}, 0
+
+        return record.state, deepcopy(record.data), self.versions[key]
+
+    async def set_record(
+        self,
+        key: StorageKey,
+        state: StateType,
+        data: dict,
+        version: int | None = None,
+    ) -> int | None:
+        """
+        Записывает состояние и данные пользователя. Если задана версия, запись
+        выполняется, только если с момента чтения её никто не изменил.
+
+            Параметры:
+                key (StorageKey): ключ пользователя
+                state (State или str): новое состояние (None -- сбросить)
+                data (dict): новые данные (пустой словарь -- удалить)
+                version (int): ожидаемая версия записи (None -- любая)
+
+            Возвращаемое значение:
+                version (int): новая версия записи или None, если версия не совпала
+        """
+
+        if version is not None and self.versions.get(key, 0) != version:
+            return None
+        if not isinstance(data, dict):
+            raise DataNotDictLikeError(
+                f"Data must be a dict or dict-like object, got {type(data).__name__}"
+            )
+
+        record = self.storage[key]
+        record.state = state.state if isinstance(state, State) else state
+        record.data = data.copy()
+        self.touch(key)
+
+        return self.versions.get(key, 0)
+
+    def touch(self, key: StorageKey):
+        """
+        Отмечает, что сессия пользователя только что изменилась. Сессия без
+        состояния и данных удаляется.
+
+            Параметры:
+                key (StorageKey): ключ пользователя
+        """
+
+        record = self.storage.get(key)
+        if record is None or (record.state is None and not record.data):
+            self.storage.pop(key, None)
+            self.touched.pop(key, None)
+            self.versions.pop(key, None)
+            return
+
+        self.touched[key] = time.monotonic()
+        self.touched.move_to_end(key)
+        self.versions[key] = next(self.counter)
+
+    async def evict_idle(self, ttl: float, limit: int) -> int:
+        """
+        Удаляет не больше limit сессий, которые не менялись дольше ttl секунд.
+
+            Параметры:
+                ttl (float): время простоя, после которого сессия удаляется
+                limit (int): максимальное число удаляемых за вызов сессий
+
+            Возвращаемое значение:
+                evicted (int): число удалённых сессий
+        """
+
+        deadline = time.monotonic() - ttl
+        evicted = 0
+        while self.touched and evicted < limit:
+            key, touched = next(iter(self.touched.items()))
+            if touched > deadline:
+                break
+
+            del self.touched[key]
+            self.storage.pop(key, None)
+            self.versions.pop(key, None)
+            evicted += 1
+
+        return evicted
+
+    async def count(self) -> int:
+        """Возвращает число хранящихся сессий"""
+
+        return len(self.touched)
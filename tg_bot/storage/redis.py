@@ -0,0 +1,200 @@
+import datetime
+from collections.abc import Mapping
+from typing import Any
+
+from aiogram.exceptions import DataNotDictLikeError
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import StateType, StorageKey
+from aiogram.fsm.storage.redis import RedisStorage
+from redis.asyncio import BlockingConnectionPool, Redis
+
+# Сколько секунд ждать свободного соединения из пула
+POOL_TIMEOUT = 10
+
+# Счётчик, из которого берутся версии записей. Версии не повторяются, поэтому
+# удалённая и заново созданная запись не совпадёт по версии с прежней
+VERSION_COUNTER = "fsm:versions"
+
+# Записывает состояние и данные пользователя, если версия записи совпадает
+# с ожидаемой (или ожидаемая версия не задана), и возвращает новую версию
+# (0 -- запись удалена, -1 -- версия не совпала). Действие "keep" оставляет
+# значение как есть, но продлевает его TTL
+WRITE_RECORD = """
+local current = tonumber(redis.call('GET', KEYS[3]) or '0')
+if ARGV[1] ~= '' and current ~= tonumber(ARGV[1]) then
+    return -1
+end
+
+local function put(key, action, value, ttl)
+    if action == 'del' then
+        redis.call('DEL', key)
+    elseif action == 'set' then
+        if ttl > 0 then
+            redis.call('SET', key, value, 'EX', ttl)
+        else
+            redis.call('SET', key, value)
+        end
+    elseif ttl > 0 then
+        redis.call('EXPIRE', key, ttl)
+    end
+end
+
+local state_ttl, data_ttl = tonumber(ARGV[6]), tonumber(ARGV[7])
+put(KEYS[1], ARGV[2], ARGV[3], state_ttl)
+put(KEYS[2], ARGV[4], ARGV[5], data_ttl)
+
+if redis.call('EXISTS', KEYS[1], KEYS[2]) == 0 then
+    redis.call('DEL', KEYS[3])
+    return 0
+end
+
+local version = redis.call('INCR', KEYS[4])
+put(KEYS[3], 'set', version, math.max(state_ttl, data_ttl))
+return version
+"""
+
+
+class PipelinedRedisStorage(RedisStorage):
+    """
+    Хранилище состояний в Redis (или любом сервере, говорящем по протоколу
+    Redis). Соединения берутся из ограниченного пула, состояние и данные
+    пользователя читаются одним конвейером (pipeline), а записываются одним
+    скриптом за один обмен с сервером. Каждая запись получает новую версию,
+    по которой get_record и set_record реализуют оптимистичную блокировку.
+    """
+
+    def __init__(self, redis: Redis, **kwargs: Any):
+        super().__init__(redis, **kwargs)
+        self.write_record = redis.register_script(WRITE_RECORD)
+
+    @classmethod
+    def from_url(
+        cls, url: str, pool_size: int = 8, **kwargs: Any
+    ) -> "PipelinedRedisStorage":
+        """
+        Создаёт хранилище с пулом соединений к серверу по адресу url.
+
+            Параметры:
+                url (str): адрес сервера (redis://хост:порт/база)
+                pool_size (int): максимальное число соединений в пуле
+        """
+
+        pool = BlockingConnectionPool.from_url(
+            url, max_connections=pool_size, timeout=POOL_TIMEOUT
+        )
+        return cls(redis=Redis(connection_pool=pool), **kwargs)
+
+    async def set_state(self, key: StorageKey, state: StateType = None):
+        state = state.state if isinstance(state, State) else state
+        await self._write(
+            key, "del" if state is None else "set", state or "", "keep", ""
+        )
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]):
+        await self._write(key, "keep", "", *self._data(data))
+
+    async def get_record(self, key: StorageKey) -> tuple[str | None, dict, int]:
+        """
+        Читает состояние, данные и версию записи пользователя за один обмен
+        с сервером.
+
+            Параметры:
+                key (StorageKey): ключ пользователя
+
+            Возвращаемое значение:
+                record (tuple): состояние, данные и версия записи (0 -- записи нет)
+        """
+
+        async with self.redis.pipeline(transaction=False) as pipeline:
+            pipeline.get(self.key_builder.build(key, "state"))
+            pipeline.get(self.key_builder.build(key, "data"))
+            pipeline.get(self.key_builder.build(key, "version"))
+            state, data, version = await pipeline.execute()
+
+        if isinstance(state, bytes):
+            state = state.decode("utf-8")
+        if isinstance(data, bytes):
+            data = data.decode("utf-8")
+
+        return (
+            state,
+            self.json_loads(data) if data is not None else {},
+            int(version or 0),
+        )
+
+    async def set_record(
+        self,
+        key: StorageKey,
+        state: StateType,
+        data: dict,
+        version: int | None = None,
+    ) -> int | None:
+        """
+        Записывает состояние и данные пользователя одним скриптом за один
+        обмен с сервером. Если задана версия, запись выполняется, только если
+        с момента чтения её никто не изменил.
+
+            Параметры:
+                key (StorageKey): ключ пользователя
+                state (State или str): новое состояние (None -- сбросить)
+                data (dict): новые данные (пустой словарь -- удалить)
+                version (int): ожидаемая версия записи (None -- любая)
+
+            Возвращаемое значение:
+                version (int): новая версия записи или None, если версия не совпала
+        """
+
+        state = state.state if isinstance(state, State) else state
+        result = await self._write(
+            key,
+            "del" if state is None else "set",
+            state or "",
+            *self._data(data),
+            version=version,
+        )
+
+        return None if result < 0 else result
+
+    def _data(self, data: Mapping[str, Any]) -> tuple[str, str]:
+        if not isinstance(data, dict):
+            raise DataNotDictLikeError(
+                f"Data must be a dict or dict-like object, got {type(data).__name__}"
+            )
+
+        return ("set", self.json_dumps(data)) if data else ("del", "")
+
+    async def _write(
+        self,
+        key: StorageKey,
+        state_action: str,
+        state: str,
+        data_action: str,
+        data: str,
+        version: int | None = None,
+    ) -> int:
+        return await self.write_record(
+            keys=[
+                self.key_builder.build(key, "state"),
+                self.key_builder.build(key, "data"),
+                self.key_builder.build(key, "version"),
+                VERSION_COUNTER,
+            ],
+            args=[
+                "" if version is None else version,
+                state_action,
+                state,
+                data_action,
+                data,
+                _seconds(self.state_ttl),
+                _seconds(self.data_ttl),
+            ],
+        )
+
+
+def _seconds(ttl) -> int:
+    if ttl is None:
+        return 0
+    if isinstance(ttl, datetime.timedelta):
+        return int(ttl.total_seconds())
+
+    return int(ttl)
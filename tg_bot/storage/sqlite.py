@@ -0,0 +1,291 @@
+import asyncio
+import json
+import queue
+import secrets
+import sqlite3
+import time
+from collections.abc import Mapping
+from typing import Any
+
+from aiogram.exceptions import DataNotDictLikeError
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, KeyBuilder
+from aiogram.fsm.storage.base import StateType, StorageKey
+
+# Записи, у которых не осталось ни состояния, ни данных, удаляются
+CLEANUP = "DELETE FROM fsm WHERE key = ? AND state IS NULL AND data IS NULL"
+
+
+class SQLiteStorage(BaseStorage):
+    """
+    Встроенное хранилище состояний в файле SQLite. Переживает перезапуск бота
+    и может использоваться несколькими процессами на одной машине.
+
+    Чтение идёт через пул соединений в потоках, не блокируя цикл событий.
+    Все записи выполняет одно соединение: записи, накопившиеся, пока
+    выполнялась предыдущая пачка, выполняются следующей пачкой в одной
+    транзакции, поэтому под нагрузкой на много записей приходится одна
+    фиксация транзакции на диске.
+
+    Для каждой записи хранится время её последнего изменения, по которому
+    простаивающие сессии вытесняются (см. evict_idle), и версия, по которой
+    get_record и set_record реализуют оптимистичную блокировку.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        pool_size: int = 4,
+        key_builder: KeyBuilder | None = None,
+        json_loads=json.loads,
+        json_dumps=json.dumps,
+    ):
+        self.path = path
+        self.key_builder = key_builder or DefaultKeyBuilder()
+        self.json_loads = json_loads
+        self.json_dumps = json_dumps
+
+        self.readers: queue.LifoQueue[sqlite3.Connection] = queue.LifoQueue()
+        for _ in range(pool_size):
+            self.readers.put(self._connect())
+        self.writer = self._connect()
+
+        self.pending: list[tuple[list[tuple[str, tuple]], asyncio.Future]] = []
+        self.flush_task: asyncio.Task | None = None
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute("""
+            CREATE TABLE IF NOT EXISTS fsm (
+                key TEXT PRIMARY KEY,
+                state TEXT,
+                data TEXT,
+                updated REAL NOT NULL,
+                version INTEGER NOT NULL
+            )
+            """)
+        connection.execute("CREATE INDEX IF NOT EXISTS fsm_updated ON fsm (updated)")
+        connection.commit()
+
+        return connection
+
+    async def set_state(self, key: StorageKey, state: StateType = None):
+        storage_key = self.key_builder.build(key)
+        await self._write(
+            [
+                (
+                    "INSERT INTO fsm (key, state, updated, version) "
+                    "VALUES (?, ?, ?, ?) ON CONFLICT (key) DO UPDATE "
+                    "SET state = excluded.state, updated = excluded.updated, "
+                    "version = excluded.version",
+                    (storage_key, self._state(state), time.time(), _new_version()),
+                ),
+                (CLEANUP, (storage_key,)),
+            ]
+        )
+
+    async def get_state(self, key: StorageKey) -> str | None:
+        state, _ = await self._read(key)
+        return state
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]):
+        storage_key = self.key_builder.build(key)
+        await self._write(
+            [
+                (
+                    "INSERT INTO fsm (key, data, updated, version) "
+                    "VALUES (?, ?, ?, ?) ON CONFLICT (key) DO UPDATE "
+                    "SET data = excluded.data, updated = excluded.updated, "
+                    "version = excluded.version",
+                    (storage_key, self._data(data), time.time(), _new_version()),
+                ),
+                (CLEANUP, (storage_key,)),
+            ]
+        )
+
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        _, data = await self._read(key)
+        return data
+
+    async def get_record(self, key: StorageKey) -> tuple[str | None, dict, int]:
+        """
+        Читает состояние, данные и версию записи пользователя одним запросом.
+
+            Параметры:
+                key (StorageKey): ключ пользователя
+
+            Возвращаемое значение:
+                record (tuple): состояние, данные и версия записи (0 -- записи нет)
+        """
+
+        return await self._read(key, with_version=True)
+
+    async def set_record(
+        self,
+        key: StorageKey,
+        state: StateType,
+        data: dict,
+        version: int | None = None,
+    ) -> int | None:
+        """
+        Записывает состояние и данные пользователя одним запросом. Если задана
+        версия, запись выполняется, только если с момента чтения её никто
+        не изменил.
+
+            Параметры:
+                key (StorageKey): ключ пользователя
+                state (State или str): новое состояние (None -- сбросить)
+                data (dict): новые данные (пустой словарь -- удалить)
+                version (int): ожидаемая версия записи (None -- любая)
+
+            Возвращаемое значение:
+                version (int): новая версия записи или None, если версия не совпала
+        """
+
+        storage_key = self.key_builder.build(key)
+        new_version = _new_version()
+        values = (self._state(state), self._data(data), time.time(), new_version)
+
+        if version is None:
+            statement = (
+                "INSERT OR REPLACE INTO fsm (key, state, data, updated, version) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (storage_key, *values),
+            )
+        elif version == 0:
+            # Записи не было, и её не должно появиться с момента чтения
+            statement = (
+                "INSERT OR IGNORE INTO fsm (key, state, data, updated, version) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (storage_key, *values),
+            )
+        else:
+            statement = (
+                "UPDATE fsm SET state = ?, data = ?, updated = ?, version = ? "
+                "WHERE key = ? AND version = ?",
+                (*values, storage_key, version),
+            )
+
+        # Записи без состояния и данных сразу удаляются, поэтому запрос изменил
+        # хотя бы одну запись, только если сама запись выполнилась
+        changed = await self._write([statement, (CLEANUP, (storage_key,))])
+        if not changed:
+            return None
+
+        return new_version if values[0] is not None or values[1] is not None else 0
+
+    async def evict_idle(self, ttl: float, limit: int) -> int:
+        """
+        Удаляет не больше limit сессий, которые не менялись дольше ttl секунд.
+
+            Параметры:
+                ttl (float): время простоя, после которого сессия удаляется
+                limit (int): максимальное число удаляемых за вызов сессий
+
+            Возвращаемое значение:
+                evicted (int): число удалённых сессий
+        """
+
+        return await self._write(
+            [
+                (
+                    "DELETE FROM fsm WHERE key IN ("
+                    "SELECT key FROM fsm WHERE updated < ? ORDER BY updated LIMIT ?)",
+                    (time.time() - ttl, limit),
+                )
+            ]
+        )
+
+    async def count(self) -> int:
+        """Возвращает число хранящихся сессий"""
+
+        return await asyncio.to_thread(self._count)
+
+    async def close(self):
+        if self.flush_task is not None:
+            await self.flush_task
+
+        self.writer.close()
+        while not self.readers.empty():
+            self.readers.get().close()
+
+    def _state(self, state: StateType) -> str | None:
+        return state.state if isinstance(state, State) else state
+
+    def _data(self, data: Mapping[str, Any]) -> str | None:
+        if not isinstance(data, dict):
+            raise DataNotDictLikeError(
+                f"Data must be a dict or dict-like object, got {type(data).__name__}"
+            )
+
+        return self.json_dumps(data) if data else None
+
+    async def _read(self, key: StorageKey, with_version: bool = False) -> tuple:
+        row = await asyncio.to_thread(self._select, self.key_builder.build(key))
+        if row is None:
+            return (None, {}, 0) if with_version else (None, {})
+
+        state, data, version = row
+        data = self.json_loads(data) if data is not None else {}
+        return (state, data, version) if with_version else (state, data)
+
+    def _select(self, storage_key: str) -> tuple | None:
+        connection = self.readers.get()
+        try:
+            return connection.execute(
+                "SELECT state, data, version FROM fsm WHERE key = ?", (storage_key,)
+            ).fetchone()
+        finally:
+            self.readers.put(connection)
+
+    def _count(self) -> int:
+        connection = self.readers.get()
+        try:
+            return connection.execute("SELECT COUNT(*) FROM fsm").fetchone()[0]
+        finally:
+            self.readers.put(connection)
+
+    async def _write(self, statements: list[tuple[str, tuple]]) -> int:
+        # Возвращает число изменённых записей
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append((statements, future))
+
+        if self.flush_task is None or self.flush_task.done():
+            self.flush_task = asyncio.create_task(self._flush())
+
+        return await future
+
+    async def _flush(self):
+        while self.pending:
+            batch, self.pending = self.pending, []
+            try:
+                changes = await asyncio.to_thread(
+                    self._execute, [statements for statements, _ in batch]
+                )
+            except Exception as error:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(error)
+            else:
+                for (_, future), changed in zip(batch, changes):
+                    if not future.done():
+                        future.set_result(changed)
+
+    def _execute(self, batch: list[list[tuple[str, tuple]]]) -> list[int]:
+        changes = []
+        with self.writer:
+            for statements in batch:
+                before = self.writer.total_changes
+                for statement, parameters in statements:
+                    self.writer.execute(statement, parameters)
+                changes.append(self.writer.total_changes - before)
+
+        return changes
+
+
+def _new_version() -> int:
+    # Случайные версии практически не повторяются, поэтому удалённая и заново
+    # созданная запись не совпадёт по версии с прежней
+    return secrets.randbits(62) + 1
@@ -0,0 +1,72 @@
+import asyncio
+import contextlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class SessionSweeper:
+    """
+    Фоновая задача, которая раз в interval секунд удаляет из хранилища
+    состояний сессии, простаивающие дольше ttl секунд. За один проход удаляется
+    не больше batch сессий, остальные удаляются следующими проходами, поэтому
+    проход никогда не занимает цикл событий надолго.
+
+    Хранилище должно поддерживать методы evict_idle и count.
+    """
+
+    def __init__(self, storage, ttl: float, interval: float = 60, batch: int = 1000):
+        self.storage = storage
+        self.ttl = ttl
+        self.interval = interval
+        self.batch = batch
+        self.task: asyncio.Task | None = None
+
+        self.stats = {"live": 0, "evicted": 0, "sweeps": 0}
+
+    def start(self):
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self.task
+            self.task = None
+
+    async def sweep(self) -> int:
+        """
+        Выполняет один проход: удаляет простаивающие сессии, обновляет счётчики
+        живых и удалённых сессий и пишет их в лог.
+
+            Возвращаемое значение:
+                evicted (int): число удалённых за проход сессий
+        """
+
+        evicted = await self.storage.evict_idle(self.ttl, self.batch)
+
+        self.stats["evicted"] += evicted
+        self.stats["sweeps"] += 1
+        self.stats["live"] = await self.storage.count()
+
+        # Проходы без удалённых сессий пишутся в лог только при отладке
+        logger.log(
+            logging.INFO if evicted else logging.DEBUG,
+            "Удалено простаивающих сессий: %d, осталось сессий: %d, "
+            "всего удалено: %d, проходов очистки: %d",
+            evicted,
+            self.stats["live"],
+            self.stats["evicted"],
+            self.stats["sweeps"],
+        )
+
+        return evicted
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.sweep()
+            except Exception:
+                # Ошибка хранилища не должна останавливать очистку насовсем
+                logger.exception("Не удалось удалить простаивающие сессии")
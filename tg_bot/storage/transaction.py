@@ -0,0 +1,110 @@
+from typing import Any, Callable
+
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import StateType
+
+# Сколько раз повторять транзакцию, если запись успели изменить
+TRANSACTION_RETRIES = 3
+
+
+class StateConflict(Exception):
+    """Запись пользователя изменилась с момента её чтения транзакцией"""
+
+
+class StateTransaction:
+    """
+    Транзакция над состоянием и данными FSM пользователя: запись читается из
+    хранилища один раз, изменения копятся в памяти и записываются вместе
+    одним запросом к хранилищу. Запись выполняется, только если с момента
+    чтения её никто не изменил (например, обработчик второго сообщения,
+    пришедшего почти одновременно с первым), иначе возникает StateConflict.
+    Транзакции выполняются через transact, который повторяет их при конфликте.
+
+        Пример:
+            def finish(transaction):
+                transaction.data["key"] = value
+                transaction.set_state(FSMFillPersonalData.final_state)
+
+            await transact(state, finish)
+    """
+
+    def __init__(self, context: FSMContext):
+        self.storage = context.storage
+        self.key = context.key
+
+        self.state: str | None = None
+        self.data: dict[str, Any] = {}
+        self.version: int | None = None
+        self.discarded = False
+
+    async def load(self):
+        """Читает состояние и данные пользователя из хранилища"""
+
+        self.state, self.data, self.version = await self.storage.get_record(self.key)
+
+    def set_state(self, state: StateType = None):
+        self.state = state.state if isinstance(state, State) else state
+
+    def clear(self):
+        """Сбрасывает состояние и данные пользователя"""
+
+        self.state = None
+        self.data = {}
+
+    def discard(self):
+        """Отменяет транзакцию: при фиксации в хранилище ничего не запишется"""
+
+        self.discarded = True
+
+    async def commit(self):
+        """
+        Записывает состояние и данные пользователя в хранилище одним запросом.
+        Если запись успели изменить, возникает StateConflict.
+        """
+
+        if self.discarded:
+            return
+
+        version = await self.storage.set_record(
+            self.key, self.state, self.data, version=self.version
+        )
+        if version is None:
+            raise StateConflict(f"Запись {self.key} изменилась с момента чтения")
+
+        self.version = version
+
+
+async def clear_state(context: FSMContext):
+    """Сбрасывает состояние и данные пользователя одним запросом к хранилищу"""
+
+    await context.storage.set_record(context.key, None, {})
+
+
+async def transact(context: FSMContext, function: Callable[[StateTransaction], Any]):
+    """
+    Выполняет над записью пользователя транзакцию function и повторяет её
+    на свежей записи, если запись успели изменить. Функция не должна иметь
+    побочных эффектов, кроме изменения транзакции: они выполняются после
+    успешной записи по возвращённому ею результату.
+
+        Параметры:
+            context (FSMContext): контекст FSM пользователя
+            function: функция, изменяющая переданную ей транзакцию
+
+        Возвращаемое значение:
+            result: результат function на успешно записанной транзакции
+    """
+
+    for attempt in range(TRANSACTION_RETRIES):
+        transaction = StateTransaction(context)
+        await transaction.load()
+        result = function(transaction)
+        try:
+            await transaction.commit()
+        except StateConflict:
+            if attempt == TRANSACTION_RETRIES - 1:
+                raise
+            continue
+
+        return result
@@ -0,0 +1,167 @@
+import asyncio
+from typing import Any
+
+from aiogram import Bot, Dispatcher, loggers
+from aiogram.methods import TelegramMethod
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
+
+from .config import Webhook
+
+# Сколько секунд при остановке бота ждать обработки уже принятых обновлений
+DRAIN_TIMEOUT = 30
+
+
+class QueuedRequestHandler(SimpleRequestHandler):
+    """
+    Приёмник вебхуков Telegram. Обновление сразу подтверждается и
+    обрабатывается в отдельной задаче, как в SimpleRequestHandler aiogram,
+    поэтому долгий обработчик (например, сборка документа) не задерживает
+    обновления других пользователей. Обновления одного пользователя начинают
+    обрабатываться по порядку: следующее ждёт, пока предыдущее не будет
+    обработано или не отпустит очередь пользователя, вызвав release_turn
+    (обработчики, которые после изменения состояния FSM долго ждут, делают
+    это сами). Если одновременно обрабатывается max_updates обновлений,
+    Telegram получает ошибку и повторит отправку обновления позже, так что
+    оно не теряется. При остановке бота уже принятые обновления
+    дообрабатываются.
+    """
+
+    def __init__(
+        self,
+        dispatcher: Dispatcher,
+        bot: Bot,
+        max_updates: int = 1000,
+        secret_token: str | None = None,
+        **data: Any,
+    ):
+        super().__init__(
+            dispatcher=dispatcher, bot=bot, secret_token=secret_token, **data
+        )
+        self.max_updates = max_updates
+        self.tasks: set[asyncio.Task] = set()
+        # Последнее принятое обновление каждого пользователя: его результат
+        # выставляется, когда следующему обновлению можно начинать обработку
+        self.turns: dict[int, asyncio.Future] = {}
+
+        self.stats = {"received": 0, "processed": 0, "rejected": 0}
+
+    async def close(self):
+        # Дообрабатываем принятые обновления, пока сессия бота ещё открыта
+        if self.tasks:
+            _, pending = await asyncio.wait(self.tasks, timeout=DRAIN_TIMEOUT)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+        await super().close()
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if not self.verify_secret(
+            request.headers.get("X-Telegram-Bot-Api-Secret-Token", ""), self.bot
+        ):
+            return web.Response(body="Unauthorized", status=401)
+
+        if len(self.tasks) >= self.max_updates:
+            self.stats["rejected"] += 1
+            return web.Response(status=503)
+
+        update = await request.json(loads=self.bot.session.json_loads)
+
+        # Очередь пользователя занимается до запуска задачи, чтобы обновления
+        # начинали обрабатываться в том порядке, в котором пришли
+        user_id = _user_id(update)
+        previous = self.turns.get(user_id)
+        turn = self.turns[user_id] = asyncio.get_running_loop().create_future()
+
+        task = asyncio.create_task(self._process(update, user_id, previous, turn))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+        self.stats["received"] += 1
+        return web.json_response({}, dumps=self.bot.session.json_dumps)
+
+    __call__ = handle
+
+    async def _process(
+        self,
+        update: dict,
+        user_id: int,
+        previous: asyncio.Future | None,
+        turn: asyncio.Future,
+    ):
+        def release_turn():
+            # Следующее обновление пользователя может начинать обработку
+            if not turn.done():
+                turn.set_result(None)
+            if self.turns.get(user_id) is turn:
+                del self.turns[user_id]
+
+        try:
+            if previous is not None:
+                await previous
+
+            result = await self.dispatcher.feed_raw_update(
+                bot=self.bot, update=update, release_turn=release_turn, **self.data
+            )
+            if isinstance(result, TelegramMethod):
+                await self.dispatcher.silent_call_request(bot=self.bot, result=result)
+        except Exception:
+            loggers.event.exception(
+                "Cause exception while process update id=%s", update.get("update_id")
+            )
+        finally:
+            release_turn()
+            self.stats["processed"] += 1
+
+
+def _user_id(update: dict) -> int:
+    # Обновление содержит update_id и один объект события, у которого есть
+    # отправитель (from) или хотя бы чат
+    for event in update.values():
+        if not isinstance(event, dict):
+            continue
+        if "from" in event:
+            return event["from"]["id"]
+        if "chat" in event:
+            return event["chat"]["id"]
+
+    return update.get("update_id", 0)
+
+
+async def run_webhook(bot: Bot, dispatcher: Dispatcher, config: Webhook):
+    """
+    Принимает обновления вебхуком, пока бот не будет остановлен. Накопившиеся
+    за время перезапуска обновления не сбрасываются: Telegram доставит их,
+    как только вебхук будет установлен.
+
+        Параметры:
+            bot (Bot): бот
+            dispatcher (Dispatcher): диспетчер с подключёнными роутерами
+            config (Webhook): настройки вебхука
+    """
+
+    handler = QueuedRequestHandler(
+        dispatcher, bot, max_updates=config.max_updates, secret_token=config.secret
+    )
+
+    app = web.Application()
+    handler.register(app, path=config.path)
+    setup_application(app, dispatcher, bot=bot)
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, config.host, config.port).start()
+
+    await bot.set_webhook(
+        url=config.url,
+        secret_token=config.secret,
+        allowed_updates=dispatcher.resolve_used_update_types(),
+        drop_pending_updates=False,
+    )
+
+    try:
+        await asyncio.Event().wait()
+    finally:
+        # Сначала перестаём принимать запросы, затем дообрабатываем принятые обновления
+        await runner.cleanup()